@@ -0,0 +1 @@
+"""Benchmarks for the messaging layer and the order saga."""
@@ -0,0 +1,99 @@
+"""
+Compare event codecs on OrderCreatedEvent.
+
+Measures encode time, decode time (body -> validated event) and encoded
+size for orders with 1, 10 and 500 items, for every codec whose library is
+installed.
+
+Usage:
+    python -m benchmarks.codec_bench [--number 2000] [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from shared.events import OrderCreatedEvent
+from shared.messaging.codecs import CODECS
+from shared.models.items import OrderItem
+
+ITEM_COUNTS = (1, 10, 500)
+
+
+def make_event(item_count: int) -> OrderCreatedEvent:
+    """Build an OrderCreatedEvent with the given number of items."""
+    items = [
+        OrderItem(product_id=f"prod_{i:05d}", quantity=i % 7 + 1, price=9.99 + i)
+        for i in range(item_count)
+    ]
+    return OrderCreatedEvent(
+        order_id="3f0c6a52-3a7e-4d43-9d1e-8f8a8c1f6f11",
+        user_id="user_123",
+        items=items,
+        total_amount=sum(item.subtotal for item in items),
+        correlation_id="3f0c6a52-3a7e-4d43-9d1e-8f8a8c1f6f11",
+    )
+
+
+def bench_codec(codec, event: OrderCreatedEvent, number: int) -> dict:
+    """Time encode and decode of one event with one codec."""
+    body = codec.encode(event)
+    assert codec.decode(body, OrderCreatedEvent) == event
+
+    encode = timeit.timeit(lambda: codec.encode(event), number=number)
+    decode = timeit.timeit(
+        lambda: codec.decode(body, OrderCreatedEvent), number=number
+    )
+
+    return {
+        "codec": codec.name,
+        "items": len(event.items),
+        "bytes": len(body),
+        "encode_us": encode / number * 1e6,
+        "decode_us": decode / number * 1e6,
+    }
+
+
+def run(number: int) -> list[dict]:
+    results = []
+    for item_count in ITEM_COUNTS:
+        event = make_event(item_count)
+        # Fewer iterations for the large payloads
+        iterations = max(number // item_count, 50) if item_count > 10 else number
+
+        for name, codec_class in CODECS.items():
+            try:
+                codec = codec_class()
+            except RuntimeError as e:
+                print(f"skipping {name}: {e}", file=sys.stderr)
+                continue
+            results.append(bench_codec(codec, event, iterations))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--number", type=int, default=2000, help="iterations")
+    parser.add_argument("--json", action="store_true", help="emit JSON results")
+    args = parser.parse_args()
+
+    results = run(args.number)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    header = ("items", "codec", "bytes", "encode µs", "decode µs")
+    print("{:>6} {:<8} {:>8} {:>10} {:>10}".format(*header))
+    for r in results:
+        print(
+            f"{r['items']:>6} {r['codec']:<8} {r['bytes']:>8} "
+            f"{r['encode_us']:>10.1f} {r['decode_us']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -3,71 +3,84 @@ import os
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
-import json
+from typing import Optional
+
 from aio_pika import IncomingMessage as AbstractIncomingMessage
 
+from shared.events import OrderCreatedEvent, OrderCancelledEvent
 from shared.messaging.consumer import EventConsumer
+from shared.messaging.dispatch import EventDispatcher
+from shared.messaging.idempotency import ProcessedEventCache, SqlProcessedEventStore
 from shared.models.enums import EventType
 from shared.models.items import InventoryItem
+from shared.startup import FingerprintStore, attach_consumers
 from app.database import async_session
+from app.models.processed_event import ProcessedEvent
 from app.services.inventory_service import InventoryService
 
+# Partition workers for the order queue (1 = default dispatch)
+CONSUMER_WORKERS = int(os.getenv("CONSUMER_WORKERS", "1"))
 
-async def handle_order_created(message: AbstractIncomingMessage):
-    """Handle OrderCreated event - reserve inventory"""
-    try:
-        event_data = json.loads(message.body.decode())
-        order_id = event_data.get("order_id")
-        items_data = event_data.get("items", [])
-        correlation_id = event_data.get("correlation_id")
-        total_amount = event_data.get("total_amount")
-
-        # Convert to InventoryItem models
-        items = [InventoryItem(**item) for item in items_data]
-
-        # Reserve inventory
-        async with async_session() as db:
-            service = InventoryService(db)
-            await service.reserve_inventory(
-                order_id, items, total_amount, correlation_id
-            )
-
-    except Exception as e:
-        print(f"[Inventory Service] Error handling order_created: {e}")
+order_dispatcher = EventDispatcher()
 
 
-async def handle_order_cancelled(message: AbstractIncomingMessage):
+@order_dispatcher.on(EventType.ORDER_CREATED)
+async def handle_order_created(event: OrderCreatedEvent):
+    """Handle OrderCreated event - reserve inventory"""
+    # Convert to InventoryItem models
+    items = [
+        InventoryItem(product_id=item.product_id, quantity=item.quantity)
+        for item in event.items
+    ]
+
+    # Reserve inventory
+    async with async_session() as db:
+        service = InventoryService(db)
+        await service.reserve_inventory(
+            event.order_id,
+            items,
+            event.total_amount,
+            event.correlation_id,
+            user_id=event.user_id,
+        )
+
+
+@order_dispatcher.on(EventType.ORDER_CANCELLED)
+async def handle_order_cancelled(event: OrderCancelledEvent):
     """Handle OrderCancelled event - release inventory"""
-    try:
-        event_data = json.loads(message.body.decode())
-        order_id = event_data.get("order_id")
-        reason = event_data.get("reason", "Order cancelled")
-        correlation_id = event_data.get("correlation_id")
-
-        # Release inventory
-        async with async_session() as db:
-            service = InventoryService(db)
-            await service.release_inventory(order_id, reason, correlation_id)
+    reason = event.reason or "Order cancelled"
 
-    except Exception as e:
-        print(f"[Inventory Service] Error handling order_cancelled: {e}")
+    # Release inventory
+    async with async_session() as db:
+        service = InventoryService(db)
+        await service.release_inventory(event.order_id, reason, event.correlation_id)
 
 
-async def start_consumers():
+async def start_consumers(
+    fingerprints: Optional[FingerprintStore] = None,
+) -> list[EventConsumer]:
     """Start all event consumers"""
     order_consumer = EventConsumer(
         queue_name="inventory_service.orders",
         routing_keys=[EventType.ORDER_CREATED, EventType.ORDER_CANCELLED],
+        # Skip redelivered events before touching reservations
+        idempotency=ProcessedEventCache(
+            "inventory_service.orders",
+            store=SqlProcessedEventStore(async_session, ProcessedEvent),
+        ),
+        topology_cache=fingerprints,
     )
 
     async def order_router(message: AbstractIncomingMessage):
-        event_data = json.loads(message.body.decode())
-        event_type = event_data.get("event_type")
-
-        if event_type == EventType.ORDER_CREATED:
-            await handle_order_created(message)
-        elif event_type == EventType.ORDER_CANCELLED:
-            await handle_order_cancelled(message)
-
-    await order_consumer.consume(order_router)
+        try:
+            await order_dispatcher.dispatch(message)
+        except Exception as e:
+            print(f"[Inventory Service] Error handling message {message.message_id}: {e}")
+            raise  # Retried by the consumer
+
+    # Events for the same order (correlation_id) stay in order across workers
+    consumers = await attach_consumers(
+        [(order_consumer, order_consumer.consume(order_router, workers=CONSUMER_WORKERS))]
+    )
     print("[Inventory Service] Event consumers started")
+    return consumers
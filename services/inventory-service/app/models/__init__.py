@@ -1,3 +1,5 @@
 from .inventory import Product, InventoryReservation
+from .outbox import OutboxEvent
+from .processed_event import ProcessedEvent
 
-__all__ = ["Product", "InventoryReservation"]
+__all__ = ["Product", "InventoryReservation", "OutboxEvent", "ProcessedEvent"]
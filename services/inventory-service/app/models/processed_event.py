@@ -0,0 +1,13 @@
+from app.database import Base
+
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from shared.messaging.idempotency import ProcessedEventMixin
+
+
+class ProcessedEvent(ProcessedEventMixin, Base):
+    """IDs of events already handled by this service's consumers."""
+
+    __tablename__ = "processed_events"
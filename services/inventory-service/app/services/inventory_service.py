@@ -1,9 +1,11 @@
-from typing import List
+from typing import List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from datetime import datetime, timezone
 
+from app.database import async_session
 from app.models.inventory import Product, InventoryReservation
+from app.models.outbox import OutboxEvent
 from app.schemas.inventory import ProductCreate, ProductUpdate
 
 import os
@@ -11,6 +13,7 @@ import sys
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 from shared.messaging.publisher import EventPublisher
+from shared.outbox import OutboxRelay
 from shared.models.items import InventoryItem
 from shared.events.inventory_events import (
     InventoryReservedEvent,
@@ -19,6 +22,7 @@ from shared.events.inventory_events import (
 )
 
 event_publisher = EventPublisher()
+outbox_relay = OutboxRelay(async_session, OutboxEvent, event_publisher)
 
 
 class InventoryService:
@@ -88,6 +92,7 @@ class InventoryService:
         items: List[InventoryItem],
         total_amount: float,
         correlation_id: str,
+        user_id: Optional[str] = None,
     ):
         """
         Reserve inventory for an order with row-level locking to prevent race conditions.
@@ -113,7 +118,7 @@ class InventoryService:
             product = result.scalar_one_or_none()
 
             if not product or product.available_quantity < item.quantity:
-                # Insufficient stock - rollback and publish event
+                # Insufficient stock - rollback and record event
                 await self.db.rollback()
                 event = InventoryInsufficientEvent(
                     order_id=order_id,
@@ -124,7 +129,9 @@ class InventoryService:
                     ],
                     correlation_id=correlation_id,
                 )
-                await event_publisher.publish_event(event)
+                self.db.add(OutboxEvent.from_event(event))
+                await self.db.commit()
+                outbox_relay.notify()
                 return False
 
             # Reserve stock (within locked transaction)
@@ -137,10 +144,7 @@ class InventoryService:
             )
             self.db.add(reservation)
 
-        # Commit transaction (releases locks)
-        await self.db.commit()
-
-        # Publish success event
+        # Record success event in the same transaction
         event = InventoryReservedEvent(
             order_id=order_id,
             items=[
@@ -148,9 +152,14 @@ class InventoryService:
                 for item in items
             ],
             total_amount=total_amount,
+            user_id=user_id,
             correlation_id=correlation_id,
         )
-        await event_publisher.publish_event(event)
+        self.db.add(OutboxEvent.from_event(event))
+
+        # Commit transaction (releases locks)
+        await self.db.commit()
+        outbox_relay.notify()
         return True
 
     async def release_inventory(self, order_id: str, reason: str, correlation_id: str):
@@ -177,9 +186,7 @@ class InventoryService:
             reservation.is_released = True
             reservation.released_at = datetime.now(timezone.utc)
 
-        await self.db.commit()
-
-        # Publish event
+        # Record event in the same transaction
         items = [
             InventoryItem(product_id=r.product_id, quantity=r.quantity)
             for r in reservations
@@ -187,4 +194,7 @@ class InventoryService:
         event = InventoryReleasedEvent(
             order_id=order_id, items=items, reason=reason, correlation_id=correlation_id
         )
-        await event_publisher.publish_event(event)
+        self.db.add(OutboxEvent.from_event(event))
+
+        await self.db.commit()
+        outbox_relay.notify()
@@ -0,0 +1,141 @@
+"""Admission control for order creation."""
+
+import math
+import sys
+import os
+from typing import Optional
+
+from fastapi import HTTPException
+from prometheus_client import Counter, Gauge
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Add shared library to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../.."))
+from shared.messaging.connection import is_broker_blocked
+from shared.messaging.publisher import EventPublisher
+from shared.outbox import OutboxRelay
+
+from app.config import settings
+from app.db.session import engine
+from app.services.order_service import event_publisher, outbox_relay
+
+ADMISSION_REJECTIONS = Counter(
+    "order_admission_rejections_total",
+    "Order creations turned away by admission control",
+    ["reason"],
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "order_admission_in_flight",
+    "Order creations currently admitted",
+)
+
+
+class AdmissionController:
+    """
+    Sheds order creations while the service can't keep up.
+
+    Accepting more orders under overload only queues them up holding
+    database connections, so every order gets slow. Instead requests are
+    refused up front:
+
+    - 503 while the broker applies flow control, the publisher's confirm
+      window is (nearly) full or confirms are slow, or the outbox relay
+      is falling behind
+    - 429 while the database pool or the admitted request limit is used up
+
+    Both carry a Retry-After header.
+    """
+
+    def __init__(
+        self,
+        publisher: EventPublisher,
+        relay: OutboxRelay,
+        db_engine: AsyncEngine,
+        max_in_flight: int = settings.ADMISSION_MAX_IN_FLIGHT,
+        max_outbox_lag: float = settings.ADMISSION_MAX_OUTBOX_LAG,
+        max_confirm_latency: float = settings.ADMISSION_MAX_CONFIRM_LATENCY,
+        max_window_usage: float = 0.9,
+    ):
+        self.publisher = publisher
+        self.relay = relay
+        self.engine = db_engine
+        self.max_outbox_lag = max_outbox_lag
+        self.max_confirm_latency = max_confirm_latency
+        self.max_window_usage = max_window_usage
+        self._max_in_flight = max_in_flight
+
+        self.in_flight = 0
+
+    @property
+    def pool_capacity(self) -> Optional[int]:
+        """Connections the DB pool can hand out, or None if unbounded."""
+        pool = self.engine.pool
+        # Only sized pools have it (and the autosizer may change it)
+        max_overflow = getattr(pool, "max_overflow", None)
+        if not hasattr(pool, "size") or max_overflow is None or max_overflow < 0:
+            return None
+        return pool.size() + max_overflow
+
+    @property
+    def max_in_flight(self) -> Optional[int]:
+        return self._max_in_flight or self.pool_capacity
+
+    def _reject(self, status_code: int, reason: str, retry_after: float):
+        ADMISSION_REJECTIONS.labels(reason=reason).inc()
+        return HTTPException(
+            status_code=status_code,
+            detail=f"Order service overloaded ({reason}), retry later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    def check(self) -> Optional[HTTPException]:
+        """
+        Decide whether to admit one more order.
+
+        Returns:
+            The HTTP error to answer with, or None to admit the request
+        """
+        # Downstream pressure: the broker can't take events fast enough
+        if is_broker_blocked():
+            return self._reject(503, "broker_blocked", 5)
+
+        publisher = self.publisher
+        if publisher.in_flight >= publisher.max_in_flight * self.max_window_usage:
+            return self._reject(503, "publish_backlog", 2)
+        if publisher.in_flight and publisher.confirm_latency > self.max_confirm_latency:
+            return self._reject(503, "publish_latency", publisher.confirm_latency)
+
+        if self.relay.lag > self.max_outbox_lag:
+            return self._reject(503, "outbox_lag", self.relay.lag)
+
+        # Local pressure: requests would queue for a DB connection
+        capacity = self.pool_capacity
+        if capacity is not None and self.engine.pool.checkedout() >= capacity:
+            return self._reject(429, "db_pool_saturated", 1)
+
+        max_in_flight = self.max_in_flight
+        if max_in_flight and self.in_flight >= max_in_flight:
+            return self._reject(429, "too_many_requests", 1)
+
+        return None
+
+    async def __call__(self):
+        """FastAPI dependency admitting a request for its whole duration."""
+        if not settings.ADMISSION_ENABLED:
+            yield
+            return
+
+        rejection = self.check()
+        if rejection:
+            raise rejection
+
+        self.in_flight += 1
+        ADMISSION_IN_FLIGHT.inc()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            ADMISSION_IN_FLIGHT.dec()
+
+
+admission_controller = AdmissionController(event_publisher, outbox_relay, engine)
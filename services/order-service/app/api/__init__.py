@@ -1,5 +1,7 @@
 """API routes."""
 
 from .orders import router as orders_router
+from .sagas import router as sagas_router
+from .streams import router as streams_router
 
-__all__ = ["orders_router"]
+__all__ = ["orders_router", "sagas_router", "streams_router"]
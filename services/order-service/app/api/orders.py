@@ -1,5 +1,8 @@
-from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+import asyncio
+import time
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import sys
@@ -9,51 +12,156 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../../.."))
 from shared.models.enums import OrderStatus
 
+from app.admission import admission_controller
+from app.cache import order_cache
+from app.config import settings
 from app.db.session import get_db
-from app.schemas.order import OrderCreate, OrderResponse, OrderListResponse
-from app.services.order_service import OrderService
+from app.schemas.order import (
+    OrderBatchCreate,
+    OrderBatchResponse,
+    OrderBatchResult,
+    OrderCreate,
+    OrderResponse,
+    OrderListResponse,
+)
+from app.services.order_service import InvalidCursor, OrderService, decode_cursor
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
 
-@router.post("", response_model=OrderResponse, status_code=201)
+@router.post(
+    "",
+    response_model=OrderResponse,
+    status_code=201,
+    # Admission runs first, before a DB session is opened
+    dependencies=[Depends(admission_controller)],
+)
 async def create_order(order_data: OrderCreate, db: AsyncSession = Depends(get_db)):
-    """Create a new order."""
+    """Create a new order (429/503 with Retry-After when overloaded)."""
 
     order_service = OrderService(db)
     order = await order_service.create_order(order_data)
     return order
 
 
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc']) or 'order'}: {e['msg']}"
+        for e in error.errors()
+    )
+
+
+@router.post(
+    "/batch",
+    response_model=OrderBatchResponse,
+    status_code=201,
+    dependencies=[Depends(admission_controller)],
+)
+async def create_orders(
+    batch: OrderBatchCreate, response: Response, db: AsyncSession = Depends(get_db)
+):
+    """
+    Create up to ORDER_BATCH_MAX_SIZE orders in one transaction.
+
+    Each order is validated on its own and reported in ``results`` by its
+    index; the valid ones are created together. 201 if all were created,
+    207 if only some, 422 if none.
+    """
+    if len(batch.orders) > settings.ORDER_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.ORDER_BATCH_MAX_SIZE} orders per batch",
+        )
+
+    results: list[OrderBatchResult] = []
+    valid: list[tuple[int, OrderCreate]] = []
+    for index, raw in enumerate(batch.orders):
+        try:
+            valid.append((index, OrderCreate.model_validate(raw)))
+        except ValidationError as e:
+            results.append(OrderBatchResult(index=index, error=_validation_message(e)))
+
+    if valid:
+        order_service = OrderService(db)
+        orders = await order_service.create_orders([data for _, data in valid])
+        results.extend(
+            OrderBatchResult(index=index, order=OrderResponse.model_validate(order))
+            for (index, _), order in zip(valid, orders)
+        )
+
+    results.sort(key=lambda result: result.index)
+    failed = len(batch.orders) - len(valid)
+    if failed:
+        response.status_code = 207 if valid else 422
+
+    return OrderBatchResponse(results=results, created=len(valid), failed=failed)
+
+
 @router.get("/{order_id}", response_model=OrderResponse)
 async def get_order(order_id: str, db: AsyncSession = Depends(get_db)):
-    """Get order by ID."""
+    """Get order by ID (served from the order cache while fresh)."""
 
+    cached = order_cache.get(order_id)
+    if cached is not None:
+        return Response(cached, media_type="application/json")
+
+    read_at = time.monotonic()
     order_service = OrderService(db)
     order = await order_service.get_order(order_id)
 
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
-    return order
+    return Response(order_cache.put(order, read_at), media_type="application/json")
 
 
 @router.get("", response_model=OrderListResponse)
 async def list_orders(
     user_id: Optional[str] = Query(None),
     status: Optional[OrderStatus] = Query(None),
-    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor of the last page"),
+    skip: int = Query(0, ge=0, description="Offset paging (prefer cursor)"),
     limit: int = Query(100, ge=1, le=100),
+    count: Literal["auto", "exact", "estimate"] = Query(
+        "auto", description="How total is counted (auto: exact for small totals)"
+    ),
     db: AsyncSession = Depends(get_db),
 ):
-    """List orders with optional filters."""
+    """List orders with optional filters, newest first, and their total."""
 
     order_service = OrderService(db)
-    orders = await order_service.list_orders(
-        user_id=user_id, status=status, skip=skip, limit=limit
+
+    if skip and cursor:
+        raise HTTPException(status_code=400, detail="Pass either skip or cursor")
+    if cursor:
+        # Before the count starts, so it isn't left running on a bad cursor
+        try:
+            decode_cursor(cursor)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    async def page():
+        if skip:
+            orders = await order_service.list_orders(
+                user_id=user_id, status=status, skip=skip, limit=limit
+            )
+            return orders, None
+        return await order_service.list_orders_page(
+            user_id=user_id, status=status, cursor=cursor, limit=limit
+        )
+
+    # The count runs on its own connection, alongside the page query
+    (orders, next_cursor), (total, total_is_estimate) = await asyncio.gather(
+        page(),
+        order_service.count_orders(user_id=user_id, status=status, mode=count),
     )
 
-    return OrderListResponse(orders=orders, total=len(orders))
+    return OrderListResponse(
+        orders=orders,
+        total=total,
+        total_is_estimate=total_is_estimate,
+        next_cursor=next_cursor,
+    )
 
 
 @router.post("/{order_id}/cancel", response_model=OrderResponse)
@@ -62,12 +170,16 @@ async def cancel_order(
     reason: str = Query(..., description="Reason for cancellation"),
     db: AsyncSession = Depends(get_db),
 ):
-    """Cancel an order."""
+    """Cancel an order (409 once it is completed, cancelled or failed)."""
 
     order_service = OrderService(db)
 
     try:
         order = await order_service.cancel_order(order_id, reason)
-        return order
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+
+    if order is None:
+        raise HTTPException(status_code=409, detail="Order can't be cancelled")
+
+    return await order_service.get_order(order_id)
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Query
+
+from app.sagas import saga_tracker
+
+router = APIRouter(prefix="/sagas", tags=["sagas"])
+
+
+@router.get("/slowest")
+async def slowest_sagas(limit: int = Query(10, ge=1, le=100)):
+    """In-flight order sagas that have been running longest, with stage times."""
+
+    return {"in_flight": len(saga_tracker), "sagas": saga_tracker.slowest(limit)}
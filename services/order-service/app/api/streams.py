@@ -0,0 +1,112 @@
+import asyncio
+import json
+from typing import AsyncIterator, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app.cache import order_cache
+from app.config import settings
+from app.db.session import async_session
+from app.services.order_service import OrderService
+from app.streams import (
+    FINAL_STATUSES,
+    StreamFull,
+    Subscription,
+    format_event,
+    order_hub,
+    status_change,
+)
+
+router = APIRouter(prefix="/orders", tags=["streams"])
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def _subscribe(kind: str, key: str) -> Subscription:
+    try:
+        return order_hub.subscribe(kind, key)
+    except StreamFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many open streams",
+            headers={"Retry-After": "5"},
+        )
+
+
+async def _stream(
+    subscription: Subscription, first: Optional[dict] = None, until_final: bool = False
+) -> AsyncIterator[str]:
+    """Server-sent events of a subscription, with keep-alives while idle."""
+    try:
+        if first is not None:
+            yield format_event(first)
+            if until_final and first["status"] in FINAL_STATUSES:
+                return
+
+        while True:
+            try:
+                change = await subscription.get(settings.ORDER_STREAM_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+
+            if change is None:
+                # Fell too far behind; the client should reconnect
+                yield format_event({}, event="evicted")
+                return
+
+            yield format_event(change)
+            if until_final and change["status"] in FINAL_STATUSES:
+                return
+    finally:
+        order_hub.unsubscribe(subscription)
+
+
+@router.get("/events")
+async def user_order_events(user_id: str = Query(...)):
+    """Stream the status changes of a user's orders (server-sent events)."""
+
+    subscription = _subscribe("user", user_id)
+    return StreamingResponse(
+        _stream(subscription), media_type="text/event-stream", headers=SSE_HEADERS
+    )
+
+
+@router.get("/{order_id}/events")
+async def order_events(order_id: str):
+    """
+    Stream an order's status changes (server-sent events).
+
+    Starts with the current status and ends once the order is confirmed,
+    cancelled or otherwise final.
+    """
+    # Subscribe first, so no change slips in between the read and the stream
+    subscription = _subscribe("order", order_id)
+
+    try:
+        cached = order_cache.get(order_id)
+        if cached is not None:
+            current = json.loads(cached)
+            first = {
+                "order_id": order_id,
+                "user_id": current["user_id"],
+                "status": current["status"],
+                "updated_at": current["updated_at"],
+            }
+        else:
+            # Not get_db: its session would hold a connection for the stream
+            async with async_session() as db:
+                order = await OrderService(db).get_order(order_id)
+            if not order:
+                raise HTTPException(status_code=404, detail="Order not found")
+            first = status_change(order)
+    except BaseException:
+        order_hub.unsubscribe(subscription)
+        raise
+
+    return StreamingResponse(
+        _stream(subscription, first, until_final=True),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
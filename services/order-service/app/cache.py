@@ -0,0 +1,286 @@
+"""Read-through cache of serialized orders for GET /orders/{order_id}."""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+from uuid import uuid4
+
+from aio_pika import DeliveryMode, Message
+from aio_pika.abc import AbstractIncomingMessage, AbstractQueue
+from prometheus_client import Counter, Gauge
+from sqlalchemy import inspect
+
+from app.config import settings
+from app.models.order import Order
+from app.schemas.order import OrderResponse
+from app.streams import status_change
+
+# Add shared library to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../.."))
+from shared.messaging.pool import ChannelPool, PooledChannel, get_channel_pool
+
+logger = logging.getLogger(__name__)
+
+ORDER_CACHE_LOOKUPS = Counter(
+    "order_cache_lookups_total",
+    "GET /orders/{id} cache lookups by result (hit or miss)",
+    ["result"],
+)
+ORDER_CACHE_SIZE = Gauge(
+    "order_cache_size",
+    "Orders held in the read-through cache",
+)
+
+# Outside the event namespace, so no event consumer binds to it
+INVALIDATION_ROUTING_KEY = "cache.order.invalidated"
+
+
+def _version(updated_at: Optional[datetime]) -> float:
+    """Comparable version of an order (naive timestamps are UTC)."""
+    if updated_at is None:
+        return 0.0
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return updated_at.timestamp()
+
+
+class OrderCache:
+    """
+    Bounded LRU of serialized OrderResponse bodies with a TTL.
+
+    Status changes write the new order through (see ``updated``), so
+    polling clients see each saga step right away and the TTL only bounds
+    how long a change made elsewhere can go unnoticed. An entry is never
+    replaced by an older version of the order (by ``updated_at``), and a
+    read that started before an invalidation isn't cached, so a slow read
+    racing a status change can't put stale data back.
+    """
+
+    def __init__(
+        self,
+        max_size: int = settings.ORDER_CACHE_SIZE,
+        ttl: float = settings.ORDER_CACHE_TTL,
+    ):
+        """
+        Args:
+            max_size: Most orders kept (0 disables the cache)
+            ttl: Seconds an order is served from the cache
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.broadcast: Optional["CacheInvalidationBroadcast"] = None
+
+        # order_id -> (expiry, version, body), least recently used first;
+        # an invalidated order is kept with no body until it would expire
+        self._entries: OrderedDict[str, tuple[float, float, Optional[bytes]]] = (
+            OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, order_id: str) -> Optional[bytes]:
+        """Serialized order, if cached and fresh."""
+        entry = self._entries.get(order_id)
+        if entry is None or entry[2] is None or entry[0] < time.monotonic():
+            ORDER_CACHE_LOOKUPS.labels(result="miss").inc()
+            return None
+
+        self._entries.move_to_end(order_id)
+        ORDER_CACHE_LOOKUPS.labels(result="hit").inc()
+        return entry[2]
+
+    def put(self, order: Order, read_at: Optional[float] = None) -> bytes:
+        """
+        Serialize an order and cache it.
+
+        Args:
+            order: Order with its items loaded
+            read_at: When the read that loaded it started (monotonic time);
+                the order isn't cached if it has been invalidated since
+
+        Returns:
+            The serialized order
+        """
+        body = OrderResponse.model_validate(order).model_dump_json().encode()
+        if self.enabled:
+            self._store(order.id, _version(order.updated_at), body, read_at)
+        return body
+
+    def _store(
+        self, order_id: str, version: float, body: bytes, read_at: Optional[float]
+    ):
+        now = time.monotonic()
+        entry = self._entries.get(order_id)
+        if entry is not None:
+            expiry, cached_version, cached = entry
+            if cached is None:
+                if read_at is not None and read_at <= expiry - self.ttl:
+                    return  # Read before it was invalidated
+            elif expiry >= now and cached_version > version:
+                return  # A newer version is cached
+
+        self._entries[order_id] = (now + self.ttl, version, body)
+        self._entries.move_to_end(order_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        ORDER_CACHE_SIZE.set(len(self._entries))
+
+    def _patch(self, order: Order):
+        """Update the cached copy of an order with its column values."""
+        entry = self._entries.get(order.id)
+        if entry is None or entry[2] is None or entry[0] < time.monotonic():
+            return
+
+        fields = json.loads(entry[2])
+        fields.update(
+            {column.key: getattr(order, column.key) for column in Order.__table__.c}
+        )
+        body = OrderResponse.model_validate(fields).model_dump_json().encode()
+        self._store(order.id, _version(order.updated_at), body, None)
+
+    def invalidate(self, order_id: str):
+        """Drop an order; reads already in flight won't cache it again."""
+        if not self.enabled:
+            return
+
+        self._entries[order_id] = (time.monotonic() + self.ttl, 0.0, None)
+        self._entries.move_to_end(order_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        ORDER_CACHE_SIZE.set(len(self._entries))
+
+    def updated(self, order: Order):
+        """
+        Write a changed order through, and tell the other replicas.
+
+        Orders changed without loading their items (status transitions)
+        only update the fields of a cached copy; uncached ones stay uncached.
+        """
+        if self.enabled:
+            if "items" in inspect(order).unloaded:
+                self._patch(order)
+            else:
+                self.put(order)
+        if self.broadcast is not None:
+            self.broadcast.send(order)
+
+    def clear(self):
+        self._entries.clear()
+        ORDER_CACHE_SIZE.set(0)
+
+
+class CacheInvalidationBroadcast:
+    """
+    Invalidates the order caches of the other replicas over the events exchange.
+
+    Each replica binds its own exclusive, auto-deleted queue to
+    ``cache.order.invalidated`` and drops the orders other replicas announce
+    as changed. The announcements carry the status change, which is also
+    handed to ``on_change`` (the status streams of this replica). Messages
+    are transient and unacknowledged: one lost only leaves an order stale
+    until its TTL.
+    """
+
+    def __init__(
+        self,
+        cache: OrderCache,
+        exchange_name: str = "microservice.events",
+        pool: Optional[ChannelPool] = None,
+        on_change: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        """
+        Args:
+            cache: Cache to invalidate
+            exchange_name: Exchange to broadcast on
+            pool: Channel pool (defaults to the process-wide pool)
+            on_change: Called with each status change of another replica
+        """
+        self.cache = cache
+        self.exchange_name = exchange_name
+        self._pool = pool
+        self.on_change = on_change
+        self.replica_id = uuid4().hex
+
+        self._pooled: Optional[PooledChannel] = None
+        self._queue: Optional[AbstractQueue] = None
+        self._sending: set[asyncio.Task] = set()
+
+    @property
+    def pool(self) -> ChannelPool:
+        return self._pool or get_channel_pool()
+
+    async def start(self):
+        """Start receiving invalidations and attach to the cache."""
+        self._pooled = await self.pool.checkout()
+        exchange = await self._pooled.get_exchange(self.exchange_name)
+
+        self._queue = await self._pooled.channel.declare_queue(
+            exclusive=True, auto_delete=True
+        )
+        await self._queue.bind(exchange, routing_key=INVALIDATION_ROUTING_KEY)
+        await self._queue.consume(self._on_message, no_ack=True)
+
+        self.cache.broadcast = self
+        logger.info(f"✓ Order cache invalidations via {self._queue.name}")
+
+    async def _on_message(self, message: AbstractIncomingMessage):
+        origin = (message.headers or {}).get("origin")
+        if isinstance(origin, bytes):
+            origin = origin.decode()
+        if origin == self.replica_id:
+            return
+
+        change = json.loads(message.body)
+        self.cache.invalidate(change["order_id"])
+        if self.on_change is not None:
+            self.on_change(change)
+
+    def send(self, order: Order):
+        """Announce a changed order, in the background."""
+        task = asyncio.create_task(self._send(status_change(order)))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def _send(self, change: Dict[str, Any]):
+        message = Message(
+            body=json.dumps(change).encode(),
+            content_type="application/json",
+            headers={"origin": self.replica_id},
+            delivery_mode=DeliveryMode.NOT_PERSISTENT,
+        )
+        try:
+            async with self.pool.acquire() as pooled:
+                exchange = await pooled.get_exchange(self.exchange_name)
+                await exchange.publish(message, routing_key=INVALIDATION_ROUTING_KEY)
+        except Exception as e:
+            logger.warning(
+                f"Failed to broadcast invalidation of {change['order_id']}: {e}"
+            )
+
+    async def stop(self):
+        """Detach from the cache and stop receiving."""
+        if self.cache.broadcast is self:
+            self.cache.broadcast = None
+
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
+
+        if self._pooled is not None:
+            # Closing the channel cancels the consumer and deletes the queue
+            await self.pool.checkin(self._pooled, discard=True)
+            self._pooled = None
+            self._queue = None
+
+
+order_cache = OrderCache()
@@ -1,11 +1,21 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+import os
+import sys
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from app.config import settings
 
-# Create async engine
-engine = create_async_engine(
-    settings.DATABASE_URL, echo=True, future=True, pool_pre_ping=True
-)
+# Add shared library to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../../.."))
+from shared.database import PoolAutosizer, create_db_engine
+from shared.startup import FingerprintStore, ensure_schema
+
+# Create async engine (pool sizing and statement logging: DB_* settings)
+engine = create_db_engine(settings.DATABASE_URL, settings.SERVICE_NAME)
+
+# Resizes the pool from checkout waits when DB_POOL_AUTOSIZE is set
+pool_autosizer = PoolAutosizer(engine)
 
 # Create async session factory
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
@@ -23,7 +33,6 @@ async def get_db():
             await session.close()
 
 
-async def init_db():
-    """Initialize database tables."""
-    async with engine.begin() as con:
-        await con.run_sync(Base.metadata.create_all)
+async def init_db(fingerprints: Optional[FingerprintStore] = None):
+    """Initialize database tables, unless the schema is unchanged since last time."""
+    await ensure_schema(engine, Base.metadata, fingerprints)
@@ -1,96 +1,164 @@
 import os
 import sys
-import json
+from typing import Optional
 from aio_pika.abc import AbstractIncomingMessage
 
+from app.config import settings
 from app.db.session import async_session
+from app.models.processed_event import ProcessedEvent
+from app.sagas import SagaStage, saga_tracker
 from app.services.order_service import OrderService
 
 # Add shared library to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../../.."))
-from shared.messaging import EventConsumer
+from shared.events import (
+    InventoryReservedEvent,
+    InventoryInsufficientEvent,
+    PaymentProcessedEvent,
+    PaymentFailedEvent,
+)
+from shared.messaging import (
+    DuplicateEvent,
+    EventConsumer,
+    EventDispatcher,
+    ProcessedEventCache,
+    SqlProcessedEventStore,
+    record_processed,
+)
 from shared.models.enums import EventType
+from shared.startup import FingerprintStore, attach_consumers
+from shared.tracing import consume_span
 
 
-async def handle_inventory_reserved(message: AbstractIncomingMessage):
-    """Handle InventoryReservedEvent."""
-    try:
-        event_data = json.loads(message.body.decode())
-        order_id = event_data.get("order_id")
+inventory_dispatcher = EventDispatcher()
+payment_dispatcher = EventDispatcher()
 
-        print(f"[Order Service] Inventory reserved for order {order_id}")
 
-        # Delegate to service layer
-        async with async_session() as db:
-            service = OrderService(db)
-            await service.update_to_processing(order_id)
+@inventory_dispatcher.on(EventType.INVENTORY_RESERVED)
+async def handle_inventory_reserved(
+    service: OrderService, event: InventoryReservedEvent
+):
+    """Handle InventoryReservedEvent."""
+    print(f"[Order Service] Inventory reserved for order {event.order_id}")
 
-    except Exception as e:
-        print(f"[Order Service] Error handling inventory_reserved: {e}")
+    # A late or duplicated event leaves the order (and saga) as it is
+    if await service.update_to_processing(event.order_id):
+        saga_tracker.record(
+            event.correlation_id, SagaStage.RESERVED, at=event.timestamp
+        )
 
 
-async def handle_inventory_insufficient(message: AbstractIncomingMessage):
+@inventory_dispatcher.on(EventType.INVENTORY_INSUFFICIENT)
+async def handle_inventory_insufficient(
+    service: OrderService, event: InventoryInsufficientEvent
+):
     """Handle InventoryInsufficientEvent."""
-    try:
-        event_data = json.loads(message.body.decode())
-        order_id = event_data.get("order_id")
-        correlation_id = event_data.get("correlation_id")
+    print(f"[Order Service] Insufficient inventory for order {event.order_id}")
 
-        print(f"[Order Service] Insufficient inventory for order {order_id}")
+    # Ends the saga (see OrderService), unless it already has
+    await service.cancel_order(
+        order_id=event.order_id,
+        reason="Insufficient inventory",
+        correlation_id=event.correlation_id,
+    )
 
-        # Delegate to service layer
-        async with async_session() as db:
-            service = OrderService(db)
-            await service.cancel_order(
-                order_id=order_id,
-                reason="Insufficient inventory",
-                correlation_id=correlation_id,
-            )
 
-    except Exception as e:
-        print(f"[Order Service] Error handling inventory_insufficient: {e}")
+@payment_dispatcher.on(EventType.PAYMENT_PROCESSED)
+async def handle_payment_processed(
+    service: OrderService, event: PaymentProcessedEvent
+):
+    """Handle PaymentProcessedEvent."""
+    print(f"[Order Service] Payment processed for order {event.order_id}")
 
+    # Before the confirmation, which ends the saga
+    saga_tracker.record(
+        event.correlation_id, SagaStage.PAYMENT_PROCESSED, at=event.timestamp
+    )
+    await service.confirm_order(event.order_id)
 
-async def handle_payment_processed(message: AbstractIncomingMessage):
-    """Handle PaymentProcessedEvent."""
-    try:
-        event_data = json.loads(message.body.decode())
-        order_id = event_data.get("order_id")
 
-        print(f"[Order Service] Payment processed for order {order_id}")
+@payment_dispatcher.on(EventType.PAYMENT_FAILED)
+async def handle_payment_failed(service: OrderService, event: PaymentFailedEvent):
+    """Handle PaymentFailedEvent."""
+    reason = event.reason or "Payment failed"
+    print(f"[Order Service] Payment failed for order {event.order_id}: {reason}")
 
-        # Delegate to service layer
-        async with async_session() as db:
-            service = OrderService(db)
-            await service.confirm_order(order_id)
+    # Before the cancellation, which ends the saga
+    saga_tracker.record(
+        event.correlation_id, SagaStage.PAYMENT_FAILED, at=event.timestamp
+    )
+    await service.cancel_order(
+        order_id=event.order_id, reason=reason, correlation_id=event.correlation_id
+    )
 
-    except Exception as e:
-        print(f"[Order Service] Error handling payment_processed: {e}")
 
+def make_router(dispatcher: EventDispatcher):
+    """Route each message to its handler with its own session."""
 
-async def handle_payment_failed(message: AbstractIncomingMessage):
-    """Handle PaymentFailedEvent."""
-    try:
-        event_data = json.loads(message.body.decode())
-        order_id = event_data.get("order_id")
-        reason = event_data.get("reason", "Payment failed")
-        correlation_id = event_data.get("correlation_id")
+    async def router(message: AbstractIncomingMessage):
+        try:
+            handler, event = dispatcher.resolve(message)
+            if not handler:
+                return
 
-        print(f"[Order Service] Payment failed for order {order_id}: {reason}")
+            # Delegate to service layer
+            async with async_session() as db:
+                await handler(OrderService(db), event)
+        except Exception as e:
+            print(f"[Order Service] Error handling message {message.message_id}: {e}")
+            raise  # Retried by the consumer
 
-        # Delegate to service layer
-        async with async_session() as db:
-            service = OrderService(db)
-            await service.cancel_order(
-                order_id=order_id, reason=reason, correlation_id=correlation_id
-            )
+    return router
+
+
+def make_batch_router(dispatcher: EventDispatcher, queue_name: str):
+    """Route a batch of messages through one session and one commit."""
 
-    except Exception as e:
-        print(f"[Order Service] Error handling payment_failed: {e}")
+    async def batch_router(
+        messages: list[AbstractIncomingMessage],
+    ) -> list[Optional[BaseException]]:
+        results: list[Optional[BaseException]] = []
+
+        async with async_session() as db:
+            service = OrderService(db, autocommit=False)
+
+            for message in messages:
+                try:
+                    handler, event = dispatcher.resolve(message)
+                    if handler:
+                        # Savepoint, so one bad event doesn't undo the batch;
+                        # each event continues its own trace. The event ID
+                        # is recorded in it, along with the event's changes
+                        with consume_span(message, queue_name):
+                            async with db.begin_nested():
+                                await record_processed(db, message.message_id)
+                                await handler(service, event)
+                    results.append(None)
+                except DuplicateEvent as e:
+                    results.append(e)
+                except Exception as e:
+                    print(f"[Order Service] Error handling batched event: {e}")
+                    results.append(e)
+
+            await db.commit()
+            service.committed()
+
+        return results
+
+    return batch_router
+
+
+def make_idempotency(queue_name: str) -> ProcessedEventCache:
+    """Processed event IDs for a queue, persisted in the order database."""
+    return ProcessedEventCache(
+        queue_name, store=SqlProcessedEventStore(async_session, ProcessedEvent)
+    )
 
 
-async def start_consumers():
-    """Start all event consumers."""
+async def start_consumers(
+    fingerprints: Optional[FingerprintStore] = None,
+) -> list[EventConsumer]:
+    """Start all event consumers, concurrently."""
 
     # Consumer for inventory events
     inventory_consumer = EventConsumer(
@@ -99,35 +167,38 @@ async def start_consumers():
             EventType.INVENTORY_RESERVED,
             EventType.INVENTORY_INSUFFICIENT,  # Added!
         ],
+        idempotency=make_idempotency("order_service.inventory"),
+        topology_cache=fingerprints,
     )
 
     # Consumer for payment events
     payment_consumer = EventConsumer(
         queue_name="order_service.payment",
         routing_keys=[EventType.PAYMENT_PROCESSED, EventType.PAYMENT_FAILED],
+        idempotency=make_idempotency("order_service.payment"),
+        topology_cache=fingerprints,
     )
 
-    # Route inventory events
-    async def inventory_router(message: AbstractIncomingMessage):
-        event_data = json.loads(message.body.decode())
-        event_type = event_data.get("event_type")
-
-        if event_type == EventType.INVENTORY_RESERVED:
-            await handle_inventory_reserved(message)
-        elif event_type == EventType.INVENTORY_INSUFFICIENT:
-            await handle_inventory_insufficient(message)
-
-    # Route payment events
-    async def payment_router(message: AbstractIncomingMessage):
-        event_data = json.loads(message.body.decode())
-        event_type = event_data.get("event_type")
-
-        if event_type == EventType.PAYMENT_PROCESSED:
-            await handle_payment_processed(message)
-        elif event_type == EventType.PAYMENT_FAILED:
-            await handle_payment_failed(message)
-
-    await inventory_consumer.consume(inventory_router)
-    await payment_consumer.consume(payment_router)
+    consumers = [
+        (inventory_consumer, inventory_dispatcher),
+        (payment_consumer, payment_dispatcher),
+    ]
+
+    attachments = []
+    for consumer, dispatcher in consumers:
+        if settings.CONSUMER_BATCH_SIZE > 1:
+            attach = consumer.consume_batch(
+                make_batch_router(dispatcher, consumer.queue_name),
+                max_messages=settings.CONSUMER_BATCH_SIZE,
+                max_wait_ms=settings.CONSUMER_BATCH_WAIT_MS,
+            )
+        else:
+            # Events for the same order (correlation_id) stay in order across workers
+            attach = consumer.consume(
+                make_router(dispatcher), workers=settings.CONSUMER_WORKERS
+            )
+        attachments.append((consumer, attach))
 
+    started = await attach_consumers(attachments)
     print("[Order Service] Event consumers started")
+    return started
@@ -1,21 +1,41 @@
 import asyncio
 import logging
+import os
+import sys
+from functools import partial
 
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 from prometheus_client import make_asgi_app
 
 from app.config import settings
-from app.db.session import init_db, engine
-from app.api import orders_router
+from app.db.session import init_db, engine, pool_autosizer
+from app.api import orders_router, sagas_router, streams_router
+from app.cache import CacheInvalidationBroadcast, order_cache
+from app.streams import order_hub
 from app.events import start_consumers
-from app.services.order_service import event_publisher
+from app.services.order_service import event_publisher, outbox_relay
+
+# Add shared library to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../.."))
+from shared.startup import (
+    ConsumerSupervisor,
+    FingerprintStore,
+    Readiness,
+    warm_channels,
+    warm_db_pool,
+)
+from shared.tracing import setup_tracing, shutdown_tracing
 
 # Configure logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
 
+# Reported by /ready; traffic should only arrive once all are ready
+readiness = Readiness("database", "publisher", "consumers")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -23,23 +43,48 @@ async def lifespan(app: FastAPI):
     # Startup
     print(f"[{settings.SERVICE_NAME}] Starting up...")
 
-    # Initialize database
-    await init_db()
+    # Schema and topology fingerprints from previous starts
+    fingerprints = FingerprintStore(engine)
+    await fingerprints.load()
+
+    # Initialize database while connections and channels open
+    await asyncio.gather(init_db(fingerprints), warm_db_pool(engine), warm_channels())
+    readiness.mark_ready("database")
+    pool_autosizer.start()
     print(f"[{settings.SERVICE_NAME}] Database initialized")
 
     # Connect event publisher
     await event_publisher.connect()
+    readiness.mark_ready("publisher")
     print(f"[{settings.SERVICE_NAME}] Event publisher connected")
 
-    # Start event consumers in background
-    asyncio.create_task(start_consumers())
+    # Relay committed outbox events to RabbitMQ
+    outbox_relay.start()
+
+    # Keep the order caches and status streams of all replicas coherent
+    cache_broadcast = None
+    if settings.ORDER_CACHE_BROADCAST:
+        cache_broadcast = CacheInvalidationBroadcast(
+            order_cache, on_change=order_hub.publish_change
+        )
+        await cache_broadcast.start()
+
+    # Attach event consumers in background, retrying until they are up
+    supervisor = ConsumerSupervisor(partial(start_consumers, fingerprints), readiness)
+    supervisor.start()
 
     yield
 
     # Shutdown
     print(f"[{settings.SERVICE_NAME}] Shutting down...")
+    await supervisor.stop()
+    if cache_broadcast:
+        await cache_broadcast.stop()
+    await outbox_relay.stop()
     await event_publisher.close()
+    await pool_autosizer.stop()
     await engine.dispose()
+    shutdown_tracing()
 
 
 # Create FastAPI app
@@ -51,7 +96,20 @@ app = FastAPI(
 )
 
 # Include routers
+# Before orders_router, whose /orders/{order_id} would match /orders/events
+app.include_router(streams_router)
 app.include_router(orders_router)
+app.include_router(sagas_router)
+
+# Trace requests, queries and events (sampled, exported to Jaeger over OTLP)
+setup_tracing(
+    app,
+    engine,
+    settings.SERVICE_NAME,
+    endpoint=settings.JAEGER_ENDPOINT,
+    sample_rate=settings.TRACING_SAMPLE_RATE,
+    enabled=settings.TRACING_ENABLED,
+)
 
 # Add Prometheus metrics endpoint
 metrics_app = make_asgi_app()
@@ -64,6 +122,14 @@ async def health_check():
     return {"status": "healthy", "service": settings.SERVICE_NAME}
 
 
+@app.get("/ready")
+async def ready_check():
+    """Readiness endpoint: 200 once consumers are attached, 503 until then."""
+    return JSONResponse(
+        readiness.status(), status_code=200 if readiness.is_ready else 503
+    )
+
+
 @app.get("/")
 async def root():
     """Root endpoint."""
@@ -1,5 +1,7 @@
 """Database models."""
 
 from .order import Order, OrderItem
+from .outbox import OutboxEvent
+from .processed_event import ProcessedEvent
 
-__all__ = ["Order", "OrderItem"]
+__all__ = ["Order", "OrderItem", "OutboxEvent", "ProcessedEvent"]
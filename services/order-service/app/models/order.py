@@ -6,6 +6,7 @@ from sqlalchemy import (
     Integer,
     DateTime,
     ForeignKey,
+    Index,
     Enum as SQLEnum,
 )
 from sqlalchemy.orm import relationship
@@ -17,10 +18,45 @@ from app.db.session import Base
 from shared.models.enums import OrderStatus
 
 
+# Statuses an order may move to from each status; anything else (a late or
+# duplicated event) leaves the order as it is
+ORDER_TRANSITIONS: dict[OrderStatus, frozenset[OrderStatus]] = {
+    OrderStatus.PENDING: frozenset(
+        {
+            OrderStatus.PROCESSING,
+            # Payment events can overtake the inventory event
+            OrderStatus.CONFIRMED,
+            OrderStatus.CANCELLED,
+            OrderStatus.FAILED,
+        }
+    ),
+    OrderStatus.PROCESSING: frozenset(
+        {OrderStatus.CONFIRMED, OrderStatus.CANCELLED, OrderStatus.FAILED}
+    ),
+    OrderStatus.CONFIRMED: frozenset({OrderStatus.COMPLETED, OrderStatus.CANCELLED}),
+    OrderStatus.COMPLETED: frozenset(),
+    OrderStatus.CANCELLED: frozenset(),
+    OrderStatus.FAILED: frozenset(),
+}
+
+
+def allowed_sources(status: OrderStatus) -> list[OrderStatus]:
+    """Statuses an order can move to ``status`` from."""
+    return [
+        source for source, targets in ORDER_TRANSITIONS.items() if status in targets
+    ]
+
+
 class Order(Base):
     """Order model."""
 
     __tablename__ = "orders"
+    __table_args__ = (
+        # Keyset pagination: newest first, per filter, without sorting
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index("ix_orders_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_orders_status_created_at_id", "status", "created_at", "id"),
+    )
 
     id = Column(String, primary_key=True)
     user_id = Column(String, nullable=False, index=True)
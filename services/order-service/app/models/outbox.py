@@ -0,0 +1,9 @@
+from app.db.session import Base
+
+from shared.outbox import OutboxMixin
+
+
+class OutboxEvent(OutboxMixin, Base):
+    """Events waiting to be relayed to RabbitMQ."""
+
+    __tablename__ = "outbox_events"
@@ -0,0 +1,9 @@
+from app.db.session import Base
+
+from shared.messaging.idempotency import ProcessedEventMixin
+
+
+class ProcessedEvent(ProcessedEventMixin, Base):
+    """IDs of events already handled by this service's consumers."""
+
+    __tablename__ = "processed_events"
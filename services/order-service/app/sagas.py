@@ -0,0 +1,153 @@
+"""Saga stage latency tracking, keyed on correlation ID (the order ID)."""
+
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Dict, List, Optional
+
+from prometheus_client import Gauge, Histogram
+
+from app.config import settings
+
+SAGA_STAGE_SECONDS = Histogram(
+    "order_saga_stage_seconds",
+    "Time between consecutive stages of an order saga",
+    ["from_stage", "to_stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+SAGA_DURATION_SECONDS = Histogram(
+    "order_saga_duration_seconds",
+    "Time from order creation to confirmation or cancellation",
+    ["outcome"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+SAGAS_IN_FLIGHT = Gauge(
+    "order_sagas_in_flight",
+    "Order sagas created but not yet confirmed or cancelled",
+)
+
+
+class SagaStage(str, Enum):
+    """Stages of the order saga, as seen by the order service."""
+
+    CREATED = "created"
+    RESERVED = "reserved"
+    PAYMENT_PROCESSED = "payment_processed"
+    PAYMENT_FAILED = "payment_failed"
+    CONFIRMED = "confirmed"
+    CANCELLED = "cancelled"
+
+
+TERMINAL_STAGES = (SagaStage.CONFIRMED, SagaStage.CANCELLED)
+
+
+class SagaTracker:
+    """
+    Records when each saga stage happened, per correlation ID.
+
+    Each stage observes a ``order_saga_stage_seconds`` sample from the
+    previous one (e.g. created -> reserved is inventory, reserved ->
+    payment_processed is payment), so the histograms show which service
+    holds orders up. Sagas stay in memory until they are confirmed or
+    cancelled; at most ``window`` are kept, oldest evicted first.
+
+    Reserved and payment stages are timed by the downstream event's
+    timestamp rather than by when the order service consumed it, so a
+    backlog on the order service's queues is charged to the next stage.
+    """
+
+    def __init__(self, window: int = settings.SAGA_TRACKER_WINDOW):
+        """
+        Args:
+            window: In-flight sagas to keep (0 disables tracking)
+        """
+        self.window = window
+        self._sagas: "OrderedDict[str, Dict[SagaStage, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sagas)
+
+    def record(
+        self,
+        correlation_id: Optional[str],
+        stage: SagaStage,
+        at: Optional[datetime] = None,
+    ):
+        """
+        Record that a saga reached a stage.
+
+        Only CREATED starts tracking a saga; later stages of sagas not
+        (or no longer) tracked are ignored.
+
+        Args:
+            correlation_id: Saga correlation ID
+            stage: Stage reached
+            at: When it was reached (defaults to now)
+        """
+        if not correlation_id or self.window <= 0:
+            return
+
+        timestamp = at.timestamp() if at else time.time()
+
+        if stage == SagaStage.CREATED:
+            if correlation_id not in self._sagas:
+                self._sagas[correlation_id] = {stage: timestamp}
+                while len(self._sagas) > self.window:
+                    self._sagas.popitem(last=False)
+                SAGAS_IN_FLIGHT.set(len(self._sagas))
+            return
+
+        stages = self._sagas.get(correlation_id)
+        if stages is None or stage in stages:
+            return  # Untracked, or a redelivery
+
+        previous, since = max(stages.items(), key=lambda item: item[1])
+        # Clocks of different services may disagree slightly
+        SAGA_STAGE_SECONDS.labels(
+            from_stage=previous.value, to_stage=stage.value
+        ).observe(max(timestamp - since, 0.0))
+        stages[stage] = timestamp
+
+        if stage in TERMINAL_STAGES:
+            SAGA_DURATION_SECONDS.labels(outcome=stage.value).observe(
+                max(timestamp - stages[SagaStage.CREATED], 0.0)
+            )
+            del self._sagas[correlation_id]
+            SAGAS_IN_FLIGHT.set(len(self._sagas))
+
+    def slowest(self, limit: int = 10) -> List[dict]:
+        """
+        The in-flight sagas that have been running longest.
+
+        Args:
+            limit: Number of sagas to return
+
+        Returns:
+            Sagas by descending age, each with its current stage, how long
+            it has been running and waiting in that stage, and the time of
+            each stage reached
+        """
+        now = time.time()
+        # Oldest first, since sagas are tracked in creation order
+        sagas = []
+        for correlation_id, stages in self._sagas.items():
+            if len(sagas) >= limit:
+                break
+            stage, since = max(stages.items(), key=lambda item: item[1])
+            sagas.append(
+                {
+                    "correlation_id": correlation_id,
+                    "stage": stage.value,
+                    "age_seconds": round(now - stages[SagaStage.CREATED], 3),
+                    "stage_age_seconds": round(now - since, 3),
+                    "stages": {
+                        s.value: datetime.fromtimestamp(t, timezone.utc).isoformat()
+                        for s, t in stages.items()
+                    },
+                }
+            )
+        return sagas
+
+
+saga_tracker = SagaTracker()
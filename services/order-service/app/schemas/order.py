@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel, Field
 import sys
 import os
@@ -60,3 +60,30 @@ class OrderListResponse(BaseModel):
 
     orders: List[OrderResponse]
     total: int
+    # Planner estimate rather than an exact count (see ``count``)
+    total_is_estimate: bool = False
+    # Pass as ``cursor`` for the next page; None on the last page
+    next_cursor: Optional[str] = None
+
+
+class OrderBatchCreate(BaseModel):
+    """Schema for creating orders in bulk."""
+
+    # Validated one by one, so an invalid order fails alone
+    orders: List[Dict[str, Any]] = Field(min_length=1)
+
+
+class OrderBatchResult(BaseModel):
+    """Outcome of one order of a bulk creation."""
+
+    index: int
+    order: Optional[OrderResponse] = None
+    error: Optional[str] = None
+
+
+class OrderBatchResponse(BaseModel):
+    """Schema for bulk order creation response."""
+
+    results: List[OrderBatchResult]
+    created: int
+    failed: int
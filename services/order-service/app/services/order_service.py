@@ -1,8 +1,11 @@
+import base64
+import binascii
+import json
 from datetime import datetime, timezone
 from uuid import uuid4
 from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import func, select, text, tuple_, update
 from sqlalchemy.orm import selectinload
 import sys
 import os
@@ -13,21 +16,105 @@ from shared.events import OrderCreatedEvent, OrderConfirmedEvent, OrderCancelled
 from shared.models.items import OrderItem as SharedOrderItem
 from shared.models.enums import OrderStatus
 from shared.messaging.publisher import EventPublisher
-
-from app.models.order import Order, OrderItem
+from shared.outbox import OutboxRelay
+
+from app.cache import order_cache
+from app.config import settings
+from app.db.session import async_session
+from app.models.order import Order, OrderItem, allowed_sources
+from app.models.outbox import OutboxEvent
+from app.sagas import SagaStage, saga_tracker
 from app.schemas.order import OrderCreate
+from app.streams import order_hub
 
 event_publisher = EventPublisher()
+outbox_relay = OutboxRelay(async_session, OutboxEvent, event_publisher)
+
+
+# Saga stages recorded when an order reaches a final status, by any path
+SAGA_END_STAGES = {
+    OrderStatus.CONFIRMED: SagaStage.CONFIRMED,
+    OrderStatus.CANCELLED: SagaStage.CANCELLED,
+}
+
+
+def _changed(order: Order):
+    """Pass a committed order change to the cache, status streams and sagas."""
+    order_cache.updated(order)
+    order_hub.publish(order)
+
+    stage = SAGA_END_STAGES.get(order.status)
+    if stage is not None:
+        # Sagas are tracked by correlation ID, which is the order ID
+        saga_tracker.record(order.id, stage)
+
+
+class OrderNotFound(ValueError):
+    """The order of a status change doesn't exist."""
+
+
+class InvalidCursor(ValueError):
+    """A pagination cursor that wasn't issued by list_orders_page."""
+
+
+def encode_cursor(order: Order) -> str:
+    """Opaque cursor pointing just past an order, in (created_at, id) order."""
+    position = json.dumps([order.created_at.isoformat(), order.id])
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """
+    Position encoded by encode_cursor.
+
+    Raises:
+        InvalidCursor: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, order_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), str(order_id)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
 
 
 class OrderService:
     """Order service for business logic."""
 
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, autocommit: bool = True):
+        """
+        Args:
+            db: Database session
+            autocommit: Commit after each status change. Batch consumers
+                pass False, commit the shared transaction themselves and
+                then call committed().
+        """
         self.db = db
+        self.autocommit = autocommit
+        # Orders changed in the caller's transaction, not yet committed
+        self.changed: list[Order] = []
 
-    async def create_order(self, order_data: OrderCreate):
-        """Create a new order and publish OrderCreateEvent."""
+    async def _commit(self, order: Order):
+        """Commit a status change, or only flush it inside a caller's transaction."""
+        if not self.autocommit:
+            await self.db.flush()
+            self.changed.append(order)
+            return
+
+        await self.db.commit()
+        outbox_relay.notify()
+        _changed(order)
+
+    def committed(self):
+        """Publish the changes of a caller's committed transaction."""
+        for order in self.changed:
+            _changed(order)
+        self.changed.clear()
+        outbox_relay.notify()
+
+    @staticmethod
+    def _build_order(order_data: OrderCreate) -> tuple[Order, OutboxEvent]:
+        """A new order and the outbox row of its OrderCreatedEvent."""
 
         # Calculate total amount
         total_amount = sum(item.quantity * item.price for item in order_data.items)
@@ -47,20 +134,13 @@ class OrderService:
             )
             order.items.append(order_item)
 
-        # Save to database
-        self.db.add(order)
-
         items_data = [
             SharedOrderItem(
                 product_id=item.product_id, quantity=item.quantity, price=item.price
             )
-            for item in order.items  # Access while in session
+            for item in order.items
         ]
 
-        await self.db.commit()
-        await self.db.refresh(order, ["items"])
-
-        # Publish OrderCreateEvent
         event = OrderCreatedEvent(
             order_id=order.id,
             user_id=order.user_id,
@@ -68,10 +148,56 @@ class OrderService:
             total_amount=order.total_amount,
             correlation_id=order.id,
         )
-        await event_publisher.publish_event(event)
+        return order, OutboxEvent.from_event(event)
+
+    async def create_order(self, order_data: OrderCreate):
+        """Create a new order and publish OrderCreateEvent."""
+
+        order, outbox_event = self._build_order(order_data)
+
+        # Save to database, with OrderCreateEvent in the same transaction
+        self.db.add(order)
+        self.db.add(outbox_event)
+
+        await self.db.commit()
+        await self.db.refresh(order, ["items"])
+        outbox_relay.notify()
+        saga_tracker.record(order.id, SagaStage.CREATED)
+        # Clients poll the new order right away
+        _changed(order)
 
         return order
 
+    async def create_orders(self, orders_data: list[OrderCreate]) -> list[Order]:
+        """
+        Create several orders in one transaction and publish their events.
+
+        Orders, items and outbox rows are flushed together, so each table
+        gets multi-row INSERTs, and the relay is asked to publish the whole
+        burst of OrderCreatedEvents as one pipelined batch.
+
+        Args:
+            orders_data: Validated orders
+
+        Returns:
+            The created orders, in the same order
+        """
+        built = [self._build_order(order_data) for order_data in orders_data]
+        orders = [order for order, _ in built]
+
+        self.db.add_all(orders)
+        self.db.add_all([outbox_event for _, outbox_event in built])
+
+        # Every column is set client-side, so no refresh is needed
+        await self.db.commit()
+        outbox_relay.notify(pending=len(orders))
+
+        for order in orders:
+            saga_tracker.record(order.id, SagaStage.CREATED)
+            _changed(order)
+
+        return orders
+
     async def get_order(self, order_id: str):
         """Get order by ID."""
 
@@ -80,6 +206,16 @@ class OrderService:
         )
         return result.scalar_one_or_none()
 
+    @staticmethod
+    def _filtered(
+        query, user_id: Optional[str] = None, status: Optional[OrderStatus] = None
+    ):
+        if user_id:
+            query = query.where(Order.user_id == user_id)
+        if status:
+            query = query.where(Order.status == status)
+        return query
+
     async def list_orders(
         self,
         user_id: Optional[str] = None,
@@ -87,83 +223,245 @@ class OrderService:
         skip: int = 0,
         limit: int = 0,
     ):
-        """List orders with optional filters."""
+        """List orders with optional filters (offset paging)."""
 
-        query = select(Order).options(selectinload(Order.items))
+        query = self._filtered(
+            select(Order).options(selectinload(Order.items)), user_id, status
+        )
+        query = (
+            query.offset(skip)
+            .limit(limit)
+            .order_by(Order.created_at.desc(), Order.id.desc())
+        )
 
-        if user_id:
-            query = query.where(Order.user_id == user_id)
-        if status:
-            query = query.where(Order.status == status)
+        result = await self.db.execute(query)
+        return list(result.scalars().all())
 
-        query = query.offset(skip).limit(limit).order_by(Order.created_at.desc())
+    async def list_orders_page(
+        self,
+        user_id: Optional[str] = None,
+        status: Optional[OrderStatus] = None,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+    ) -> tuple[list[Order], Optional[str]]:
+        """
+        List orders with optional filters, newest first, by keyset pagination.
+
+        Each page seeks to its cursor through the (created_at, id) indexes,
+        so deep pages cost the same as the first.
+
+        Args:
+            user_id: Only this user's orders
+            status: Only orders in this status
+            cursor: next_cursor of the previous page (None for the first page)
+            limit: Page size
+
+        Returns:
+            The page of orders, and the cursor of the next page (None on the
+            last page)
+
+        Raises:
+            InvalidCursor: If the cursor is malformed
+        """
+        query = self._filtered(
+            select(Order).options(selectinload(Order.items)), user_id, status
+        )
+        if cursor:
+            created_at, order_id = decode_cursor(cursor)
+            query = query.where(
+                tuple_(Order.created_at, Order.id) < tuple_(created_at, order_id)
+            )
+
+        # One extra row tells whether there is a next page
+        query = query.order_by(Order.created_at.desc(), Order.id.desc()).limit(
+            limit + 1
+        )
 
         result = await self.db.execute(query)
-        return list(result.scalars().all())
+        orders = list(result.scalars().all())
 
-    async def update_to_processing(self, order_id: str) -> Order | None:
-        """Update order status to PROCESSING when inventory is reserved."""
-        order = await self.get_order(order_id)
+        if len(orders) <= limit:
+            return orders, None
+        orders = orders[:limit]
+        return orders, encode_cursor(orders[-1])
 
-        if not order:
-            print(f"[Order Service] Order {order_id} not found")
+    async def count_orders(
+        self,
+        user_id: Optional[str] = None,
+        status: Optional[OrderStatus] = None,
+        mode: str = "auto",
+        exact_limit: int = settings.ORDER_COUNT_EXACT_LIMIT,
+    ) -> tuple[int, bool]:
+        """
+        Count the orders matching the filters of a listing.
+
+        Runs in its own session, so it can run concurrently with the page
+        query. Modes:
+
+        - ``exact``: ``count(*)``
+        - ``estimate``: the planner's row estimate (PostgreSQL; exact elsewhere)
+        - ``auto``: exact up to ``exact_limit`` rows, estimated beyond, so a
+          large listing never scans all its rows just to be counted
+
+        Args:
+            user_id: Only this user's orders
+            status: Only orders in this status
+            mode: ``auto``, ``exact`` or ``estimate``
+            exact_limit: Rows counted exactly in auto mode
+
+        Returns:
+            The total, and whether it is an estimate
+        """
+        ids = self._filtered(select(Order.id), user_id, status)
+
+        async with async_session() as db:
+            if mode == "estimate":
+                estimate = await self._estimate_rows(db, ids)
+                if estimate is not None:
+                    return estimate, True
+            elif mode == "auto":
+                capped = select(func.count()).select_from(
+                    ids.limit(exact_limit + 1).subquery()
+                )
+                total = (await db.execute(capped)).scalar_one()
+                if total <= exact_limit:
+                    return total, False
+                estimate = await self._estimate_rows(db, ids)
+                if estimate is not None:
+                    # The estimate may be stale; it is at least what was counted
+                    return max(estimate, total), True
+
+            total = (
+                await db.execute(select(func.count()).select_from(ids.subquery()))
+            ).scalar_one()
+            return total, False
+
+    @staticmethod
+    async def _estimate_rows(db: AsyncSession, query) -> Optional[int]:
+        """Planner row estimate of a query (None unless on PostgreSQL)."""
+        dialect = db.bind.dialect
+        if dialect.name != "postgresql":
             return None
 
-        if order.status != OrderStatus.PENDING:
-            print(f"[Order Service] Order {order_id} already in status {order.status}")
+        # Filter values are escaped as literals; EXPLAIN takes no parameters
+        sql = query.compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+        plan = (await db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))).scalar_one()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    async def _transition(
+        self, order_id: str, status: OrderStatus, **values
+    ) -> Optional[Order]:
+        """
+        Move an order to a status, if ORDER_TRANSITIONS allows it.
+
+        A single ``UPDATE ... WHERE id = ... AND status IN (...) RETURNING``,
+        so concurrent events can't both apply and the order needn't be read
+        first. Its items are not loaded.
+
+        Args:
+            order_id: Order to update
+            status: New status
+            **values: Other columns to set
+
+        Returns:
+            The updated order, or None if it can't make the transition
+            (e.g. a late or duplicated event)
+
+        Raises:
+            OrderNotFound: If the order doesn't exist
+        """
+        now = datetime.now(timezone.utc)
+        result = await self.db.execute(
+            update(Order)
+            .where(Order.id == order_id, Order.status.in_(allowed_sources(status)))
+            .values(status=status, updated_at=now, **values)
+            .returning(Order)
+            .execution_options(synchronize_session="fetch")
+        )
+        order = result.scalar_one_or_none()
+        if order is not None:
             return order
 
-        order.status = OrderStatus.PROCESSING
-        order.updated_at = datetime.now(timezone.utc)
-        await self.db.commit()
-        await self.db.refresh(order, ["items"])
+        current = (
+            await self.db.execute(select(Order.status).where(Order.id == order_id))
+        ).scalar_one_or_none()
+        if current is None:
+            raise OrderNotFound(f"Order {order_id} not found")
+
+        print(
+            f"[Order Service] Order {order_id} is {current.value}, "
+            f"not moving to {status.value}"
+        )
+        return None
+
+    async def update_to_processing(self, order_id: str) -> Order | None:
+        """Update order status to PROCESSING when inventory is reserved."""
+        try:
+            order = await self._transition(order_id, OrderStatus.PROCESSING)
+        except OrderNotFound:
+            print(f"[Order Service] Order {order_id} not found")
+            return None
+        if not order:
+            return None
+
+        await self._commit(order)
 
         print(f"[Order Service] Order {order_id} status updated to PROCESSING")
         return order
 
-    async def confirm_order(self, order_id: str):
-        """Confirm an order."""
-
-        order = await self.get_order(order_id)
-        if not order:
-            raise ValueError(f"Order {order_id} not found")
+    async def confirm_order(self, order_id: str) -> Order | None:
+        """
+        Confirm an order.
 
-        order.status = OrderStatus.CONFIRMED
-        order.confirmed_at = datetime.now(timezone.utc)
-        order.updated_at = datetime.now(timezone.utc)
+        Returns:
+            The order, or None if it can't be confirmed any more
 
-        await self.db.commit()
-        await self.db.refresh(order, ["items"])
+        Raises:
+            OrderNotFound: If the order doesn't exist
+        """
+        order = await self._transition(
+            order_id, OrderStatus.CONFIRMED, confirmed_at=datetime.now(timezone.utc)
+        )
+        if not order:
+            return None
 
-        # Publish OrderConfirmedEvent
+        # Record OrderConfirmedEvent
         event = OrderConfirmedEvent(
             order_id=order_id, user_id=order.user_id, correlation_id=order.id
         )
+        self.db.add(OutboxEvent.from_event(event))
 
-        await event_publisher.publish_event(event)
+        await self._commit(order)
         return order
 
-    async def cancel_order(self, order_id: str, reason: str, correlation_id: str):
-        """Cancel an order."""
-
-        order = await self.get_order(order_id)
-        if not order:
-            raise ValueError(f"Order {order_id} not found")
+    async def cancel_order(
+        self, order_id: str, reason: str, correlation_id: Optional[str] = None
+    ) -> Order | None:
+        """
+        Cancel an order.
 
-        order.status = OrderStatus.CANCELLED
-        order.cancelled_at = datetime.now(timezone.utc)
-        order.updated_at = datetime.now(timezone.utc)
+        Returns:
+            The order, or None if it can't be cancelled any more
 
-        await self.db.commit()
-        await self.db.refresh(order, ["items"])
+        Raises:
+            OrderNotFound: If the order doesn't exist
+        """
+        order = await self._transition(
+            order_id, OrderStatus.CANCELLED, cancelled_at=datetime.now(timezone.utc)
+        )
+        if not order:
+            return None
 
-        # Publish OrderCancelledEvent
+        # Record OrderCancelledEvent
         event = OrderCancelledEvent(
             order_id=order_id,
             user_id=order.user_id,
             reason=reason,
             correlation_id=correlation_id or order.id,
         )
+        self.db.add(OutboxEvent.from_event(event))
 
-        await event_publisher.publish_event(event)
+        await self._commit(order)
         return order
@@ -0,0 +1,162 @@
+"""In-process fan-out of order status changes to server-sent event streams."""
+
+import asyncio
+import json
+from typing import Any, Dict, Optional
+
+from prometheus_client import Counter, Gauge
+
+from app.config import settings
+from app.models.order import Order, OrderStatus
+
+# Statuses after which an order's stream ends: the end of its saga, or one
+# it can't leave. A confirmed order may still be completed or cancelled, but
+# nothing moves it on by itself, so its stream would otherwise never end.
+FINAL_STATUSES = {
+    OrderStatus.CONFIRMED.value,
+    OrderStatus.COMPLETED.value,
+    OrderStatus.CANCELLED.value,
+    OrderStatus.FAILED.value,
+}
+
+ORDER_STREAM_SUBSCRIBERS = Gauge(
+    "order_stream_subscribers",
+    "Open order status streams, by kind (order or user)",
+    ["kind"],
+)
+ORDER_STREAM_EVICTIONS = Counter(
+    "order_stream_evictions_total",
+    "Streams closed because their client fell too far behind",
+    ["kind"],
+)
+
+
+def status_change(order: Order) -> Dict[str, Any]:
+    """The status change of an order, as sent to streams and other replicas."""
+    status = getattr(order.status, "value", order.status)
+    return {
+        "order_id": order.id,
+        "user_id": order.user_id,
+        "status": status,
+        "updated_at": order.updated_at.isoformat() if order.updated_at else None,
+    }
+
+
+def format_event(change: Dict[str, Any], event: str = "status") -> str:
+    """A status change as a server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(change)}\n\n"
+
+
+class StreamFull(Exception):
+    """No more streams can be opened."""
+
+
+class Subscription:
+    """One client's stream: a bounded queue of status changes."""
+
+    def __init__(self, kind: str, key: str, max_queued: int):
+        self.kind = kind
+        self.key = key
+        self.evicted = False
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+
+    def offer(self, change: Dict[str, Any]) -> bool:
+        """Queue a change; False if the queue is full."""
+        try:
+            self._queue.put_nowait(change)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def evict(self):
+        """Drop what is queued and wake the reader to close the stream."""
+        self.evicted = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Next status change.
+
+        Returns:
+            The change, or None once the subscription has been evicted
+
+        Raises:
+            asyncio.TimeoutError: If nothing arrives within ``timeout``
+        """
+        return await asyncio.wait_for(self._queue.get(), timeout)
+
+
+class OrderEventHub:
+    """
+    Fans status changes out to the streams of an order and of its user.
+
+    Each stream has a bounded queue. A client that falls behind by a whole
+    queue is evicted rather than buffered without limit or allowed to slow
+    down the consumers publishing changes; it can reconnect and start over
+    from the order's current status.
+    """
+
+    def __init__(
+        self,
+        max_queued: int = settings.ORDER_STREAM_QUEUE_SIZE,
+        max_subscribers: int = settings.ORDER_STREAM_MAX_SUBSCRIBERS,
+    ):
+        """
+        Args:
+            max_queued: Changes queued per stream before it is evicted
+            max_subscribers: Most streams open at once
+        """
+        self.max_queued = max_queued
+        self.max_subscribers = max_subscribers
+        # (kind, key) -> subscriptions
+        self._subscribers: Dict[tuple[str, str], set[Subscription]] = {}
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def subscribe(self, kind: str, key: str) -> Subscription:
+        """
+        Open a stream of an order's (``kind="order"``) or a user's changes.
+
+        Raises:
+            StreamFull: If max_subscribers streams are already open
+        """
+        if self._count >= self.max_subscribers:
+            raise StreamFull(f"{self._count} streams open")
+
+        subscription = Subscription(kind, key, self.max_queued)
+        self._subscribers.setdefault((kind, key), set()).add(subscription)
+        self._count += 1
+        ORDER_STREAM_SUBSCRIBERS.labels(kind=kind).inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Close a stream (safe to call twice)."""
+        subscribers = self._subscribers.get((subscription.kind, subscription.key))
+        if not subscribers or subscription not in subscribers:
+            return
+
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[(subscription.kind, subscription.key)]
+        self._count -= 1
+        ORDER_STREAM_SUBSCRIBERS.labels(kind=subscription.kind).dec()
+
+    def publish(self, order: Order):
+        """Send an order's new status to its streams."""
+        self.publish_change(status_change(order))
+
+    def publish_change(self, change: Dict[str, Any]):
+        """Send a status change to the streams of its order and user."""
+        for kind, key in (("order", change["order_id"]), ("user", change["user_id"])):
+            for subscription in list(self._subscribers.get((kind, key), ())):
+                if not subscription.offer(change):
+                    self.unsubscribe(subscription)
+                    subscription.evict()
+                    ORDER_STREAM_EVICTIONS.labels(kind=kind).inc()
+
+
+order_hub = OrderEventHub()
@@ -0,0 +1,36 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The service's app package and the shared library at the repository root
+SERVICE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.abspath(os.path.join(SERVICE_ROOT, "../..")))
+sys.path.insert(0, SERVICE_ROOT)
+
+# Read when app is imported: a SQLite file and the in-memory broker
+os.environ.setdefault(
+    "DATABASE_URL",
+    f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'orders.db')}",
+)
+os.environ.setdefault("RABBITMQ_URL", "memory://")
+os.environ.setdefault("TRACING_ENABLED", "false")
+os.environ.setdefault("RABBITMQ_QUEUE_MONITOR_INTERVAL", "0")
+
+
+@pytest.fixture
+def database():
+    """Empty order tables; yields the session factory."""
+    import app.models  # noqa: F401  (registers the tables)
+    from app.db.session import Base, async_session, engine
+
+    async def recreate():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(recreate())
+    yield async_session
+    asyncio.run(engine.dispose())
@@ -0,0 +1,104 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app import admission
+from app.admission import AdmissionController
+
+
+def engine(size: int = 2, max_overflow: int = 1, checked_out: int = 0):
+    pool = SimpleNamespace(
+        size=lambda: size, max_overflow=max_overflow, checkedout=lambda: checked_out
+    )
+    return SimpleNamespace(pool=pool)
+
+
+def controller(
+    in_flight: int = 0,
+    confirm_latency: float = 0.0,
+    lag: float = 0.0,
+    db_engine=None,
+    max_in_flight: int = 0,
+) -> AdmissionController:
+    publisher = SimpleNamespace(
+        in_flight=in_flight, max_in_flight=100, confirm_latency=confirm_latency
+    )
+    return AdmissionController(
+        publisher,
+        SimpleNamespace(lag=lag),
+        db_engine or engine(),
+        max_in_flight=max_in_flight,
+        max_outbox_lag=5.0,
+        max_confirm_latency=1.0,
+    )
+
+
+@pytest.fixture(autouse=True)
+def broker_blocked(monkeypatch):
+    """Set ``blocked[0]`` to make the broker look blocked."""
+    blocked = [False]
+    monkeypatch.setattr(admission, "is_broker_blocked", lambda: blocked[0])
+    return blocked
+
+
+def rejection(controller: AdmissionController):
+    error = controller.check()
+    if error is None:
+        return None
+    return error.status_code, error.detail, error.headers["Retry-After"]
+
+
+def test_admits_while_nothing_is_under_pressure():
+    assert rejection(controller()) is None
+
+
+def test_blocked_broker_is_shed_first(broker_blocked):
+    broker_blocked[0] = True
+
+    status, detail, retry_after = rejection(controller(lag=60))
+
+    assert (status, retry_after) == (503, "5")
+    assert "broker_blocked" in detail
+
+
+@pytest.mark.parametrize(
+    "pressure, reason",
+    [
+        (dict(in_flight=95), "publish_backlog"),
+        (dict(in_flight=1, confirm_latency=2.5), "publish_latency"),
+        (dict(lag=12.0), "outbox_lag"),
+    ],
+)
+def test_downstream_pressure_is_a_503(pressure, reason):
+    status, detail, _ = rejection(controller(**pressure))
+
+    assert status == 503
+    assert reason in detail
+
+
+def test_slow_confirms_alone_are_not_pressure():
+    # Nothing in flight: the latency is from before the last quiet spell
+    assert rejection(controller(confirm_latency=2.5)) is None
+
+
+def test_retry_after_follows_the_outbox_lag():
+    _, _, retry_after = rejection(controller(lag=12.2))
+
+    assert retry_after == "13"
+
+
+def test_saturated_db_pool_is_a_429():
+    status, detail, _ = rejection(controller(db_engine=engine(checked_out=3)))
+
+    assert status == 429
+    assert "db_pool_saturated" in detail
+
+
+def test_admitted_requests_are_capped():
+    limited = controller(max_in_flight=2)
+    limited.in_flight = 2
+
+    status, detail, _ = rejection(limited)
+
+    assert status == 429
+    assert "too_many_requests" in detail
@@ -0,0 +1,76 @@
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+from app.cache import OrderCache
+from app.models.order import Order, OrderStatus
+
+UPDATED_AT = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def order(status: OrderStatus, updated_at: datetime = UPDATED_AT) -> Order:
+    return Order(
+        id="order-1",
+        user_id="user-1",
+        status=status,
+        total_amount=10.0,
+        items=[],
+        created_at=UPDATED_AT,
+        updated_at=updated_at,
+    )
+
+
+def cached_status(cache: OrderCache):
+    body = cache.get("order-1")
+    return body and json.loads(body)["status"]
+
+
+def test_serves_what_was_put():
+    cache = OrderCache(max_size=10, ttl=30)
+    assert cache.get("order-1") is None
+
+    cache.put(order(OrderStatus.PENDING))
+    assert cached_status(cache) == "pending"
+
+
+def test_older_version_does_not_replace_a_newer_one():
+    cache = OrderCache(max_size=10, ttl=30)
+    later = UPDATED_AT + timedelta(seconds=1)
+
+    cache.put(order(OrderStatus.CONFIRMED, updated_at=later))
+    # A slow read of the order before it was confirmed
+    cache.put(order(OrderStatus.PENDING))
+    assert cached_status(cache) == "confirmed"
+
+
+def test_read_started_before_an_invalidation_is_not_cached():
+    cache = OrderCache(max_size=10, ttl=30)
+
+    read_at = time.monotonic()
+    cache.invalidate("order-1")
+    cache.put(order(OrderStatus.PENDING), read_at)
+    assert cache.get("order-1") is None
+
+    cache.put(order(OrderStatus.CONFIRMED), time.monotonic())
+    assert cached_status(cache) == "confirmed"
+
+
+def test_entries_expire_and_are_bounded():
+    cache = OrderCache(max_size=1, ttl=0)
+    cache.put(order(OrderStatus.PENDING))
+    assert cache.get("order-1") is None
+
+    cache = OrderCache(max_size=1, ttl=30)
+    cache.put(order(OrderStatus.PENDING))
+    other = order(OrderStatus.PENDING)
+    other.id = "order-2"
+    cache.put(other)
+    assert len(cache) == 1
+    assert cache.get("order-1") is None
+
+
+def test_disabled_cache_stores_nothing():
+    cache = OrderCache(max_size=0)
+    cache.put(order(OrderStatus.PENDING))
+    cache.invalidate("order-1")
+    assert len(cache) == 0
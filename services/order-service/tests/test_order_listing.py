@@ -0,0 +1,85 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.orders import list_orders
+from app.models.order import Order
+from app.services.order_service import InvalidCursor, decode_cursor, encode_cursor
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+async def add_orders(session_factory, count: int, user_id: str = "user-1"):
+    """Orders a minute apart; two share each timestamp, so ids break ties."""
+    async with session_factory() as db:
+        db.add_all(
+            Order(
+                id=f"order-{index:02d}",
+                user_id=user_id,
+                total_amount=10.0,
+                created_at=START + timedelta(minutes=index // 2),
+            )
+            for index in range(count)
+        )
+        await db.commit()
+
+
+async def page(session_factory, cursor=None, skip=0, limit=3):
+    """GET /orders, with the query parameters FastAPI would pass."""
+    async with session_factory() as db:
+        return await list_orders(
+            user_id="user-1",
+            status=None,
+            cursor=cursor,
+            skip=skip,
+            limit=limit,
+            count="exact",
+            db=db,
+        )
+
+
+def test_cursor_round_trip():
+    order = Order(id="order-1", created_at=START)
+    assert decode_cursor(encode_cursor(order)) == (START, "order-1")
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "e30", "WzFd", "!!!"])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def test_pages_cover_every_order_once(database):
+    async def scenario():
+        await add_orders(database, 8)
+
+        seen, cursor = [], None
+        while True:
+            response = await page(database, cursor=cursor)
+            assert response.total == 8
+            seen += [order.id for order in response.orders]
+            cursor = response.next_cursor
+            if cursor is None:
+                return seen
+
+    seen = asyncio.run(scenario())
+    assert seen == [f"order-{index:02d}" for index in reversed(range(8))]
+
+
+def test_invalid_cursor_is_a_bad_request(database):
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(page(database, cursor="not-a-cursor"))
+    assert raised.value.status_code == 400
+
+
+def test_cursor_and_skip_together_are_a_bad_request(database):
+    async def scenario():
+        await add_orders(database, 4)
+        first = await page(database)
+        await page(database, cursor=first.next_cursor, skip=3)
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(scenario())
+    assert raised.value.status_code == 400
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from app.api.streams import _stream
+from app.streams import FINAL_STATUSES, OrderEventHub, StreamFull, order_hub
+
+
+def change(status: str, order_id: str = "order-1") -> dict:
+    return {
+        "order_id": order_id,
+        "user_id": "user-1",
+        "status": status,
+        "updated_at": None,
+    }
+
+
+async def events(stream) -> list:
+    return [event async for event in stream]
+
+
+def test_changes_reach_order_and_user_streams():
+    async def scenario():
+        hub = OrderEventHub(max_queued=4)
+        by_order = hub.subscribe("order", "order-1")
+        by_user = hub.subscribe("user", "user-1")
+        other = hub.subscribe("order", "order-2")
+
+        hub.publish_change(change("processing"))
+        assert (await by_order.get(1))["status"] == "processing"
+        assert (await by_user.get(1))["status"] == "processing"
+        with pytest.raises(asyncio.TimeoutError):
+            await other.get(0.01)
+
+    asyncio.run(scenario())
+
+
+def test_slow_stream_is_evicted():
+    async def scenario():
+        hub = OrderEventHub(max_queued=2)
+        slow = hub.subscribe("order", "order-1")
+
+        for status in ("pending", "processing", "confirmed"):
+            hub.publish_change(change(status))
+
+        assert slow.evicted
+        assert len(hub) == 0
+        assert await slow.get(1) is None
+
+    asyncio.run(scenario())
+
+
+def test_subscribers_are_limited():
+    async def scenario():
+        hub = OrderEventHub(max_subscribers=1)
+        first = hub.subscribe("order", "order-1")
+        with pytest.raises(StreamFull):
+            hub.subscribe("order", "order-2")
+
+        hub.unsubscribe(first)
+        hub.unsubscribe(first)
+        assert len(hub) == 0
+        hub.subscribe("order", "order-2")
+
+    asyncio.run(scenario())
+
+
+def test_confirmed_orders_end_their_stream():
+    assert "confirmed" in FINAL_STATUSES
+    assert "processing" not in FINAL_STATUSES
+
+
+def test_order_stream_ends_at_a_final_status():
+    async def scenario():
+        subscription = order_hub.subscribe("order", "order-1")
+        stream = asyncio.create_task(
+            events(_stream(subscription, change("pending"), until_final=True))
+        )
+        await asyncio.sleep(0)
+
+        for status in ("processing", "confirmed", "completed"):
+            order_hub.publish_change(change(status))
+        return await asyncio.wait_for(stream, 1)
+
+    sent = asyncio.run(scenario())
+    assert ['"confirmed"' in event for event in sent] == [False, False, True]
+    assert len(order_hub) == 0
+
+
+def test_stream_of_a_final_order_ends_at_once():
+    async def scenario():
+        subscription = order_hub.subscribe("order", "order-1")
+        stream = _stream(subscription, change("cancelled"), until_final=True)
+        return await events(stream)
+
+    assert len(asyncio.run(scenario())) == 1
+    assert len(order_hub) == 0
+
+
+def test_evicted_stream_tells_the_client():
+    async def scenario():
+        subscription = order_hub.subscribe("user", "user-1")
+        subscription.evict()
+        order_hub.unsubscribe(subscription)
+        return await events(_stream(subscription))
+
+    assert asyncio.run(scenario()) == ["event: evicted\ndata: {}\n\n"]
@@ -0,0 +1,3 @@
+from .consumer import start_consumers
+
+__all__ = ["start_consumers"]
@@ -0,0 +1,68 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from typing import Optional
+
+from aio_pika import IncomingMessage as AbstractIncomingMessage
+
+from shared.events import InventoryReservedEvent
+from shared.messaging.consumer import EventConsumer
+from shared.messaging.dispatch import EventDispatcher
+from shared.messaging.idempotency import ProcessedEventCache, SqlProcessedEventStore
+from shared.models.enums import EventType
+from shared.startup import FingerprintStore, attach_consumers
+from app.database import async_session
+from app.models.processed_event import ProcessedEvent
+from app.services.payment_service import PaymentService
+
+# Partition workers for the inventory queue (1 = default dispatch)
+CONSUMER_WORKERS = int(os.getenv("CONSUMER_WORKERS", "1"))
+
+inventory_dispatcher = EventDispatcher()
+
+
+@inventory_dispatcher.on(EventType.INVENTORY_RESERVED)
+async def handle_inventory_reserved(event: InventoryReservedEvent):
+    """Handle InventoryReserved event - charge the order"""
+    async with async_session() as db:
+        service = PaymentService(db)
+        await service.process_payment(
+            event.order_id, event.user_id, event.total_amount, event.correlation_id
+        )
+
+
+async def start_consumers(
+    fingerprints: Optional[FingerprintStore] = None,
+) -> list[EventConsumer]:
+    """Start all event consumers"""
+    inventory_consumer = EventConsumer(
+        queue_name="payment_service.inventory",
+        routing_keys=[EventType.INVENTORY_RESERVED],
+        # Skip redelivered events before looking up existing payments
+        idempotency=ProcessedEventCache(
+            "payment_service.inventory",
+            store=SqlProcessedEventStore(async_session, ProcessedEvent),
+        ),
+        topology_cache=fingerprints,
+    )
+
+    async def inventory_router(message: AbstractIncomingMessage):
+        try:
+            await inventory_dispatcher.dispatch(message)
+        except Exception as e:
+            print(f"[Payment Service] Error handling message {message.message_id}: {e}")
+            raise  # Retried by the consumer
+
+    # Events for the same order (correlation_id) stay in order across workers
+    consumers = await attach_consumers(
+        [
+            (
+                inventory_consumer,
+                inventory_consumer.consume(inventory_router, workers=CONSUMER_WORKERS),
+            )
+        ]
+    )
+    print("[Payment Service] Event consumers started")
+    return consumers
@@ -0,0 +1,86 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from functools import partial
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from prometheus_client import make_asgi_app
+
+from shared.startup import (
+    ConsumerSupervisor,
+    FingerprintStore,
+    Readiness,
+    warm_channels,
+    warm_db_pool,
+)
+from shared.tracing import setup_tracing, shutdown_tracing
+from app.database import init_db, engine, pool_autosizer
+from app.events.consumer import start_consumers
+from app.services.payment_service import event_publisher, outbox_relay
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+# Reported by /ready; traffic should only arrive once all are ready
+readiness = Readiness("database", "publisher", "consumers")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup: skip unchanged schema/topology, warm pools concurrently
+    fingerprints = FingerprintStore(engine)
+    await fingerprints.load()
+    await asyncio.gather(init_db(fingerprints), warm_db_pool(engine), warm_channels())
+    readiness.mark_ready("database")
+    pool_autosizer.start()
+
+    await event_publisher.connect()
+    readiness.mark_ready("publisher")
+    outbox_relay.start()
+
+    supervisor = ConsumerSupervisor(partial(start_consumers, fingerprints), readiness)
+    supervisor.start()
+
+    yield
+
+    # Shutdown
+    await supervisor.stop()
+    await outbox_relay.stop()
+    await event_publisher.close()
+    await pool_autosizer.stop()
+    await engine.dispose()
+    shutdown_tracing()
+
+
+app = FastAPI(
+    title="Payment Service",
+    description="Processes payments for orders",
+    version="1.0.0",
+    lifespan=lifespan,
+)
+
+# Trace requests, queries and events (TRACING_* / JAEGER_ENDPOINT)
+setup_tracing(app, engine, "payment-service")
+
+# Prometheus metrics
+metrics_app = make_asgi_app()
+app.mount("/metrics", metrics_app)
+
+
+@app.get("/health")
+async def health():
+    return {"status": "healthy", "service": "payment-service"}
+
+
+@app.get("/ready")
+async def ready():
+    return JSONResponse(
+        readiness.status(), status_code=200 if readiness.is_ready else 503
+    )
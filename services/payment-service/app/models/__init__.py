@@ -1,3 +1,5 @@
 from .payment import Payment
+from .outbox import OutboxEvent
+from .processed_event import ProcessedEvent
 
-__all__ = ["Payment"]
+__all__ = ["Payment", "OutboxEvent", "ProcessedEvent"]
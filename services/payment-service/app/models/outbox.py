@@ -0,0 +1,13 @@
+from app.database import Base
+
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from shared.outbox import OutboxMixin
+
+
+class OutboxEvent(OutboxMixin, Base):
+    """Events waiting to be relayed to RabbitMQ."""
+
+    __tablename__ = "outbox_events"
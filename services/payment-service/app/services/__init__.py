@@ -1,3 +1,3 @@
-from .payment_service import PaymentService, event_publisher
+from .payment_service import PaymentService, event_publisher, outbox_relay
 
-__all__ = ["PaymentService", "event_publisher"]
+__all__ = ["PaymentService", "event_publisher", "outbox_relay"]
@@ -3,7 +3,9 @@ from datetime import datetime, timezone
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.database import async_session
 from app.models.payment import Payment
+from app.models.outbox import OutboxEvent
 from app.schemas.payment import PaymentCreate
 
 import os
@@ -13,9 +15,14 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../.
 
 from shared.models.enums import PaymentStatus
 from shared.messaging.publisher import EventPublisher
+from shared.outbox import OutboxRelay
 from shared.events.payment_events import PaymentFailedEvent, PaymentProcessedEvent
 
+# Share of mock gateway calls that succeed
+PAYMENT_SUCCESS_RATE = float(os.getenv("PAYMENT_SUCCESS_RATE", "0.9"))
+
 event_publisher = EventPublisher()
+outbox_relay = OutboxRelay(async_session, OutboxEvent, event_publisher)
 
 
 class PaymentService:
@@ -81,16 +88,13 @@ class PaymentService:
         # Mock payment gateway call
         import random
 
-        payment_successful = random.random() < 0.9
+        payment_successful = random.random() < PAYMENT_SUCCESS_RATE
         if payment_successful:
             payment.status = PaymentStatus.COMPLETED
             payment.transaction_id = f"txn_{uuid4().hex[:12]}"
             payment.processed_at = datetime.now(timezone.utc)
 
-            await self.db.commit()
-            await self.db.refresh(payment)
-
-            # Publish payment success event
+            # Record payment success event with the payment
             event = PaymentProcessedEvent(
                 order_id=order_id,
                 payment_id=payment.id,
@@ -99,16 +103,17 @@ class PaymentService:
                 correlation_id=correlation_id,
                 payment_method=payment.payment_method or "credit_card",
             )
-            await event_publisher.publish_event(event)
+            self.db.add(OutboxEvent.from_event(event))
+
+            await self.db.commit()
+            await self.db.refresh(payment)
+            outbox_relay.notify()
             return True
         else:
             payment.status = PaymentStatus.FAILED
             payment.failed_at = datetime.now(timezone.utc)
 
-            await self.db.commit()
-            await self.db.refresh(payment)
-
-            # Publish payment failed event
+            # Record payment failed event with the payment
             event = PaymentFailedEvent(
                 order_id=order_id,
                 payment_id=payment.id,
@@ -117,5 +122,9 @@ class PaymentService:
                 reason="Insufficient funds",
                 correlation_id=correlation_id,
             )
-            await event_publisher.publish_event(event)
+            self.db.add(OutboxEvent.from_event(event))
+
+            await self.db.commit()
+            await self.db.refresh(payment)
+            outbox_relay.notify()
             return False
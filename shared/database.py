@@ -0,0 +1,361 @@
+"""
+Tunable, instrumented database connection pools.
+
+Every service creates its engine with ``create_db_engine``, which sizes
+the pool from the environment and exports how it behaves:
+
+- ``db_pool_checked_out`` and ``db_pool_capacity``: connections in use and
+  the most the pool may open (size plus overflow)
+- ``db_pool_checkout_wait_seconds``: time spent queued for a free
+  connection, and ``db_pool_connect_seconds``: time opening new ones
+- ``db_pool_overflow_total`` and ``db_pool_timeouts_total``: connections
+  opened beyond the pool size, and checkouts that gave up
+
+With ``DB_POOL_AUTOSIZE=true`` a ``PoolAutosizer`` grows and shrinks the
+overflow from the observed queueing, between ``DB_POOL_AUTOSIZE_MIN_OVERFLOW``
+and ``DB_POOL_AUTOSIZE_MAX_OVERFLOW``. The maximum caps each replica, so
+``replicas * (DB_POOL_SIZE + DB_POOL_AUTOSIZE_MAX_OVERFLOW)`` should stay
+within the database's connection limit.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+logger = logging.getLogger(__name__)
+
+# Pool sizing (per engine, so per replica)
+DEFAULT_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DEFAULT_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Seconds a checkout waits for a connection before failing
+DEFAULT_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Test connections before handing them out (one round trip per checkout)
+DEFAULT_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Log every statement
+DEFAULT_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+
+# Overflow autosizing from observed checkout waits
+DEFAULT_AUTOSIZE = os.getenv("DB_POOL_AUTOSIZE", "false").lower() == "true"
+DEFAULT_AUTOSIZE_MIN_OVERFLOW = int(os.getenv("DB_POOL_AUTOSIZE_MIN_OVERFLOW", "0"))
+DEFAULT_AUTOSIZE_MAX_OVERFLOW = int(os.getenv("DB_POOL_AUTOSIZE_MAX_OVERFLOW", "40"))
+# 95th percentile time (seconds) queued for a connection above which the pool grows
+DEFAULT_AUTOSIZE_TARGET_WAIT = float(os.getenv("DB_POOL_AUTOSIZE_TARGET_WAIT", "0.01"))
+# Seconds between resizes
+DEFAULT_AUTOSIZE_INTERVAL = float(os.getenv("DB_POOL_AUTOSIZE_INTERVAL", "10"))
+
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Database connections currently checked out of the pool",
+    ["pool"],
+)
+DB_POOL_CAPACITY = Gauge(
+    "db_pool_capacity",
+    "Most database connections the pool may open (size plus overflow)",
+    ["pool"],
+)
+DB_POOL_CHECKOUT_WAIT_SECONDS = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a free connection, not counting opening new ones",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+DB_POOL_CONNECT_SECONDS = Histogram(
+    "db_pool_connect_seconds",
+    "Time spent opening new database connections",
+    ["pool"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+DB_POOL_OVERFLOW = Counter(
+    "db_pool_overflow_total",
+    "Connections opened beyond the pool size",
+    ["pool"],
+)
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts_total",
+    "Checkouts that timed out waiting for a connection",
+    ["pool"],
+)
+DB_POOL_RESIZES = Counter(
+    "db_pool_resizes_total",
+    "Overflow changes made by the pool autosizer, by direction",
+    ["pool", "direction"],
+)
+
+
+class _Checkout:
+    """A checkout being timed."""
+
+    def __init__(self):
+        # Seconds spent opening connections, which isn't waiting for one
+        self.connecting = 0.0
+
+
+# Set while a checkout is timed, so the pool's internal retries aren't timed again
+_checkout: ContextVar[Optional[_Checkout]] = ContextVar(
+    "db_pool_checkout", default=None
+)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that records checkout waits and overflow connections.
+
+    A checkout's wait is the time it spent queued for a free connection;
+    opening a new connection is timed separately. The waits of recent
+    checkouts are also kept for the ``PoolAutosizer``: only queueing says
+    the pool is too small, while connect time is the same at any size.
+    """
+
+    name = "default"
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        # Waits (seconds) and timeouts since the autosizer last looked
+        self.waits: deque[float] = deque(maxlen=10000)
+        self.timeouts = 0
+        # Most connections checked out at once since the autosizer last looked
+        self.peak_checked_out = 0
+
+    @property
+    def max_overflow(self) -> int:
+        return self._max_overflow
+
+    @max_overflow.setter
+    def max_overflow(self, value: int):
+        # Read on every checkout; connections returned beyond the pool size
+        # are closed, so shrinking takes effect as they come back
+        self._max_overflow = value
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        pool = super().recreate()
+        pool.name = self.name
+        return pool
+
+    def _do_get(self):
+        if _checkout.get() is not None:
+            return super()._do_get()
+
+        checkout = _Checkout()
+        token = _checkout.set(checkout)
+        start = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            DB_POOL_TIMEOUTS.labels(pool=self.name).inc()
+            self._observe(time.perf_counter() - start - checkout.connecting)
+            raise
+        finally:
+            _checkout.reset(token)
+
+        self._observe(time.perf_counter() - start - checkout.connecting)
+        self.peak_checked_out = max(self.peak_checked_out, self.checkedout())
+        return record
+
+    def _create_connection(self):
+        start = time.perf_counter()
+        try:
+            return super()._create_connection()
+        finally:
+            elapsed = time.perf_counter() - start
+            DB_POOL_CONNECT_SECONDS.labels(pool=self.name).observe(elapsed)
+            checkout = _checkout.get()
+            if checkout is not None:
+                checkout.connecting += elapsed
+
+    def _observe(self, wait: float):
+        self.waits.append(wait)
+        DB_POOL_CHECKOUT_WAIT_SECONDS.labels(pool=self.name).observe(wait)
+
+    def _inc_overflow(self) -> bool:
+        if not super()._inc_overflow():
+            return False
+        # The overflow counts up from -pool_size
+        if self._overflow > 0:
+            DB_POOL_OVERFLOW.labels(pool=self.name).inc()
+        return True
+
+
+def create_db_engine(
+    url: str,
+    name: str,
+    pool_size: int = DEFAULT_POOL_SIZE,
+    max_overflow: int = DEFAULT_MAX_OVERFLOW,
+    pool_timeout: float = DEFAULT_POOL_TIMEOUT,
+    pool_pre_ping: bool = DEFAULT_PRE_PING,
+    echo: bool = DEFAULT_ECHO,
+) -> AsyncEngine:
+    """
+    Create an async engine with a sized, instrumented pool.
+
+    SQLite keeps the pool its driver picks (no pooling for files, one
+    shared connection in memory), so the sizing doesn't apply to it.
+
+    Args:
+        url: Database URL
+        name: Pool name in metrics (usually the service)
+        pool_size: Connections kept open
+        max_overflow: Connections opened beyond pool_size under load
+        pool_timeout: Seconds a checkout waits before failing
+        pool_pre_ping: Test connections before handing them out
+        echo: Log every statement
+
+    Returns:
+        The engine
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        return create_async_engine(
+            url, echo=echo, future=True, pool_pre_ping=pool_pre_ping
+        )
+
+    engine = create_async_engine(
+        url,
+        echo=echo,
+        future=True,
+        poolclass=InstrumentedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_pre_ping=pool_pre_ping,
+    )
+    engine.pool.name = name
+
+    # Read from engine.pool on each scrape: dispose() replaces the pool
+    DB_POOL_CHECKED_OUT.labels(pool=name).set_function(
+        lambda: engine.pool.checkedout()
+    )
+    DB_POOL_CAPACITY.labels(pool=name).set_function(
+        lambda: engine.pool.size() + max(engine.pool.max_overflow, 0)
+    )
+    return engine
+
+
+class PoolAutosizer:
+    """
+    Background task resizing a pool's overflow from its checkout waits.
+
+    Every interval it looks at the checkouts since the last time. If their
+    95th percentile wait for a free connection exceeded ``target_wait``,
+    or any timed out, the pool may open ``step`` more overflow connections.
+    Opening connections doesn't count, as more of them wouldn't be faster.
+    If they were fast and at least ``step`` of the overflow went unused even
+    at the peak, it gives ``step`` back. The admission controller reads the
+    same overflow, so request admission follows the pool size.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        enabled: bool = DEFAULT_AUTOSIZE,
+        min_overflow: int = DEFAULT_AUTOSIZE_MIN_OVERFLOW,
+        max_overflow: int = DEFAULT_AUTOSIZE_MAX_OVERFLOW,
+        target_wait: float = DEFAULT_AUTOSIZE_TARGET_WAIT,
+        interval: float = DEFAULT_AUTOSIZE_INTERVAL,
+        step: Optional[int] = None,
+    ):
+        """
+        Args:
+            engine: Engine whose pool to resize
+            enabled: Whether ``start`` starts resizing
+            min_overflow: Least overflow the pool is shrunk to
+            max_overflow: Most overflow the pool is grown to
+            target_wait: 95th percentile checkout wait (seconds) to stay under
+            interval: Seconds between resizes
+            step: Overflow added or removed at once (defaults to half the
+                pool size, at least 1)
+        """
+        self.engine = engine
+        self.enabled = enabled
+        self.min_overflow = min_overflow
+        self.max_overflow = max_overflow
+        self.target_wait = target_wait
+        self.interval = interval
+        self.step = step
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pool(self) -> Optional[InstrumentedQueuePool]:
+        pool = self.engine.pool
+        return pool if isinstance(pool, InstrumentedQueuePool) else None
+
+    def start(self):
+        """Start resizing in the background (if enabled and the pool is sized)."""
+        pool = self.pool
+        if not self.enabled or pool is None:
+            return
+        if self._task is None or self._task.done():
+            pool.max_overflow = min(
+                self.max_overflow, max(self.min_overflow, pool.max_overflow)
+            )
+            self._task = asyncio.create_task(self._run())
+            logger.info(
+                f"✓ Pool autosizer started for {pool.name} "
+                f"(overflow {self.min_overflow}-{self.max_overflow})"
+            )
+
+    async def stop(self):
+        """Stop resizing; the pool keeps its current size."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def resize(self) -> int:
+        """
+        Resize the pool once from the checkouts since the last resize.
+
+        Returns:
+            Change in overflow (0 if unchanged)
+        """
+        pool = self.pool
+        if pool is None:
+            return 0
+
+        waits = sorted(pool.waits)
+        timeouts, peak = pool.timeouts, pool.peak_checked_out
+        pool.waits.clear()
+        pool.timeouts = 0
+        pool.peak_checked_out = pool.checkedout()
+
+        step = self.step or max(1, pool.size() // 2)
+        current = pool.max_overflow
+        p95 = waits[int(len(waits) * 0.95)] if waits else 0.0
+
+        if timeouts or p95 > self.target_wait:
+            target = min(self.max_overflow, current + step)
+        elif peak <= pool.size() + current - step:
+            target = max(self.min_overflow, current - step)
+        else:
+            target = current
+
+        if target != current:
+            pool.max_overflow = target
+            direction = "up" if target > current else "down"
+            DB_POOL_RESIZES.labels(pool=pool.name, direction=direction).inc()
+            logger.info(
+                f"DB pool {pool.name}: overflow {current} -> {target} "
+                f"(p95 wait {p95 * 1000:.1f}ms, {timeouts} timeouts, peak {peak})"
+            )
+        return target - current
+
+    async def _run(self):
+        """Resize loop."""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.resize()
+            except Exception as e:
+                logger.error(f"Pool autosizer error: {e}", exc_info=True)
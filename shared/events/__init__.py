@@ -2,16 +2,28 @@
 
 from .base import BaseEvent
 from .order_events import OrderCreatedEvent, OrderCancelledEvent, OrderConfirmedEvent
-from .inventory_events import InventoryReservedEvent, InventoryReleasedEvent
+from .inventory_events import (
+    InventoryReservedEvent,
+    InventoryReleasedEvent,
+    InventoryInsufficientEvent,
+)
 from .payment_events import PaymentProcessedEvent, PaymentFailedEvent
+from .registry import EVENT_MODELS, get_event_model, deserialize_event, decode_event
+from ..models.enums import EventType
 
 __all__ = [
     "BaseEvent",
+    "EventType",
     "OrderCreatedEvent",
     "OrderConfirmedEvent",
     "OrderCancelledEvent",
     "InventoryReservedEvent",
     "InventoryReleasedEvent",
+    "InventoryInsufficientEvent",
     "PaymentProcessedEvent",
     "PaymentFailedEvent",
+    "EVENT_MODELS",
+    "get_event_model",
+    "deserialize_event",
+    "decode_event",
 ]
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 from .base import BaseEvent
 from ..models.enums import EventType
 from ..models.items import InventoryItem
@@ -12,6 +12,8 @@ class InventoryReservedEvent(BaseEvent):
     order_id: str
     items: List[InventoryItem]
     total_amount: float
+    # Buyer, so payment can be processed without looking up the order
+    user_id: Optional[str] = None
 
 
 class InventoryReleasedEvent(BaseEvent):
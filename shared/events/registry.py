@@ -0,0 +1,65 @@
+"""Lookup of event models by event type."""
+
+from typing import Any, Dict, Type
+
+from .base import BaseEvent
+from .order_events import OrderCreatedEvent, OrderConfirmedEvent, OrderCancelledEvent
+from .inventory_events import (
+    InventoryReservedEvent,
+    InventoryReleasedEvent,
+    InventoryInsufficientEvent,
+)
+from .payment_events import PaymentProcessedEvent, PaymentFailedEvent
+from .notification_events import NotificationSentEvent, NotificationFailedEvent
+from ..models.enums import EventType
+
+EVENT_MODELS: Dict[str, Type[BaseEvent]] = {
+    EventType.ORDER_CREATED.value: OrderCreatedEvent,
+    EventType.ORDER_CONFIRMED.value: OrderConfirmedEvent,
+    EventType.ORDER_CANCELLED.value: OrderCancelledEvent,
+    EventType.INVENTORY_RESERVED.value: InventoryReservedEvent,
+    EventType.INVENTORY_RELEASED.value: InventoryReleasedEvent,
+    EventType.INVENTORY_INSUFFICIENT.value: InventoryInsufficientEvent,
+    EventType.PAYMENT_PROCESSED.value: PaymentProcessedEvent,
+    EventType.PAYMENT_FAILED.value: PaymentFailedEvent,
+    EventType.NOTIFICATION_SENT.value: NotificationSentEvent,
+    "notification.failed": NotificationFailedEvent,
+}
+
+
+def get_event_model(event_type: str) -> Type[BaseEvent]:
+    """
+    Get the event model registered for an event type.
+
+    Raises:
+        KeyError: If the event type is unknown
+    """
+    return EVENT_MODELS[getattr(event_type, "value", event_type)]
+
+
+def deserialize_event(event_type: str, data: Dict[str, Any]) -> BaseEvent:
+    """
+    Build a typed event from its decoded payload.
+
+    Args:
+        event_type: Event type string (e.g. "order.created")
+        data: Decoded event payload
+
+    Returns:
+        Event instance of the registered model
+    """
+    return get_event_model(event_type).model_validate(data)
+
+
+def decode_event(event_type: str, body: bytes) -> BaseEvent:
+    """
+    Validate a raw JSON body straight into the registered event model.
+
+    Args:
+        event_type: Event type string (e.g. "order.created")
+        body: JSON-encoded event
+
+    Returns:
+        Event instance of the registered model
+    """
+    return get_event_model(event_type).model_validate_json(body)
@@ -1,7 +1,42 @@
 """Messaging utilities for RabbitMQ."""
 
-from .publisher import EventPublisher
+from .publisher import EventPublisher, PublishNackedError
 from .consumer import EventConsumer
 from .connection import get_rabbitmq_connection
+from .dispatch import EventDispatcher
+from .pool import ChannelPool, PooledChannel, get_channel_pool, close_channel_pool
+from .idempotency import (
+    DuplicateEvent,
+    ProcessedEventCache,
+    ProcessedEventMixin,
+    SqlProcessedEventStore,
+    record_processed,
+)
+from .retry import PermanentError, RetryPolicy
+from .memory import MemoryBroker, get_memory_broker, reset_memory_broker
+from .monitor import QueueMonitor, get_queue_monitor, close_queue_monitor
 
-__all__ = ["EventPublisher", "EventConsumer", "get_rabbitmq_connection"]
+__all__ = [
+    "EventPublisher",
+    "PublishNackedError",
+    "EventConsumer",
+    "get_rabbitmq_connection",
+    "EventDispatcher",
+    "ChannelPool",
+    "PooledChannel",
+    "get_channel_pool",
+    "close_channel_pool",
+    "DuplicateEvent",
+    "ProcessedEventCache",
+    "ProcessedEventMixin",
+    "SqlProcessedEventStore",
+    "record_processed",
+    "PermanentError",
+    "RetryPolicy",
+    "MemoryBroker",
+    "get_memory_broker",
+    "reset_memory_broker",
+    "QueueMonitor",
+    "get_queue_monitor",
+    "close_queue_monitor",
+]
@@ -0,0 +1,155 @@
+"""
+Wire codecs for event messages.
+
+The publisher encodes events with one codec and stamps its content type on
+the message; consumers pick the decoder from that content type, so JSON and
+msgpack publishers can run side by side during a rollout. orjson and
+msgpack are optional dependencies.
+"""
+
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Type
+
+from ..events.base import BaseEvent
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+
+
+class Codec(ABC):
+    """Encodes events into message bodies and decodes them back."""
+
+    name: str = ""
+    content_type: str = ""
+
+    @abstractmethod
+    def encode(self, event: BaseEvent) -> bytes:
+        """Encode an event into a message body."""
+
+    def decode(self, body: bytes, model: Type[BaseEvent]) -> BaseEvent:
+        """Decode a body straight into an event model."""
+        return model.model_validate(self.loads(body))
+
+    @abstractmethod
+    def loads(self, body: bytes) -> Dict[str, Any]:
+        """Decode a body into a plain dict."""
+
+
+class JsonCodec(Codec):
+    """JSON through pydantic's own serializer and validator."""
+
+    name = "json"
+    content_type = JSON_CONTENT_TYPE
+
+    def encode(self, event: BaseEvent) -> bytes:
+        return event.model_dump_json().encode()
+
+    def decode(self, body: bytes, model: Type[BaseEvent]) -> BaseEvent:
+        return model.model_validate_json(body)
+
+    def loads(self, body: bytes) -> Dict[str, Any]:
+        return json.loads(body)
+
+
+class OrjsonCodec(Codec):
+    """JSON through orjson; wire-compatible with JsonCodec."""
+
+    name = "orjson"
+    content_type = JSON_CONTENT_TYPE
+
+    def __init__(self):
+        if orjson is None:
+            raise RuntimeError("orjson codec requested but orjson is not installed")
+
+    def encode(self, event: BaseEvent) -> bytes:
+        # orjson serializes datetimes and enums natively
+        return orjson.dumps(event.model_dump())
+
+    def loads(self, body: bytes) -> Dict[str, Any]:
+        return orjson.loads(body)
+
+
+class MsgpackCodec(Codec):
+    """Binary msgpack encoding."""
+
+    name = "msgpack"
+    content_type = MSGPACK_CONTENT_TYPE
+
+    def __init__(self):
+        if msgpack is None:
+            raise RuntimeError("msgpack codec requested but msgpack is not installed")
+
+    def encode(self, event: BaseEvent) -> bytes:
+        return msgpack.packb(event.model_dump(mode="json"))
+
+    def loads(self, body: bytes) -> Dict[str, Any]:
+        return msgpack.unpackb(body)
+
+
+CODECS: Dict[str, Type[Codec]] = {
+    JsonCodec.name: JsonCodec,
+    OrjsonCodec.name: OrjsonCodec,
+    MsgpackCodec.name: MsgpackCodec,
+}
+
+# Codec used by publishers unless one is passed explicitly
+DEFAULT_CODEC = os.getenv("EVENT_CODEC", JsonCodec.name)
+
+
+def get_codec(name: str = DEFAULT_CODEC) -> Codec:
+    """
+    Get a codec by name.
+
+    Args:
+        name: "json", "orjson" or "msgpack"
+
+    Raises:
+        ValueError: If the codec is unknown
+        RuntimeError: If the codec's library is not installed
+    """
+    try:
+        return CODECS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown event codec: {name}") from None
+
+
+def _build_decoders() -> Dict[str, Codec]:
+    """Decoders by content type; JSON uses orjson if that is the configured codec."""
+    decoders: Dict[str, Codec] = {JSON_CONTENT_TYPE: JsonCodec()}
+
+    if DEFAULT_CODEC == OrjsonCodec.name and orjson is not None:
+        decoders[JSON_CONTENT_TYPE] = OrjsonCodec()
+    if msgpack is not None:
+        decoders[MSGPACK_CONTENT_TYPE] = MsgpackCodec()
+
+    return decoders
+
+
+_decoders = _build_decoders()
+
+
+def codec_for(content_type: Optional[str]) -> Codec:
+    """
+    Get the decoder for a message content type.
+
+    Messages without a content type are treated as JSON.
+
+    Raises:
+        ValueError: If no decoder is available for the content type
+    """
+    codec = _decoders.get(content_type or JSON_CONTENT_TYPE)
+    if codec is None:
+        raise ValueError(f"No decoder for content type: {content_type}")
+    return codec
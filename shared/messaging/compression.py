@@ -0,0 +1,104 @@
+"""
+Size-threshold compression of message bodies.
+
+Bodies at or above the threshold are compressed by the publisher and the
+algorithm is recorded in the message's ``content_encoding``; consumers
+decompress according to that property, so uncompressed messages from older
+publishers keep working. zstandard is an optional dependency; without it
+gzip is used.
+"""
+
+import gzip
+import os
+import time
+from typing import Optional, Tuple
+
+from .metrics import COMPRESSION_RATIO, COMPRESSION_SECONDS
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+GZIP = "gzip"
+ZSTD = "zstd"
+
+# Bodies smaller than this many bytes are sent as-is (0 disables compression)
+DEFAULT_THRESHOLD = int(os.getenv("EVENT_COMPRESSION_THRESHOLD", "8192"))
+DEFAULT_ALGORITHM = os.getenv(
+    "EVENT_COMPRESSION_ALGORITHM", ZSTD if zstandard is not None else GZIP
+)
+
+_zstd_compressor = zstandard.ZstdCompressor(level=3) if zstandard else None
+_zstd_decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+
+class Compressor:
+    """Compresses message bodies above a size threshold."""
+
+    def __init__(
+        self, threshold: int = DEFAULT_THRESHOLD, algorithm: str = DEFAULT_ALGORITHM
+    ):
+        if algorithm == ZSTD and zstandard is None:
+            raise RuntimeError(
+                "zstd compression requested but zstandard is not installed"
+            )
+        if algorithm not in (GZIP, ZSTD):
+            raise ValueError(f"Unknown compression algorithm: {algorithm}")
+
+        self.threshold = threshold
+        self.algorithm = algorithm
+
+    def compress(self, body: bytes) -> Tuple[bytes, Optional[str]]:
+        """
+        Compress a body if it is large enough to be worth it.
+
+        Returns:
+            (body, content_encoding); content_encoding is None if the body
+            was left uncompressed
+        """
+        if self.threshold <= 0 or len(body) < self.threshold:
+            return body, None
+
+        started = time.perf_counter()
+        if self.algorithm == ZSTD:
+            compressed = _zstd_compressor.compress(body)
+        else:
+            compressed = gzip.compress(body, compresslevel=6)
+        COMPRESSION_SECONDS.labels(
+            algorithm=self.algorithm, operation="compress"
+        ).observe(time.perf_counter() - started)
+
+        ratio = len(compressed) / len(body)
+        COMPRESSION_RATIO.labels(algorithm=self.algorithm).observe(ratio)
+
+        # Incompressible payload: don't make consumers pay to decompress it
+        if ratio >= 1:
+            return body, None
+        return compressed, self.algorithm
+
+
+def decompress(body: bytes, content_encoding: Optional[str]) -> bytes:
+    """
+    Undo publisher compression according to the message content encoding.
+
+    Raises:
+        ValueError: If the content encoding is not supported
+    """
+    if not content_encoding:
+        return body
+
+    started = time.perf_counter()
+    if content_encoding == ZSTD:
+        if _zstd_decompressor is None:
+            raise ValueError("Received zstd message but zstandard is not installed")
+        decompressed = _zstd_decompressor.decompress(body)
+    elif content_encoding == GZIP:
+        decompressed = gzip.decompress(body)
+    else:
+        raise ValueError(f"Unsupported content encoding: {content_encoding}")
+
+    COMPRESSION_SECONDS.labels(
+        algorithm=content_encoding, operation="decompress"
+    ).observe(time.perf_counter() - started)
+    return decompressed
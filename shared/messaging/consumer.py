@@ -1,74 +1,590 @@
+import asyncio
+import hashlib
+import itertools
 import logging
-from typing import Optional, Callable
-from aio_pika import ExchangeType
-from aio_pika.abc import (
-    AbstractRobustConnection,
-    AbstractRobustChannel,
-    AbstractIncomingMessage,
+import zlib
+from contextlib import contextmanager, nullcontext
+from typing import TYPE_CHECKING, Optional, Callable, Sequence
+from aio_pika.abc import AbstractChannel, AbstractIncomingMessage, AbstractQueue
+from aio_pika.exceptions import ChannelNotFoundEntity
+from .dispatch import message_event_type
+from .idempotency import DEFAULT_CACHE_SIZE, DuplicateEvent, ProcessedEventCache
+from .metrics import (
+    HANDLER_SECONDS,
+    MESSAGES_ACKED,
+    MESSAGES_NACKED,
+    MESSAGES_REDELIVERED,
 )
-from .connection import get_rabbitmq_connection
+from .monitor import get_queue_monitor
+from .pool import CHANNEL_ERRORS, ChannelPool, PooledChannel, get_channel_pool
+from .prefetch import ADAPTIVE_PREFETCH, DEFAULT_MIN_PREFETCH, PrefetchController
+from .retry import retry_policy_for
+from ..tracing import consume_span
+
+if TYPE_CHECKING:
+    from shared.startup import FingerprintStore
 
 logger = logging.getLogger(__name__)
 
 
+def correlation_key(message: AbstractIncomingMessage) -> Optional[str]:
+    """Partition key for saga events: the correlation ID (the order ID)."""
+    return message.correlation_id
+
+
 class EventConsumer:
-    """Consumes events from RabbitMQ"""
+    """
+    Consumes events from RabbitMQ
+
+    Events whose ID (the message ID) was already processed by this consumer
+    are acknowledged without calling the handler. By default the IDs are
+    kept in memory only; pass a ProcessedEventCache with a store to persist
+    them in the handlers' transactions.
+
+    With ``adaptive_prefetch`` the prefetch count starts at
+    ``prefetch_count`` and is then tuned by a PrefetchController from
+    handler latency, errors and saturation.
+
+    Messages whose handler raises are retried after increasing delays
+    (``retry_delays``, see RetryPolicy) and parked in ``<queue>.dlq`` once
+    the retries are used up.
+
+    With ``topology_cache`` the consumer skips declaring its topology when
+    the same topology was declared before (by any instance sharing the
+    store), and redeclares it if the queue turns out to be missing. Retry
+    and dead letter queues are still checked with passive declares, since
+    nothing else would notice they are gone: retries sent to them would be
+    dropped as unroutable.
+    """
 
     def __init__(
         self,
         queue_name: str,
         exchange_name: str = "microservice.events",
         routing_keys: list[str] = None,
+        pool: Optional[ChannelPool] = None,
+        prefetch_count: int = 10,
+        idempotency: Optional[ProcessedEventCache] = None,
+        adaptive_prefetch: bool = ADAPTIVE_PREFETCH,
+        retry_delays: Optional[Sequence[float]] = None,
+        topology_cache: Optional["FingerprintStore"] = None,
     ):
         self.queue_name = queue_name
         self.exchange_name = exchange_name
         self.routing_keys = routing_keys
-        self.connection: Optional[AbstractRobustConnection] = None
-        self.channel: Optional[AbstractRobustChannel] = None
+        self.prefetch_count = prefetch_count
+        self.adaptive_prefetch = adaptive_prefetch
+        self.prefetch: Optional[PrefetchController] = None
+        self._pool = pool
+
+        if idempotency is None and DEFAULT_CACHE_SIZE > 0:
+            idempotency = ProcessedEventCache(queue_name)
+        self.idempotency = idempotency
+
+        # Delayed retry tiers (None when RABBITMQ_RETRY_DELAYS is empty)
+        self.retry = retry_policy_for(queue_name, retry_delays)
+
+        self.topology_cache = topology_cache
+        self._topology_from_cache = False
+
+        self.channel: Optional[AbstractChannel] = None
+        self._pooled: Optional[PooledChannel] = None
+        self._workers: list[asyncio.Task] = []
+
+    @property
+    def pool(self) -> ChannelPool:
+        """Channel pool the consumer's channel is drawn from."""
+        return self._pool or get_channel_pool()
+
+    @property
+    def topology_fingerprint(self) -> str:
+        """Fingerprint of the exchange, queue, bindings and retry queues."""
+        parts = [self.exchange_name, self.queue_name]
+        parts += sorted(str(getattr(key, "value", key)) for key in self.routing_keys or [])
+        if self.retry:
+            parts += [f"{delay:g}" for delay in self.retry.delays]
+        return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+    def _topology_cached(self) -> bool:
+        cache = self.topology_cache
+        return cache is not None and cache.matches(
+            f"topology:{self.queue_name}", self.topology_fingerprint
+        )
 
     async def connect(self):
         """Establish connection with RabbitMQ"""
         try:
-            # Create robust (auto-reconnecting) connection
-            self.connection = await get_rabbitmq_connection()
-            self.channel = await self.connection.channel()
+            # Hold a pooled channel for the lifetime of the consumer
+            self._pooled = await self.pool.checkout()
+            self.channel = self._pooled.channel
+            await self._apply_qos()
+
+            self._topology_from_cache = self._topology_cached()
+            if self._topology_from_cache:
+                if await self._retry_queues_exist():
+                    # Declared by an earlier start; a missing queue fails the
+                    # consume, which redeclares (see _consume)
+                    return await self.channel.get_queue(self.queue_name, ensure=False)
+
+                logger.warning(
+                    f"Retry queues of {self.queue_name} are missing, redeclaring"
+                )
+                await self._reopen_channel()
+                self._topology_from_cache = False
+
+            return await self._declare()
+
+        except Exception as e:
+            logger.error(f"Failed to connect to RabbitMQ: {e}")
+            await self.close()
+            raise
+
+    async def _apply_qos(self):
+        """Limit unacknowledged deliveries held by this consumer."""
+        if self.prefetch:
+            await self.prefetch.apply(self.channel)
+        else:
+            await self.channel.set_qos(prefetch_count=self.prefetch_count)
+
+    async def _retry_queues_exist(self) -> bool:
+        """Whether the retry tiers and the DLQ are still there."""
+        if not self.retry:
+            return True
+        try:
+            await self.retry.check(self.channel)
+        except CHANNEL_ERRORS:
+            return False
+        return True
 
-            # Set QoS to process messages one at a time
-            # Increase prefetch_count for higher throughput
-            await self.channel.set_qos(prefetch_count=10)
+    async def _reopen_channel(self):
+        """Replace the consumer's channel (the broker closes it on a 404)."""
+        await self.pool.checkin(self._pooled, discard=True)
+        self._pooled = await self.pool.checkout()
+        self.channel = self._pooled.channel
+        await self._apply_qos()
 
+    async def _declare(self) -> AbstractQueue:
+        """Declare the exchange, queue, bindings and retry queues."""
+        exchange, queue = await asyncio.gather(
             # Declare topic exchange for events
-            exchange = await self.channel.declare_exchange(
-                self.exchange_name,
-                ExchangeType.TOPIC,
-                durable=True,  # Survive broker restart
+            self._pooled.get_exchange(self.exchange_name),
+            self.channel.declare_queue(self.queue_name, durable=True),
+        )
+
+        # Bind queue to exchange with routing key
+        declarations = [
+            queue.bind(exchange, routing_key=routing_key)
+            for routing_key in self.routing_keys or []
+        ]
+        if self.retry:
+            declarations.append(self.retry.declare(self.channel))
+        await asyncio.gather(*declarations)
+
+        if self.topology_cache is not None:
+            await self.topology_cache.save(
+                f"topology:{self.queue_name}", self.topology_fingerprint
             )
+        return queue
 
-            # Decalre queue
-            queue = await self.channel.declare_queue(self.queue_name, durable=True)
+    async def _consume(self, queue: AbstractQueue, callback: Callable):
+        """Attach a callback, redeclaring a cached topology that has gone."""
+        try:
+            await queue.consume(callback)
+            return
+        except ChannelNotFoundEntity:
+            if not self._topology_from_cache:
+                raise
+            logger.warning(f"Queue {self.queue_name} is missing, redeclaring it")
 
-            # Bind queue to exchange with routing key
-            for routing_key in self.routing_keys:
-                await queue.bind(exchange, routing_key=routing_key)
+        # The broker closes a channel on a missing queue: start over on a new one
+        await self._reopen_channel()
+        self._topology_from_cache = False
+        queue = await self._declare()
+        await queue.consume(callback)
 
-            return queue
-            logger.info(f"✓ Connected to RabbitMQ at {self.host}:{self.port}")
+    async def consume(
+        self,
+        callback: Callable,
+        workers: int = 1,
+        key_extractor: Callable[
+            [AbstractIncomingMessage], Optional[str]
+        ] = correlation_key,
+    ):
+        """
+        Start consuming messages.
 
-        except Exception as e:
-            logger.error(f"Failed to connect to RabbitMQ: {e}")
-            raise
+        With ``workers > 1`` deliveries are partitioned over that many worker
+        tasks by ``key_extractor``: messages sharing a key (e.g. an order ID)
+        are handled one at a time in delivery order, while different keys
+        are handled in parallel. Messages without a key are spread
+        round-robin.
+
+        Args:
+            callback: Async function called with each message
+            workers: Number of partition workers (1 keeps the default mode)
+            key_extractor: Function returning the partition key of a message
+        """
+        if workers > 1:
+            self.prefetch_count = max(self.prefetch_count, workers)
+        self._init_prefetch(min_prefetch=workers)
 
-    async def consume(self, callback: Callable):
-        """Start consuming messages."""
         queue = await self.connect()
 
+        async def process(message: AbstractIncomingMessage):
+            # If a retry can't be scheduled, put the message back
+            requeue = self.retry is not None
+            try:
+                async with message.process(requeue=requeue):
+                    if await self._is_duplicate(message):
+                        return
+                    with self._recording(message) as recording:
+                        try:
+                            # Continues the trace of the publish that sent it
+                            event_type = message_event_type(message)
+                            with self._track(event_type), consume_span(
+                                message, self.queue_name
+                            ):
+                                await callback(message)
+                        except DuplicateEvent:
+                            # Another delivery was recorded first; this one's
+                            # changes were rolled back with the record
+                            logger.info(
+                                f"Skipping duplicate event {message.message_id} "
+                                f"on {self.queue_name}"
+                            )
+                            await self._mark_processed(message, recorded=True)
+                            return
+                        except Exception as e:
+                            if not self.retry:
+                                raise
+                            await self.retry.schedule(self.channel, message, e)
+                            return
+                    await self._mark_processed(
+                        message, recorded=recording is not None and recording.recorded
+                    )
+                MESSAGES_ACKED.labels(queue=self.queue_name).inc()
+            except Exception:
+                MESSAGES_NACKED.labels(
+                    queue=self.queue_name, requeued=str(requeue).lower()
+                ).inc()
+                raise
+            finally:
+                if self.prefetch:
+                    self.prefetch.settled()
+
+        if workers <= 1:
+
+            async def on_delivery(message: AbstractIncomingMessage):
+                self._delivered(message)
+                await process(message)
+
+            await self._consume(queue, on_delivery)
+            self._on_attached()
+            return
+
+        partitions = [asyncio.Queue() for _ in range(workers)]
+        self._workers = [
+            asyncio.create_task(self._partition_worker(partition, process))
+            for partition in partitions
+        ]
+        round_robin = itertools.cycle(range(workers))
+
         async def on_message(message: AbstractIncomingMessage):
-            async with message.process():
-                await callback(message)
+            self._delivered(message)
+
+            # No await before the put, so delivery order is kept per partition
+            key = key_extractor(message)
+            if key:
+                index = zlib.crc32(key.encode()) % workers
+            else:
+                index = next(round_robin)
+            partitions[index].put_nowait(message)
+
+        await self._consume(queue, on_message)
+        self._on_attached()
+        logger.info(f"✓ Consuming {self.queue_name} with {workers} partition workers")
+
+    async def consume_batch(
+        self,
+        handler: Callable,
+        max_messages: int = 50,
+        max_wait_ms: int = 50,
+    ):
+        """
+        Start consuming messages in micro-batches.
 
-        await queue.consume(on_message)
+        Deliveries are collected until ``max_messages`` have arrived or
+        ``max_wait_ms`` has passed since the first one, then ``handler`` is
+        called once with the whole batch. It must return one result per
+        message, in order: None to ack the message, or the exception that
+        made it fail to retry it (or nack it when retries are disabled). If
+        the handler raises, that applies to the whole batch. Batches are
+        handled one at a time, in delivery order.
+
+        With a persistent idempotency store, the handler should call
+        shared.messaging.record_processed for each message inside the
+        transaction (savepoint) of its changes, and return the DuplicateEvent
+        it raises as that message's result: the message is then acked
+        without its changes. Events it doesn't record are written to the
+        store after the batch, so a crash in between can still let them be
+        handled twice.
+
+        Args:
+            handler: Async function called with a list of messages
+            max_messages: Largest batch handed to the handler
+            max_wait_ms: Longest time the first message waits for a batch
+        """
+        self.prefetch_count = max(self.prefetch_count, max_messages)
+        # Keep room for a full batch
+        self._init_prefetch(min_prefetch=max_messages)
+        queue = await self.connect()
+
+        inbox: asyncio.Queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(
+                self._batch_worker(inbox, handler, max_messages, max_wait_ms / 1000)
+            )
+        ]
+
+        async def on_message(message: AbstractIncomingMessage):
+            self._delivered(message)
+            inbox.put_nowait(message)
+
+        await self._consume(queue, on_message)
+        self._on_attached()
+        logger.info(
+            f"✓ Consuming {self.queue_name} in batches of up to {max_messages}"
+        )
+
+    async def _batch_worker(
+        self,
+        inbox: asyncio.Queue,
+        handler: Callable,
+        max_messages: int,
+        max_wait: float,
+    ):
+        """Collect deliveries into batches and settle them."""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await inbox.get()]
+            deadline = loop.time() + max_wait
+
+            while len(batch) < max_messages:
+                if not inbox.empty():
+                    batch.append(inbox.get_nowait())
+                    continue
+
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(inbox.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._settle_batch(batch, handler)
+
+    async def _settle_batch(self, batch: list, handler: Callable):
+        """Run the batch handler, then ack, retry or nack each message."""
+        fresh = []
+        for message in batch:
+            if await self._is_duplicate(message):
+                await self._settle(message, None)
+            else:
+                fresh.append(message)
+        if not fresh:
+            return
+        batch = fresh
+
+        recorded: set[str] = set()
+        try:
+            with self._recording_batch() as recording, self._track("batch"):
+                results = await handler(batch)
+            if len(results) != len(batch):
+                raise ValueError(
+                    f"Batch handler returned {len(results)} results "
+                    f"for {len(batch)} messages"
+                )
+            if recording is not None:
+                recorded = recording.recorded
+        except Exception as e:
+            logger.error(f"Batch handler error on {self.queue_name}: {e}", exc_info=True)
+            results = [e] * len(batch)
+
+        handled = []
+        for message, error in zip(batch, results):
+            if isinstance(error, DuplicateEvent):
+                # Another delivery was recorded first; this one's changes
+                # were rolled back with its savepoint
+                logger.info(
+                    f"Skipping duplicate event {message.message_id} "
+                    f"on {self.queue_name}"
+                )
+                recorded.add(message.message_id)
+                error = None
+            await self._settle(message, error)
+            if error is None:
+                handled.append(message.message_id)
+
+        # Events the handler didn't record in its transaction: one write
+        # for the batch, after it
+        if self.idempotency is not None:
+            try:
+                await self.idempotency.mark_many(handled, recorded=recorded)
+            except Exception as e:
+                logger.error(f"Failed to record processed events of a batch: {e}")
+
+    async def _settle(
+        self, message: AbstractIncomingMessage, error: Optional[BaseException]
+    ):
+        """Ack a message handled without error; retry or nack it otherwise."""
+        try:
+            if error is None:
+                await message.ack()
+                MESSAGES_ACKED.labels(queue=self.queue_name).inc()
+            elif self.retry:
+                await self._retry(message, error)
+            else:
+                await message.nack(requeue=False)
+                MESSAGES_NACKED.labels(queue=self.queue_name, requeued="false").inc()
+        except Exception as e:
+            logger.error(f"Failed to settle message {message.message_id}: {e}")
+        finally:
+            if self.prefetch:
+                self.prefetch.settled()
+
+    async def _retry(self, message: AbstractIncomingMessage, error: BaseException):
+        """Move a failed message to its retry tier, or back to the queue."""
+        try:
+            await self.retry.schedule(self.channel, message, error)
+        except Exception as e:
+            logger.error(f"Failed to schedule retry of {message.message_id}: {e}")
+            await message.nack(requeue=True)
+            MESSAGES_NACKED.labels(queue=self.queue_name, requeued="true").inc()
+            return
+        await message.ack()
+        MESSAGES_ACKED.labels(queue=self.queue_name).inc()
+
+    def _init_prefetch(self, min_prefetch: int = 1):
+        """Create the prefetch controller, if adaptive prefetch is enabled."""
+        if not self.adaptive_prefetch:
+            return
+
+        self.prefetch = PrefetchController(
+            self.queue_name,
+            initial=self.prefetch_count,
+            min_prefetch=max(DEFAULT_MIN_PREFETCH, min_prefetch),
+        )
+
+    def _on_attached(self):
+        """Start adjusting prefetch, sampling queue depth and purging old IDs."""
+        if self.prefetch:
+            self.prefetch.start(self.channel)
+        if self.idempotency is not None:
+            self.idempotency.start_purging()
+        get_queue_monitor().watch(*self._monitored_queues)
+
+    @property
+    def _monitored_queues(self) -> list[str]:
+        queues = [self.queue_name]
+        if self.retry:
+            queues.append(self.retry.dlq_name)
+        return queues
+
+    def _delivered(self, message: AbstractIncomingMessage):
+        """Account for a delivery before it is handled."""
+        if self.prefetch:
+            self.prefetch.delivered()
+        if message.redelivered:
+            MESSAGES_REDELIVERED.labels(queue=self.queue_name).inc()
+
+    @contextmanager
+    def _track(self, event_type: str):
+        """Time a handler call, for metrics and the prefetch controller."""
+        with HANDLER_SECONDS.labels(queue=self.queue_name, event_type=event_type).time():
+            with self.prefetch.track() if self.prefetch else nullcontext():
+                yield
+
+    async def _is_duplicate(self, message: AbstractIncomingMessage) -> bool:
+        """
+        Whether the message's event was already processed by this consumer.
+
+        If the store can't be reached the message is handled as new: the
+        handler's transaction still refuses a recorded event, and a requeue
+        here would redeliver it at once, over and over, until the store is back.
+        """
+        if self.idempotency is None:
+            return False
+
+        try:
+            seen = await self.idempotency.seen(
+                message.message_id, redelivered=message.redelivered
+            )
+        except Exception as e:
+            logger.warning(
+                f"Processed event lookup failed for {message.message_id} "
+                f"on {self.queue_name}, handling it: {e}"
+            )
+            return False
+
+        if seen:
+            logger.info(
+                f"Skipping duplicate event {message.message_id} on {self.queue_name}"
+            )
+            return True
+        return False
+
+    def _recording(self, message: AbstractIncomingMessage):
+        """Record the message's event in the transaction of its handler."""
+        if self.idempotency is None:
+            return nullcontext()
+        return self.idempotency.handling(message.message_id)
+
+    def _recording_batch(self):
+        """Let the batch handler record its events in its own transaction."""
+        if self.idempotency is None:
+            return nullcontext()
+        return self.idempotency.handling_batch()
+
+    async def _mark_processed(
+        self, message: AbstractIncomingMessage, recorded: bool = False
+    ):
+        """Remember a handled event; failing to do so must not fail the message."""
+        if self.idempotency is None:
+            return
+
+        try:
+            await self.idempotency.mark(message.message_id, recorded=recorded)
+        except Exception as e:
+            logger.error(f"Failed to record processed event {message.message_id}: {e}")
+
+    async def _partition_worker(self, partition: asyncio.Queue, process: Callable):
+        """Handle one partition's messages sequentially."""
+        while True:
+            message = await partition.get()
+            try:
+                await process(message)
+            except Exception as e:
+                # message.process() has already rejected the message
+                logger.error(f"Error processing message from {self.queue_name}: {e}")
+            finally:
+                partition.task_done()
 
     async def close(self):
-        """Close the channel."""
-        if self.channel:
-            await self.channel.close()
+        """Close the channel and give its pool slot back."""
+        get_queue_monitor().unwatch(*self._monitored_queues)
+
+        if self.prefetch:
+            await self.prefetch.stop()
+        if self.idempotency is not None:
+            await self.idempotency.stop_purging()
+
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+
+        if self._pooled:
+            await self.pool.checkin(self._pooled, discard=True)
+            self._pooled = None
+            self.channel = None
@@ -0,0 +1,127 @@
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type
+
+from aio_pika.abc import AbstractIncomingMessage
+
+from ..events.base import BaseEvent
+from ..events.registry import get_event_model
+from .codecs import codec_for
+from .compression import decompress
+from .metrics import DECODE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPE_HEADER = "event_type"
+
+Handler = Callable[..., Awaitable[Any]]
+
+
+def message_event_type(message: AbstractIncomingMessage) -> str:
+    """Event type of a message for metrics: its header, else its routing key."""
+    event_type = (message.headers or {}).get(EVENT_TYPE_HEADER)
+    if isinstance(event_type, bytes):
+        event_type = event_type.decode()
+    return event_type or message.routing_key or "unknown"
+
+
+class EventDispatcher:
+    """
+    Routes messages to typed handlers.
+
+    The handler is chosen from the ``event_type`` message header, so the
+    body is only decoded for events that have a handler, and then exactly
+    once, straight into the registered event model with the codec matching
+    the message content type (after undoing any content encoding). Messages
+    published without the header fall back to reading ``event_type`` from
+    the body, still with a single parse.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, Handler] = {}
+        self._models: Dict[str, Type[BaseEvent]] = {}
+
+    @property
+    def event_types(self) -> list[str]:
+        """Event types with a registered handler (usable as routing keys)."""
+        return list(self._handlers)
+
+    def register(
+        self,
+        event_type: str,
+        handler: Handler,
+        model: Optional[Type[BaseEvent]] = None,
+    ):
+        """
+        Register the handler for an event type.
+
+        Args:
+            event_type: Event type to handle
+            handler: Async function receiving the decoded event
+            model: Event model (defaults to the shared.events registry entry)
+        """
+        event_type = getattr(event_type, "value", event_type)
+        model = model or get_event_model(event_type)
+
+        self._handlers[event_type] = handler
+        self._models[event_type] = model
+
+    def on(self, event_type: str, model: Optional[Type[BaseEvent]] = None):
+        """Decorator form of register()."""
+
+        def decorator(handler: Handler) -> Handler:
+            self.register(event_type, handler, model)
+            return handler
+
+        return decorator
+
+    def resolve(
+        self, message: AbstractIncomingMessage
+    ) -> Tuple[Optional[Handler], Optional[BaseEvent]]:
+        """
+        Find the handler for a message and decode its event.
+
+        Returns:
+            (handler, event), or (None, None) if no handler is registered
+        """
+        codec = codec_for(message.content_type)
+        event_type = (message.headers or {}).get(EVENT_TYPE_HEADER)
+
+        if event_type is None:
+            # Published without the header: parse once, validate the dict
+            started = time.perf_counter()
+            data = codec.loads(decompress(message.body, message.content_encoding))
+            event_type = data.get("event_type")
+            handler = self._handlers.get(event_type)
+            if handler is None:
+                return None, None
+            event = self._models[event_type].model_validate(data)
+            DECODE_SECONDS.labels(event_type=event_type).observe(
+                time.perf_counter() - started
+            )
+            return handler, event
+
+        if isinstance(event_type, bytes):
+            event_type = event_type.decode()
+
+        handler = self._handlers.get(event_type)
+        if handler is None:
+            return None, None
+        with DECODE_SECONDS.labels(event_type=event_type).time():
+            body = decompress(message.body, message.content_encoding)
+            return handler, codec.decode(body, self._models[event_type])
+
+    async def dispatch(self, message: AbstractIncomingMessage, *args: Any) -> Any:
+        """
+        Decode a message and call its handler.
+
+        Extra positional arguments are passed to the handler before the event.
+        """
+        handler, event = self.resolve(message)
+        if handler is None:
+            logger.debug(f"No handler for message {message.message_id}")
+            return None
+        return await handler(*args, event)
+
+    async def __call__(self, message: AbstractIncomingMessage) -> Any:
+        return await self.dispatch(message)
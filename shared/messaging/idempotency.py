@@ -0,0 +1,476 @@
+"""
+Duplicate delivery detection for consumers.
+
+RabbitMQ delivers at least once, so the same event can arrive again after a
+redelivery or an outbox retry. Consumers remember the IDs of events they
+have processed and acknowledge repeats without running the handler.
+
+IDs are looked up in memory first. The persistent store is only asked
+about messages the broker marks as redelivered, so a first delivery costs
+no query. While a handler runs, its event ID is written by the first
+commit of a session on the store's database, in the same transaction as
+the handler's changes: both commit or roll back together, and if another
+delivery of the event has already been recorded the commit fails with
+DuplicateEvent instead of applying its effects a second time.
+
+Batch handlers commit many events at once, so they record each one
+themselves with record_processed, inside the savepoint holding its changes.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import Collection, Iterator, Optional, Sequence
+
+from sqlalchemy import Column, DateTime, String, delete, event, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, SessionTransaction
+
+from .metrics import IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# Event IDs remembered per consumer (0 disables the cache)
+DEFAULT_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+
+# Seconds an event ID is remembered in memory
+DEFAULT_TTL = float(os.getenv("IDEMPOTENCY_TTL", "3600"))
+
+# Seconds an event ID is kept in the store; redeliveries older than this
+# are no longer recognised
+DEFAULT_RETENTION = float(os.getenv("IDEMPOTENCY_RETENTION", "604800"))
+
+# Seconds between purges of expired IDs from the store (0 disables them)
+DEFAULT_PURGE_INTERVAL = float(os.getenv("IDEMPOTENCY_PURGE_INTERVAL", "3600"))
+
+
+class DuplicateEvent(Exception):
+    """The event being handled was already recorded as processed."""
+
+
+class ProcessedEventMixin:
+    """
+    Columns for a table of processed event IDs.
+
+    Each service declares its own table against its own Base:
+
+        class ProcessedEvent(ProcessedEventMixin, Base):
+            __tablename__ = "processed_events"
+    """
+
+    consumer = Column(String, primary_key=True)  # queue name
+    event_id = Column(String, primary_key=True)
+    processed_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+        index=True,
+    )
+
+    def __repr__(self):
+        return f"<ProcessedEvent(consumer={self.consumer}, event_id={self.event_id})>"
+
+
+class SqlProcessedEventStore:
+    """
+    Processed event IDs persisted in a service's database.
+
+    Survives restarts. Rows are written in the handler's transaction (see
+    ProcessedEventCache.handling), or on their own for handlers that don't
+    commit to this database.
+    """
+
+    def __init__(self, session_factory, model):
+        """
+        Args:
+            session_factory: Async session factory of the service database
+            model: Mapped class using ProcessedEventMixin
+        """
+        self.session_factory = session_factory
+        self.model = model
+
+        # Handlers' sessions bound to this engine record their event ID
+        bind = session_factory.kw.get("bind")
+        self.sync_engine = getattr(bind, "sync_engine", None)
+
+    def _insert(self, dialect_name: str, consumer: str, event_ids: Sequence[str]):
+        """INSERT of processed IDs, skipping those already recorded where supported."""
+        rows = [{"consumer": consumer, "event_id": event_id} for event_id in event_ids]
+        if dialect_name == "postgresql":
+            return postgresql.insert(self.model).values(rows).on_conflict_do_nothing()
+        if dialect_name == "sqlite":
+            return sqlite.insert(self.model).values(rows).on_conflict_do_nothing()
+        return insert(self.model).values(rows)
+
+    def record(self, session: Session, consumer: str, event_id: str):
+        """
+        Record an event in a session's transaction.
+
+        Raises:
+            DuplicateEvent: If the event was already recorded
+        """
+        result = session.execute(
+            self._insert(session.bind.dialect.name, consumer, [event_id])
+        )
+        if result.rowcount == 0:
+            raise DuplicateEvent(f"Event {event_id} already processed by {consumer}")
+
+    async def contains(self, consumer: str, event_id: str) -> bool:
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(self.model.event_id).where(
+                    self.model.consumer == consumer,
+                    self.model.event_id == event_id,
+                )
+            )
+            return result.first() is not None
+
+    async def add(self, consumer: str, event_id: str):
+        await self.add_many(consumer, [event_id])
+
+    async def add_many(self, consumer: str, event_ids: Sequence[str]):
+        """Record events in one statement of their own."""
+        if not event_ids:
+            return
+
+        async with self.session_factory() as session:
+            dialect_name = session.bind.dialect.name
+            await session.execute(self._insert(dialect_name, consumer, event_ids))
+            await session.commit()
+
+    async def purge(self, older_than: datetime, consumer: Optional[str] = None) -> int:
+        """
+        Delete IDs processed before a point in time.
+
+        Args:
+            older_than: Oldest processing time kept
+            consumer: Only purge this consumer's IDs
+
+        Returns:
+            Number of rows deleted
+        """
+        query = delete(self.model).where(self.model.processed_at < older_than)
+        if consumer is not None:
+            query = query.where(self.model.consumer == consumer)
+
+        async with self.session_factory() as session:
+            result = await session.execute(query)
+            await session.commit()
+            return result.rowcount
+
+
+class _Handling:
+    """An event whose handler is running, to record in the handler's transaction."""
+
+    def __init__(self, store: SqlProcessedEventStore, consumer: str, event_id: str):
+        self.store = store
+        self.consumer = consumer
+        self.event_id = event_id
+        # Whether a committed transaction recorded the event
+        self.recorded = False
+        self._committing: Optional[Session] = None
+
+
+class _Batch:
+    """A batch whose handler records its events in its own transaction."""
+
+    def __init__(self, store: SqlProcessedEventStore, consumer: str):
+        self.store = store
+        self.consumer = consumer
+        # Event IDs written by a committed transaction
+        self.recorded: set[str] = set()
+        # Event ID -> transaction (or savepoint) whose commit writes it
+        self._pending: dict[str, SessionTransaction] = {}
+
+
+_handling: ContextVar[Optional[_Handling]] = ContextVar(
+    "idempotency_handling", default=None
+)
+
+_batch: ContextVar[Optional[_Batch]] = ContextVar("idempotency_batch", default=None)
+
+
+@event.listens_for(Session, "before_commit")
+def _record_before_commit(session: Session):
+    handling = _handling.get()
+    if handling is None or handling.recorded:
+        return
+    if session.in_nested_transaction():
+        return  # Only a savepoint; the ID goes with the outer commit
+    if session.bind is None or session.bind is not handling.store.sync_engine:
+        return  # Another database
+
+    handling.store.record(session, handling.consumer, handling.event_id)
+    handling._committing = session
+
+
+def _innermost_transaction(session: Session) -> Optional[SessionTransaction]:
+    """The innermost transaction of a session: a savepoint if one is open."""
+    return session.get_nested_transaction() or session.get_transaction()
+
+
+@event.listens_for(Session, "after_commit")
+def _recorded_after_commit(session: Session):
+    batch = _batch.get()
+    if batch is not None and batch._pending:
+        committed = _innermost_transaction(session)
+        for event_id, transaction in list(batch._pending.items()):
+            if transaction is not committed:
+                continue
+            if committed.parent is None:
+                batch.recorded.add(event_id)
+                del batch._pending[event_id]
+            else:
+                # A released savepoint: now up to the enclosing transaction
+                batch._pending[event_id] = committed.parent
+
+    if session.in_nested_transaction():
+        return  # A savepoint release, not yet durable
+
+    handling = _handling.get()
+    if handling is not None and handling._committing is session:
+        handling.recorded = True
+
+
+async def record_processed(session: AsyncSession, event_id: Optional[str]):
+    """
+    Record an event of the batch being handled in a session's transaction.
+
+    Batch handlers call this for each message before handling it, inside
+    the savepoint its changes are made in, so the ID commits or rolls back
+    with them. Does nothing outside a batch of a consumer with a store, for
+    messages without an ID, or for sessions on another database.
+
+    Raises:
+        DuplicateEvent: If the event was already recorded; its changes
+            should be skipped and the message acknowledged
+    """
+    batch = _batch.get()
+    if batch is None or not event_id:
+        return
+    if session.sync_session.bind is not batch.store.sync_engine:
+        return  # Another database
+
+    await session.run_sync(batch.store.record, batch.consumer, event_id)
+    batch._pending[event_id] = _innermost_transaction(session.sync_session)
+
+
+class ProcessedEventCache:
+    """
+    Bounded LRU set of recently processed event IDs with a TTL.
+
+    Optionally backed by a persistent store, consulted for redeliveries
+    missing from memory and purged of IDs older than ``retention``.
+    """
+
+    def __init__(
+        self,
+        consumer: str,
+        max_size: int = DEFAULT_CACHE_SIZE,
+        ttl: float = DEFAULT_TTL,
+        store: Optional[SqlProcessedEventStore] = None,
+        retention: float = DEFAULT_RETENTION,
+        purge_interval: float = DEFAULT_PURGE_INTERVAL,
+    ):
+        """
+        Args:
+            consumer: Name the IDs are recorded under (the queue name)
+            max_size: Most event IDs kept in memory
+            ttl: Seconds an event ID is kept in memory
+            store: Persistent store of processed IDs
+            retention: Seconds an event ID is kept in the store
+            purge_interval: Seconds between purges of the store (0 disables them)
+        """
+        self.consumer = consumer
+        self.max_size = max_size
+        self.ttl = ttl
+        self.store = store
+        self.retention = retention
+        self.purge_interval = purge_interval
+        self._purging: Optional[asyncio.Task] = None
+
+        # event_id -> expiry (monotonic time), least recently used first
+        self._entries: OrderedDict[str, float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remember(self, event_id: str):
+        self._entries[event_id] = time.monotonic() + self.ttl
+        self._entries.move_to_end(event_id)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        IDEMPOTENCY_CACHE_SIZE.labels(consumer=self.consumer).set(len(self._entries))
+
+    def _in_memory(self, event_id: str) -> bool:
+        expiry = self._entries.get(event_id)
+        if expiry is None:
+            return False
+
+        if expiry < time.monotonic():
+            del self._entries[event_id]
+            return False
+
+        self._entries.move_to_end(event_id)
+        return True
+
+    async def seen(self, event_id: Optional[str], redelivered: bool = False) -> bool:
+        """
+        Whether an event has already been processed.
+
+        Messages without an ID are never treated as duplicates.
+
+        Args:
+            event_id: ID of the event (the message ID)
+            redelivered: Whether the broker marked the message redelivered;
+                only then is the store consulted
+        """
+        if not event_id:
+            return False
+
+        if self._in_memory(event_id):
+            IDEMPOTENCY_LOOKUPS.labels(consumer=self.consumer, result="hit").inc()
+            return True
+
+        store = self.store
+        if (
+            redelivered
+            and store is not None
+            and await store.contains(self.consumer, event_id)
+        ):
+            IDEMPOTENCY_LOOKUPS.labels(consumer=self.consumer, result="store_hit").inc()
+            self._remember(event_id)
+            return True
+
+        IDEMPOTENCY_LOOKUPS.labels(consumer=self.consumer, result="miss").inc()
+        return False
+
+    @contextmanager
+    def handling(self, event_id: Optional[str]) -> Iterator[Optional[_Handling]]:
+        """
+        Record an event in the transaction of the handler run inside the block.
+
+        The first commit of a session on the store's database (in this task)
+        writes the event ID along with the handler's changes; that commit
+        raises DuplicateEvent if the ID was already recorded.
+
+        Yields:
+            The record, whose ``recorded`` says whether a commit wrote it
+            (None without an event ID or a store)
+        """
+        store = self.store
+        if not event_id or store is None or store.sync_engine is None:
+            yield None
+            return
+
+        handling = _Handling(store, self.consumer, event_id)
+        token = _handling.set(handling)
+        try:
+            yield handling
+        finally:
+            _handling.reset(token)
+
+    @contextmanager
+    def handling_batch(self) -> Iterator[Optional[_Batch]]:
+        """
+        Let the batch handler run inside the block record its events.
+
+        See record_processed.
+
+        Yields:
+            The batch, whose ``recorded`` holds the IDs committed by the
+            handler (None without a store)
+        """
+        store = self.store
+        if store is None or store.sync_engine is None:
+            yield None
+            return
+
+        batch = _Batch(store, self.consumer)
+        token = _batch.set(batch)
+        try:
+            yield batch
+        finally:
+            _batch.reset(token)
+
+    async def mark(self, event_id: Optional[str], recorded: bool = False):
+        """
+        Record an event as processed.
+
+        Args:
+            event_id: ID of the event
+            recorded: Already written to the store by the handler's transaction
+        """
+        if not event_id:
+            return
+
+        self._remember(event_id)
+        if self.store is not None and not recorded:
+            await self.store.add(self.consumer, event_id)
+
+    async def mark_many(
+        self, event_ids: Sequence[Optional[str]], recorded: Collection[str] = ()
+    ):
+        """
+        Record events as processed, writing them to the store together.
+
+        Args:
+            event_ids: IDs of the events
+            recorded: IDs already written to the store by the handler's
+                transaction
+        """
+        event_ids = [event_id for event_id in event_ids if event_id]
+        for event_id in event_ids:
+            self._remember(event_id)
+        if self.store is not None:
+            await self.store.add_many(
+                self.consumer,
+                [event_id for event_id in event_ids if event_id not in recorded],
+            )
+
+    async def purge(self) -> int:
+        """
+        Delete this consumer's IDs older than the retention from the store.
+
+        Returns:
+            Number of IDs deleted
+        """
+        if self.store is None:
+            return 0
+
+        older_than = datetime.now(timezone.utc) - timedelta(seconds=self.retention)
+        return await self.store.purge(older_than, consumer=self.consumer)
+
+    def start_purging(self):
+        """Purge the store periodically in the background (if there is one)."""
+        if self.store is None or self.purge_interval <= 0:
+            return
+        if self._purging is None or self._purging.done():
+            self._purging = asyncio.create_task(self._purge_loop())
+
+    async def stop_purging(self):
+        if self._purging:
+            self._purging.cancel()
+            try:
+                await self._purging
+            except asyncio.CancelledError:
+                pass
+            self._purging = None
+
+    async def _purge_loop(self):
+        """Purge loop."""
+        while True:
+            try:
+                purged = await self.purge()
+                if purged:
+                    logger.info(f"Purged {purged} processed events of {self.consumer}")
+            except Exception as e:
+                logger.error(f"Processed event purge failed for {self.consumer}: {e}")
+            await asyncio.sleep(self.purge_interval)
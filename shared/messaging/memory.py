@@ -0,0 +1,569 @@
+"""
+In-process stand-in for RabbitMQ.
+
+Implements the part of the aio-pika connection/channel/exchange/queue API
+that EventPublisher, EventConsumer, ChannelPool and RabbitMQClient use, so
+the real publishers, consumers and handlers run unchanged without a broker.
+Selected with ``RABBITMQ_URL=memory://``.
+
+Supported semantics:
+- direct, fanout and topic exchanges (``*`` and ``#`` wildcards) and the
+  default exchange
+- per-consumer prefetch with round-robin delivery
+- ack, nack and reject, with requeue (marked redelivered)
+- dead-lettering of rejected and expired messages via
+  ``x-dead-letter-exchange`` and ``x-dead-letter-routing-key``
+- per-queue message TTL (``x-message-ttl``)
+- passive declares reporting message and consumer counts
+"""
+
+import asyncio
+import itertools
+import logging
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+from uuid import uuid4
+
+from aio_pika import ExchangeType, Message
+from aio_pika.exceptions import (
+    ChannelInvalidStateError,
+    ChannelNotFoundEntity,
+    MessageProcessError,
+)
+from aio_pika.message import ProcessContext
+from pamqp.commands import Basic
+
+logger = logging.getLogger(__name__)
+
+MEMORY_URL_SCHEME = "memory://"
+
+
+@lru_cache(maxsize=4096)
+def topic_matches(pattern: str, routing_key: str) -> bool:
+    """Whether a routing key matches an AMQP topic binding pattern."""
+    return _match_words(
+        tuple(pattern.split(".")), tuple(routing_key.split(".") if routing_key else ())
+    )
+
+
+def _match_words(pattern: tuple, words: tuple) -> bool:
+    if not pattern:
+        return not words
+
+    head, rest = pattern[0], pattern[1:]
+    if head == "#":
+        # Zero or more words
+        return any(_match_words(rest, words[i:]) for i in range(len(words) + 1))
+    if not words:
+        return False
+    return (head == "*" or head == words[0]) and _match_words(rest, words[1:])
+
+
+@dataclass(eq=False)
+class _Envelope:
+    """A message as stored in a queue."""
+
+    body: bytes
+    properties: Dict[str, Any]
+    exchange: str
+    routing_key: str
+    redelivered: bool = False
+
+
+def _properties_of(message: Message) -> Dict[str, Any]:
+    return {
+        "headers": dict(message.headers or {}),
+        "content_type": message.content_type,
+        "content_encoding": message.content_encoding,
+        "delivery_mode": message.delivery_mode,
+        "priority": message.priority,
+        "correlation_id": message.correlation_id,
+        "reply_to": message.reply_to,
+        "expiration": message.expiration,
+        "message_id": message.message_id,
+        "timestamp": message.timestamp,
+        "type": message.type,
+        "user_id": message.user_id,
+        "app_id": message.app_id,
+    }
+
+
+class MemoryIncomingMessage(Message):
+    """A delivered message with aio-pika's ack/nack/reject/process API."""
+
+    def __init__(
+        self,
+        envelope: _Envelope,
+        queue: "_MemoryQueue",
+        consumer: "_Consumer",
+        delivery_tag: int,
+    ):
+        super().__init__(body=envelope.body, **envelope.properties)
+        self.envelope = envelope
+        self.exchange = envelope.exchange
+        self.routing_key = envelope.routing_key
+        self.redelivered = envelope.redelivered
+        self.delivery_tag = delivery_tag
+        self.consumer_tag = consumer.tag
+        self._queue = queue
+        self._consumer = consumer
+        self._processed = False
+
+    @property
+    def channel(self) -> "MemoryChannel":
+        return self._consumer.channel
+
+    @property
+    def processed(self) -> bool:
+        return self._processed
+
+    def _settle(self):
+        if self._processed:
+            raise MessageProcessError("Message already processed", self)
+        if self.channel.is_closed:
+            raise ChannelInvalidStateError("Channel is closed")
+        self._processed = True
+        self._consumer.unacked.discard(self)
+
+    async def ack(self, multiple: bool = False):
+        self._settle()
+        self._queue.drain()
+
+    async def nack(self, multiple: bool = False, requeue: bool = True):
+        self._settle()
+        if requeue:
+            self._queue.requeue(self.envelope)
+        else:
+            self._queue.dead_letter(self.envelope, reason="rejected")
+        self._queue.drain()
+
+    async def reject(self, requeue: bool = False):
+        await self.nack(requeue=requeue)
+
+    def process(
+        self,
+        requeue: bool = False,
+        reject_on_redelivered: bool = False,
+        ignore_processed: bool = False,
+    ) -> ProcessContext:
+        return ProcessContext(
+            self,
+            requeue=requeue,
+            reject_on_redelivered=reject_on_redelivered,
+            ignore_processed=ignore_processed,
+        )
+
+
+class _Consumer:
+    """A callback consuming from a queue through a channel."""
+
+    def __init__(self, channel: "MemoryChannel", callback: Callable, no_ack: bool):
+        self.tag = f"ctag-{uuid4().hex[:12]}"
+        self.channel = channel
+        self.callback = callback
+        self.no_ack = no_ack
+        self.prefetch_count = channel.prefetch_count
+        self.unacked: Set[MemoryIncomingMessage] = set()
+
+    @property
+    def has_capacity(self) -> bool:
+        return self.no_ack or not self.prefetch_count or (
+            len(self.unacked) < self.prefetch_count
+        )
+
+
+class _MemoryQueue:
+    """Broker-side queue state."""
+
+    def __init__(self, broker: "MemoryBroker", name: str, arguments: Dict[str, Any]):
+        self.broker = broker
+        self.name = name
+        self.arguments = dict(arguments or {})
+        self.messages: Deque[_Envelope] = deque()
+        self.consumers: List[_Consumer] = []
+        self._delivery_tags = itertools.count(1)
+        self._next_consumer = 0
+
+    def enqueue(self, envelope: _Envelope):
+        self.messages.append(envelope)
+
+        ttl = self.arguments.get("x-message-ttl")
+        if ttl is not None:
+            asyncio.get_running_loop().call_later(ttl / 1000, self._expire, envelope)
+
+        self.drain()
+
+    def _expire(self, envelope: _Envelope):
+        """Dead-letter a message whose TTL ran out while still queued."""
+        if envelope in self.messages:
+            self.messages.remove(envelope)
+            self.dead_letter(envelope, reason="expired")
+
+    def requeue(self, envelope: _Envelope):
+        envelope.redelivered = True
+        self.messages.appendleft(envelope)
+
+    def dead_letter(self, envelope: _Envelope, reason: str):
+        """Route a rejected message to the queue's dead letter exchange, if any."""
+        dlx = self.arguments.get("x-dead-letter-exchange")
+        if dlx is None:
+            return
+
+        properties = dict(envelope.properties)
+        headers = dict(properties.get("headers") or {})
+        headers["x-death"] = [
+            {
+                "queue": self.name,
+                "reason": reason,
+                "exchange": envelope.exchange,
+                "routing-keys": [envelope.routing_key],
+                "count": 1,
+            }
+        ] + list(headers.get("x-death") or [])
+        properties["headers"] = headers
+
+        routing_key = self.arguments.get(
+            "x-dead-letter-routing-key", envelope.routing_key
+        )
+        self.broker.route(
+            dlx, routing_key, _Envelope(envelope.body, properties, dlx, routing_key)
+        )
+
+    def drain(self):
+        """Deliver queued messages to consumers with free prefetch slots."""
+        while self.messages and self.consumers:
+            consumer = self._pick_consumer()
+            if consumer is None:
+                return
+
+            envelope = self.messages.popleft()
+            message = MemoryIncomingMessage(
+                envelope, self, consumer, next(self._delivery_tags)
+            )
+            if consumer.no_ack:
+                message._processed = True
+            else:
+                consumer.unacked.add(message)
+
+            # Like aiormq: one task per delivery
+            task = asyncio.get_running_loop().create_task(consumer.callback(message))
+            task.add_done_callback(_log_callback_error)
+
+    def _pick_consumer(self) -> Optional[_Consumer]:
+        for offset in range(len(self.consumers)):
+            index = (self._next_consumer + offset) % len(self.consumers)
+            consumer = self.consumers[index]
+            if consumer.has_capacity:
+                self._next_consumer = index + 1
+                return consumer
+        return None
+
+    def remove_consumer(self, consumer: _Consumer):
+        """Cancel a consumer, requeueing what it had not acknowledged."""
+        if consumer in self.consumers:
+            self.consumers.remove(consumer)
+        for message in list(consumer.unacked):
+            message._processed = True
+            self.requeue(message.envelope)
+        consumer.unacked.clear()
+        self.drain()
+
+
+def _log_callback_error(task: asyncio.Task):
+    if not task.cancelled() and task.exception():
+        logger.error(f"Consumer callback failed: {task.exception()}")
+
+
+class _DeclarationResult:
+    def __init__(self, message_count: int, consumer_count: int):
+        self.message_count = message_count
+        self.consumer_count = consumer_count
+
+
+class MemoryExchange:
+    """Exchange handle bound to a channel."""
+
+    def __init__(self, channel: "MemoryChannel", name: str, type: ExchangeType):
+        self.channel = channel
+        self.name = name
+        self.type = type
+
+    async def publish(
+        self,
+        message: Message,
+        routing_key: str,
+        *,
+        mandatory: bool = True,
+        immediate: bool = False,
+        timeout: Optional[float] = None,
+    ):
+        if self.channel.is_closed:
+            raise ChannelInvalidStateError("Channel is closed")
+
+        routing_key = getattr(routing_key, "value", routing_key)
+        envelope = _Envelope(
+            body=message.body,
+            properties=_properties_of(message),
+            exchange=self.name,
+            routing_key=routing_key,
+        )
+        self.channel.broker.route(self.name, routing_key, envelope)
+        return Basic.Ack(delivery_tag=next(self.channel.publish_tags))
+
+
+class MemoryQueue:
+    """Queue handle bound to a channel."""
+
+    def __init__(self, channel: "MemoryChannel", state: _MemoryQueue):
+        self.channel = channel
+        self._state = state
+        self.name = state.name
+        self.arguments = state.arguments
+
+    @property
+    def declaration_result(self) -> _DeclarationResult:
+        return _DeclarationResult(
+            len(self._state.messages), len(self._state.consumers)
+        )
+
+    async def bind(self, exchange, routing_key: Optional[str] = None, **kwargs):
+        exchange_name = getattr(exchange, "name", exchange)
+        routing_key = getattr(routing_key, "value", routing_key)
+        self.channel.broker.bind(self.name, exchange_name, routing_key or self.name)
+
+    async def unbind(self, exchange, routing_key: Optional[str] = None, **kwargs):
+        exchange_name = getattr(exchange, "name", exchange)
+        routing_key = getattr(routing_key, "value", routing_key)
+        self.channel.broker.unbind(self.name, exchange_name, routing_key or self.name)
+
+    async def consume(
+        self, callback: Callable, no_ack: bool = False, **kwargs
+    ) -> str:
+        if self.channel.broker.queues.get(self.name) is not self._state:
+            raise ChannelNotFoundEntity(f"no queue '{self.name}'")
+
+        consumer = _Consumer(self.channel, callback, no_ack)
+        self._state.consumers.append(consumer)
+        self.channel.consumers[consumer.tag] = (self._state, consumer)
+        self._state.drain()
+        return consumer.tag
+
+    async def cancel(self, consumer_tag: str, **kwargs):
+        entry = self.channel.consumers.pop(consumer_tag, None)
+        if entry:
+            state, consumer = entry
+            state.remove_consumer(consumer)
+
+    async def purge(self, **kwargs):
+        self._state.messages.clear()
+
+    async def delete(self, **kwargs):
+        self.channel.broker.delete_queue(self.name)
+
+
+class MemoryChannel:
+    """Channel on the in-memory broker."""
+
+    def __init__(self, connection: "MemoryConnection"):
+        self.connection = connection
+        self.broker = connection.broker
+        self.prefetch_count = 0
+        self.consumers: Dict[str, tuple] = {}
+        self.publish_tags = itertools.count(1)
+        self._owned_queues: Set[str] = set()
+        self._closed = False
+
+    @property
+    def is_closed(self) -> bool:
+        return self._closed or self.connection.is_closed
+
+    @property
+    def default_exchange(self) -> MemoryExchange:
+        return MemoryExchange(self, "", ExchangeType.DIRECT)
+
+    async def set_qos(self, prefetch_count: int = 0, **kwargs):
+        self.prefetch_count = prefetch_count
+        # Applies to this channel's consumers, as with a per-consumer QoS
+        for _, consumer in self.consumers.values():
+            consumer.prefetch_count = prefetch_count
+        for state, _ in self.consumers.values():
+            state.drain()
+
+    async def declare_exchange(
+        self,
+        name: str,
+        type: ExchangeType = ExchangeType.DIRECT,
+        *,
+        passive: bool = False,
+        **kwargs,
+    ) -> MemoryExchange:
+        if passive and name not in self.broker.exchanges:
+            raise ChannelNotFoundEntity(f"no exchange '{name}'")
+        self.broker.exchanges.setdefault(name, ExchangeType(type))
+        return MemoryExchange(self, name, self.broker.exchanges[name])
+
+    async def get_exchange(self, name: str, **kwargs) -> MemoryExchange:
+        return await self.declare_exchange(name, passive=True)
+
+    async def declare_queue(
+        self,
+        name: Optional[str] = None,
+        *,
+        durable: bool = False,
+        exclusive: bool = False,
+        passive: bool = False,
+        auto_delete: bool = False,
+        arguments: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+    ) -> MemoryQueue:
+        if passive:
+            if name not in self.broker.queues:
+                raise ChannelNotFoundEntity(f"no queue '{name}'")
+            return MemoryQueue(self, self.broker.queues[name])
+
+        name = name or f"amq.gen-{uuid4().hex}"
+        state = self.broker.declare_queue(name, arguments)
+        if exclusive or auto_delete:
+            self._owned_queues.add(name)
+        return MemoryQueue(self, state)
+
+    async def get_queue(self, name: str, ensure: bool = True, **kwargs) -> MemoryQueue:
+        if ensure or name in self.broker.queues:
+            return await self.declare_queue(name, passive=True)
+        # Unchecked handle, as in aio-pika: using it fails with NOT_FOUND
+        return MemoryQueue(self, _MemoryQueue(self.broker, name, {}))
+
+    async def close(self, exc: Optional[BaseException] = None):
+        if self._closed:
+            return
+        self._closed = True
+
+        for state, consumer in list(self.consumers.values()):
+            state.remove_consumer(consumer)
+        self.consumers.clear()
+
+        for name in self._owned_queues:
+            self.broker.delete_queue(name)
+        self._owned_queues.clear()
+
+
+class MemoryConnection:
+    """Connection to the in-memory broker."""
+
+    def __init__(self, broker: "MemoryBroker"):
+        self.broker = broker
+        self._channels: List[MemoryChannel] = []
+        self._closed = False
+
+    @property
+    def is_closed(self) -> bool:
+        return self._closed
+
+    async def channel(
+        self,
+        channel_number: Optional[int] = None,
+        publisher_confirms: bool = True,
+        on_return_raises: bool = False,
+    ) -> MemoryChannel:
+        channel = MemoryChannel(self)
+        self._channels.append(channel)
+        return channel
+
+    async def close(self, exc: Optional[BaseException] = None):
+        for channel in self._channels:
+            await channel.close()
+        self._channels.clear()
+        self._closed = True
+
+
+class MemoryBroker:
+    """Exchanges, queues and bindings shared by all in-memory connections."""
+
+    def __init__(self):
+        self.exchanges: Dict[str, ExchangeType] = {"": ExchangeType.DIRECT}
+        self.queues: Dict[str, _MemoryQueue] = {}
+        # exchange name -> list of (queue name, binding key)
+        self.bindings: Dict[str, List[tuple]] = {}
+
+    def declare_queue(self, name: str, arguments: Optional[Dict[str, Any]]):
+        if name not in self.queues:
+            self.queues[name] = _MemoryQueue(self, name, arguments or {})
+        return self.queues[name]
+
+    def delete_queue(self, name: str):
+        self.queues.pop(name, None)
+        for bindings in self.bindings.values():
+            bindings[:] = [b for b in bindings if b[0] != name]
+
+    def bind(self, queue: str, exchange: str, binding_key: str):
+        bindings = self.bindings.setdefault(exchange, [])
+        if (queue, binding_key) not in bindings:
+            bindings.append((queue, binding_key))
+
+    def unbind(self, queue: str, exchange: str, binding_key: str):
+        bindings = self.bindings.get(exchange, [])
+        if (queue, binding_key) in bindings:
+            bindings.remove((queue, binding_key))
+
+    def route(self, exchange: str, routing_key: str, envelope: _Envelope):
+        """Deliver a message to every queue bound to the exchange for its key."""
+        for queue_name in self._matching_queues(exchange, routing_key):
+            queue = self.queues.get(queue_name)
+            if queue is not None:
+                queue.enqueue(
+                    _Envelope(
+                        envelope.body,
+                        dict(envelope.properties),
+                        envelope.exchange,
+                        envelope.routing_key,
+                    )
+                )
+
+    def _matching_queues(self, exchange: str, routing_key: str) -> List[str]:
+        if exchange == "":
+            return [routing_key] if routing_key in self.queues else []
+
+        exchange_type = self.exchanges.get(exchange)
+        matched: List[str] = []
+        for queue_name, binding_key in self.bindings.get(exchange, []):
+            if queue_name in matched:
+                continue
+            if exchange_type == ExchangeType.FANOUT:
+                matched.append(queue_name)
+            elif exchange_type == ExchangeType.TOPIC:
+                if topic_matches(binding_key, routing_key):
+                    matched.append(queue_name)
+            elif binding_key == routing_key:
+                matched.append(queue_name)
+        return matched
+
+
+_broker: Optional[MemoryBroker] = None
+
+
+def get_memory_broker() -> MemoryBroker:
+    """Get or create the process-wide in-memory broker."""
+    global _broker
+
+    if _broker is None:
+        _broker = MemoryBroker()
+
+    return _broker
+
+
+def reset_memory_broker():
+    """Drop all exchanges, queues and messages of the in-memory broker."""
+    global _broker
+    _broker = None
+
+
+async def connect_memory() -> MemoryConnection:
+    """Open a connection to the process-wide in-memory broker."""
+    return MemoryConnection(get_memory_broker())
+
+
+def is_memory_url(url: Optional[str]) -> bool:
+    """Whether a RabbitMQ URL selects the in-memory broker."""
+    return bool(url) and url.startswith(MEMORY_URL_SCHEME)
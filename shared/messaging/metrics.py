@@ -0,0 +1,125 @@
+"""Prometheus metrics for the messaging layer."""
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Channel pool
+CHANNEL_POOL_CHANNELS = Gauge(
+    "messaging_channel_pool_channels",
+    "Open channels held by the channel pool",
+    ["pool", "state"],
+)
+CHANNEL_POOL_MAX_SIZE = Gauge(
+    "messaging_channel_pool_max_size",
+    "Maximum number of channels the pool may open",
+    ["pool"],
+)
+CHANNEL_POOL_CHECKOUT_SECONDS = Histogram(
+    "messaging_channel_pool_checkout_seconds",
+    "Time spent waiting to check a channel out of the pool",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+CHANNEL_POOL_DISCARDED = Counter(
+    "messaging_channel_pool_discarded_total",
+    "Channels closed instead of being returned to the pool",
+    ["pool"],
+)
+
+# Payload compression
+COMPRESSION_RATIO = Histogram(
+    "messaging_compression_ratio",
+    "Compressed size divided by original size of compressed message bodies",
+    ["algorithm"],
+    buckets=(0.05, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5, 0.6, 0.8, 1.0),
+)
+COMPRESSION_SECONDS = Histogram(
+    "messaging_compression_seconds",
+    "Time spent compressing or decompressing message bodies",
+    ["algorithm", "operation"],
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05),
+)
+
+# Consumer idempotency
+IDEMPOTENCY_LOOKUPS = Counter(
+    "messaging_idempotency_lookups_total",
+    "Duplicate checks by result (hit, store_hit or miss)",
+    ["consumer", "result"],
+)
+IDEMPOTENCY_CACHE_SIZE = Gauge(
+    "messaging_idempotency_cache_size",
+    "Event IDs held in the in-memory idempotency cache",
+    ["consumer"],
+)
+
+# Consumer prefetch
+CONSUMER_PREFETCH = Gauge(
+    "messaging_consumer_prefetch",
+    "Current prefetch count (QoS) of a consumer's channel",
+    ["consumer"],
+)
+
+# Delayed retries
+MESSAGES_RETRIED = Counter(
+    "messaging_messages_retried_total",
+    "Failed messages sent to a retry tier",
+    ["queue", "delay"],
+)
+MESSAGES_DEAD_LETTERED = Counter(
+    "messaging_messages_dead_lettered_total",
+    "Failed messages parked in the dead letter queue",
+    ["queue"],
+)
+
+# Publishing
+PUBLISH_SECONDS = Histogram(
+    "messaging_publish_seconds",
+    "Time from publishing a message to its broker confirm",
+    ["event_type"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+MESSAGES_PUBLISHED = Counter(
+    "messaging_messages_published_total",
+    "Published messages by result (confirmed, nacked or failed)",
+    ["event_type", "result"],
+)
+
+# Consuming
+DECODE_SECONDS = Histogram(
+    "messaging_decode_seconds",
+    "Time spent decoding message bodies into events",
+    ["event_type"],
+    buckets=(0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005, 0.01, 0.05),
+)
+HANDLER_SECONDS = Histogram(
+    "messaging_handler_seconds",
+    "Time spent in event handlers, per queue and event type",
+    ["queue", "event_type"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+MESSAGES_ACKED = Counter(
+    "messaging_messages_acked_total",
+    "Deliveries acknowledged",
+    ["queue"],
+)
+MESSAGES_NACKED = Counter(
+    "messaging_messages_nacked_total",
+    "Deliveries rejected, by whether they were requeued",
+    ["queue", "requeued"],
+)
+MESSAGES_REDELIVERED = Counter(
+    "messaging_messages_redelivered_total",
+    "Deliveries flagged by the broker as redelivered",
+    ["queue"],
+)
+
+# Queue monitor
+QUEUE_MESSAGES = Gauge(
+    "messaging_queue_messages",
+    "Messages ready in a queue, sampled with a passive declare",
+    ["queue"],
+)
+QUEUE_CONSUMERS = Gauge(
+    "messaging_queue_consumers",
+    "Consumers attached to a queue, sampled with a passive declare",
+    ["queue"],
+)
@@ -0,0 +1,136 @@
+"""
+Queue depth and consumer count sampling.
+
+Backlogs show where a saga stalls: a growing ``<queue>`` depth with
+consumers attached means its handlers can't keep up, a growing
+``<queue>.dlq`` means failures. The monitor samples each watched queue
+periodically with a passive declare, which reports both counts without
+changing the queue.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Dict, Optional, Tuple
+
+from aio_pika.exceptions import ChannelNotFoundEntity
+
+from .metrics import QUEUE_CONSUMERS, QUEUE_MESSAGES
+from .pool import ChannelPool, get_channel_pool
+
+logger = logging.getLogger(__name__)
+
+# Seconds between samples (0 disables the monitor)
+DEFAULT_MONITOR_INTERVAL = float(os.getenv("RABBITMQ_QUEUE_MONITOR_INTERVAL", "15"))
+
+
+class QueueMonitor:
+    """Publishes message and consumer counts of watched queues as gauges."""
+
+    def __init__(
+        self,
+        interval: float = DEFAULT_MONITOR_INTERVAL,
+        pool: Optional[ChannelPool] = None,
+    ):
+        """
+        Args:
+            interval: Seconds between samples (0 disables sampling)
+            pool: Channel pool to declare on (defaults to the process-wide pool)
+        """
+        self.interval = interval
+        self._pool = pool
+        self.queues: set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pool(self) -> ChannelPool:
+        return self._pool or get_channel_pool()
+
+    def watch(self, *queue_names: str):
+        """Start sampling queues (and the monitor, if it isn't running)."""
+        self.queues.update(queue_names)
+        if self.interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    def unwatch(self, *queue_names: str):
+        """Stop sampling queues; the monitor stops with the last one."""
+        for name in queue_names:
+            self.queues.discard(name)
+            self._forget(name)
+
+        if not self.queues and self._task:
+            self._task.cancel()
+            self._task = None
+
+    @staticmethod
+    def _forget(name: str):
+        for gauge in (QUEUE_MESSAGES, QUEUE_CONSUMERS):
+            try:
+                gauge.remove(name)
+            except KeyError:
+                pass
+
+    async def sample(self) -> Dict[str, Tuple[int, int]]:
+        """
+        Sample every watched queue once.
+
+        Returns:
+            Queue name -> (message count, consumer count)
+        """
+        counts = {}
+        for name in sorted(self.queues):
+            try:
+                # A missing queue closes the channel, so each gets its own
+                async with self.pool.acquire() as pooled:
+                    queue = await pooled.channel.declare_queue(name, passive=True)
+            except ChannelNotFoundEntity:
+                logger.warning(f"Monitored queue {name} does not exist")
+                self._forget(name)
+                continue
+
+            result = queue.declaration_result
+            counts[name] = (result.message_count, result.consumer_count)
+            QUEUE_MESSAGES.labels(queue=name).set(result.message_count)
+            QUEUE_CONSUMERS.labels(queue=name).set(result.consumer_count)
+
+        return counts
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sample()
+            except Exception as e:
+                logger.error(f"Failed to sample queue depths: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def stop(self):
+        """Stop sampling."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+_monitor: Optional[QueueMonitor] = None
+
+
+def get_queue_monitor() -> QueueMonitor:
+    """Get or create the process-wide queue monitor."""
+    global _monitor
+
+    if _monitor is None:
+        _monitor = QueueMonitor()
+
+    return _monitor
+
+
+async def close_queue_monitor():
+    """Stop the process-wide queue monitor."""
+    global _monitor
+
+    if _monitor is not None:
+        await _monitor.stop()
+        _monitor = None
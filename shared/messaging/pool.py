@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from aio_pika import ExchangeType
+from aio_pika.abc import AbstractChannel, AbstractConnection, AbstractExchange
+from aio_pika.exceptions import AMQPChannelError, ChannelInvalidStateError
+
+from .connection import get_rabbitmq_connection
+from .metrics import (
+    CHANNEL_POOL_CHANNELS,
+    CHANNEL_POOL_MAX_SIZE,
+    CHANNEL_POOL_CHECKOUT_SECONDS,
+    CHANNEL_POOL_DISCARDED,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = int(os.getenv("RABBITMQ_CHANNEL_POOL_SIZE", "16"))
+
+# Errors after which a channel can no longer be trusted
+CHANNEL_ERRORS = (AMQPChannelError, ChannelInvalidStateError)
+
+
+class PooledChannel:
+    """A channel checked out of the pool, with its declared exchanges cached."""
+
+    def __init__(self, channel: AbstractChannel):
+        self.channel = channel
+        self._exchanges: Dict[str, AbstractExchange] = {}
+
+    @property
+    def is_healthy(self) -> bool:
+        """Whether the channel is still open."""
+        return not self.channel.is_closed
+
+    async def get_exchange(
+        self, name: str, exchange_type: ExchangeType = ExchangeType.TOPIC
+    ) -> AbstractExchange:
+        """Declare an exchange once per channel and reuse it afterwards."""
+        exchange = self._exchanges.get(name)
+        if exchange is None:
+            exchange = await self.channel.declare_exchange(
+                name,
+                exchange_type,
+                durable=True,  # Survive broker restart
+            )
+            self._exchanges[name] = exchange
+        return exchange
+
+
+class ChannelPool:
+    """
+    Pool of publisher-confirm channels on the shared robust connection.
+
+    Channels are checked out exclusively, so concurrent publishers never
+    interleave on the same channel. A channel is health-checked on checkout
+    and on return, and replaced when it has been closed by the broker.
+    """
+
+    def __init__(
+        self,
+        max_size: int = DEFAULT_POOL_SIZE,
+        connection_factory: Callable[
+            [], Awaitable[AbstractConnection]
+        ] = get_rabbitmq_connection,
+        name: str = "default",
+    ):
+        self.max_size = max_size
+        self.connection_factory = connection_factory
+        self.name = name
+
+        self._slots = asyncio.Semaphore(max_size)
+        self._idle: list[PooledChannel] = []
+        self._in_use = 0
+
+        CHANNEL_POOL_MAX_SIZE.labels(pool=name).set(max_size)
+        self._update_metrics()
+
+    @property
+    def idle(self) -> int:
+        """Open channels waiting in the pool."""
+        return len(self._idle)
+
+    @property
+    def in_use(self) -> int:
+        """Channels currently checked out."""
+        return self._in_use
+
+    def _update_metrics(self):
+        CHANNEL_POOL_CHANNELS.labels(pool=self.name, state="idle").set(self.idle)
+        CHANNEL_POOL_CHANNELS.labels(pool=self.name, state="in_use").set(self.in_use)
+
+    async def _open(self) -> PooledChannel:
+        connection = await self.connection_factory()
+        channel = await connection.channel(publisher_confirms=True)
+        return PooledChannel(channel)
+
+    async def _discard(self, pooled: PooledChannel):
+        CHANNEL_POOL_DISCARDED.labels(pool=self.name).inc()
+        if not pooled.channel.is_closed:
+            try:
+                await pooled.channel.close()
+            except Exception as e:
+                logger.warning(f"Error closing pooled channel: {e}")
+
+    async def checkout(self) -> PooledChannel:
+        """
+        Take a healthy channel from the pool, opening one if needed.
+
+        Waits while all channels are checked out.
+        """
+        started = time.perf_counter()
+        await self._slots.acquire()
+        CHANNEL_POOL_CHECKOUT_SECONDS.labels(pool=self.name).observe(
+            time.perf_counter() - started
+        )
+
+        try:
+            pooled = None
+            while self._idle:
+                candidate = self._idle.pop()
+                if candidate.is_healthy:
+                    pooled = candidate
+                    break
+                await self._discard(candidate)
+
+            if pooled is None:
+                pooled = await self._open()
+        except BaseException:
+            self._slots.release()
+            raise
+
+        self._in_use += 1
+        self._update_metrics()
+        return pooled
+
+    async def checkin(self, pooled: PooledChannel, discard: bool = False):
+        """
+        Return a channel to the pool.
+
+        Args:
+            pooled: Channel obtained from checkout()
+            discard: Close the channel instead of reusing it
+        """
+        self._in_use -= 1
+
+        try:
+            if discard or not pooled.is_healthy:
+                await self._discard(pooled)
+            else:
+                self._idle.append(pooled)
+        finally:
+            self._slots.release()
+            self._update_metrics()
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[PooledChannel]:
+        """Check out a channel for the duration of the block."""
+        pooled = await self.checkout()
+        discard = False
+        try:
+            yield pooled
+        except CHANNEL_ERRORS:
+            discard = True
+            raise
+        finally:
+            await self.checkin(pooled, discard=discard)
+
+    async def close(self):
+        """Close all idle channels."""
+        idle, self._idle = self._idle, []
+        for pooled in idle:
+            if not pooled.channel.is_closed:
+                await pooled.channel.close()
+        self._update_metrics()
+
+
+_pool: Optional[ChannelPool] = None
+
+
+def get_channel_pool() -> ChannelPool:
+    """Get or create the process-wide channel pool."""
+    global _pool
+
+    if _pool is None:
+        _pool = ChannelPool()
+
+    return _pool
+
+
+async def close_channel_pool():
+    """Close the process-wide channel pool."""
+    global _pool
+
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
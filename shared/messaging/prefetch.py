@@ -0,0 +1,180 @@
+"""
+Adaptive consumer prefetch.
+
+A fixed prefetch is too low for fast handlers (the consumer idles waiting
+for the broker) and too high for slow ones (messages queue up inside the
+consumer, inflating latency and redeliveries on failure). The controller
+adjusts a channel's QoS at runtime, AIMD style:
+
+- additive increase while the consumer is saturated (every prefetch slot
+  in use) and handlers are healthy
+- multiplicative decrease when handler latency exceeds the target or the
+  error rate climbs
+"""
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from aio_pika.abc import AbstractChannel
+
+from .metrics import CONSUMER_PREFETCH
+
+logger = logging.getLogger(__name__)
+
+# Whether consumers adjust their prefetch at runtime
+ADAPTIVE_PREFETCH = os.getenv("RABBITMQ_ADAPTIVE_PREFETCH", "true").lower() == "true"
+
+# Bounds for the adaptive prefetch
+DEFAULT_MIN_PREFETCH = int(os.getenv("RABBITMQ_PREFETCH_MIN", "1"))
+DEFAULT_MAX_PREFETCH = int(os.getenv("RABBITMQ_PREFETCH_MAX", "500"))
+
+# Handler latency (p90, seconds) above which prefetch is cut
+DEFAULT_TARGET_LATENCY = float(os.getenv("RABBITMQ_PREFETCH_TARGET_LATENCY", "1.0"))
+
+# Seconds between adjustments
+DEFAULT_ADJUST_INTERVAL = float(os.getenv("RABBITMQ_PREFETCH_INTERVAL", "5"))
+
+
+class PrefetchController:
+    """AIMD controller for a channel's prefetch count."""
+
+    def __init__(
+        self,
+        name: str,
+        initial: int = 10,
+        min_prefetch: int = DEFAULT_MIN_PREFETCH,
+        max_prefetch: int = DEFAULT_MAX_PREFETCH,
+        target_latency: float = DEFAULT_TARGET_LATENCY,
+        max_error_rate: float = 0.05,
+        increase_step: int = 5,
+        decrease_factor: float = 0.5,
+        interval: float = DEFAULT_ADJUST_INTERVAL,
+    ):
+        """
+        Args:
+            name: Consumer name for logs and metrics
+            initial: Starting prefetch count
+            min_prefetch: Lowest prefetch count
+            max_prefetch: Highest prefetch count
+            target_latency: p90 handler latency (seconds) to stay under
+            max_error_rate: Share of failed handler calls that triggers a cut
+            increase_step: Added to the prefetch per saturated interval
+            decrease_factor: Prefetch multiplier on a cut
+            interval: Seconds between adjustments
+        """
+        self.name = name
+        self.min_prefetch = max(1, min_prefetch)
+        self.max_prefetch = max(self.min_prefetch, max_prefetch)
+        self.target_latency = target_latency
+        self.max_error_rate = max_error_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.interval = interval
+        self.prefetch = self._clamp(initial)
+
+        # Deliveries not yet settled, and the most seen this interval
+        self.unsettled = 0
+        self._peak_unsettled = 0
+
+        # Handler calls this interval
+        self._latencies: list[float] = []
+        self._errors = 0
+
+        self._channel: Optional[AbstractChannel] = None
+        self._task: Optional[asyncio.Task] = None
+
+        CONSUMER_PREFETCH.labels(consumer=name).set(self.prefetch)
+
+    def _clamp(self, value: float) -> int:
+        return int(min(self.max_prefetch, max(self.min_prefetch, value)))
+
+    def delivered(self):
+        """A message was delivered to the consumer."""
+        self.unsettled += 1
+        self._peak_unsettled = max(self._peak_unsettled, self.unsettled)
+
+    def settled(self):
+        """A delivered message was acked or rejected."""
+        self.unsettled = max(0, self.unsettled - 1)
+
+    @contextmanager
+    def track(self):
+        """Time a handler call and record whether it failed."""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self._errors += 1
+            raise
+        finally:
+            self._latencies.append(time.perf_counter() - started)
+
+    def adjust(self) -> int:
+        """
+        Compute the next prefetch from this interval's observations.
+
+        Returns:
+            The new prefetch count
+        """
+        latencies = sorted(self._latencies)
+        errors = self._errors
+        saturated = self._peak_unsettled >= self.prefetch
+
+        self._latencies = []
+        self._errors = 0
+        self._peak_unsettled = self.unsettled
+
+        if not latencies:
+            return self.prefetch
+
+        p90 = latencies[int(0.9 * (len(latencies) - 1))]
+        error_rate = errors / len(latencies)
+
+        if p90 > self.target_latency or error_rate > self.max_error_rate:
+            self.prefetch = self._clamp(self.prefetch * self.decrease_factor)
+        elif saturated:
+            self.prefetch = self._clamp(self.prefetch + self.increase_step)
+
+        CONSUMER_PREFETCH.labels(consumer=self.name).set(self.prefetch)
+        return self.prefetch
+
+    async def apply(self, channel: AbstractChannel):
+        """Set the channel's QoS to the current prefetch."""
+        # Channel-wide limit: unlike per-consumer QoS, RabbitMQ applies a
+        # change to consumers that already exist
+        await channel.set_qos(prefetch_count=self.prefetch, global_=True)
+
+    def start(self, channel: AbstractChannel):
+        """Apply the prefetch to a channel and keep adjusting it."""
+        self._channel = channel
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+
+            previous = self.prefetch
+            if self.adjust() == previous:
+                continue
+
+            try:
+                await self.apply(self._channel)
+                logger.info(f"Prefetch for {self.name}: {previous} -> {self.prefetch}")
+            except Exception as e:
+                logger.error(f"Failed to update prefetch for {self.name}: {e}")
+
+    async def stop(self):
+        """Stop adjusting."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._channel = None
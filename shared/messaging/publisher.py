@@ -1,43 +1,96 @@
+import asyncio
 import logging
-from typing import Optional
-from aio_pika import ExchangeType, Message
-from aio_pika.abc import AbstractRobustConnection, AbstractRobustChannel
+import os
+import time
+from typing import Optional, Sequence
+from aio_pika import DeliveryMode, Message
+from pamqp.commands import Basic
 from ..events.base import BaseEvent
-from .connection import get_rabbitmq_connection
+from ..tracing import publish_span, use_carrier
+from .codecs import Codec, get_codec
+from .compression import Compressor
+from .dispatch import EVENT_TYPE_HEADER
+from .metrics import MESSAGES_PUBLISHED, PUBLISH_SECONDS
+from .pool import CHANNEL_ERRORS, ChannelPool, PooledChannel, get_channel_pool
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on messages published but not yet confirmed by the broker
+DEFAULT_MAX_IN_FLIGHT = int(os.getenv("RABBITMQ_PUBLISH_MAX_IN_FLIGHT", "256"))
+
+# Seconds to wait for a broker confirm before failing the publish
+DEFAULT_CONFIRM_TIMEOUT = float(os.getenv("RABBITMQ_PUBLISH_CONFIRM_TIMEOUT", "10"))
+
+# Pooled channels single publishes are spread over
+DEFAULT_PUBLISH_CHANNELS = int(os.getenv("RABBITMQ_PUBLISH_CHANNELS", "4"))
+
+
+class PublishNackedError(Exception):
+    """Raised when the broker negatively acknowledges a published message."""
+
 
 class EventPublisher:
-    """Publishing events to RabbitMQ."""
+    """
+    Publishing events to RabbitMQ.
+
+    Channels come from the shared ChannelPool in publisher-confirm mode and
+    every message is persistent, so a publish only resolves once the broker
+    has taken responsibility for it. Publishes are pipelined: up to
+    ``max_in_flight`` messages may be awaiting confirms at the same time.
 
-    def __init__(self, exchange_name: str = "microservice.events"):
+    Single publishes are spread round-robin over up to ``publish_channels``
+    channels kept checked out by the publisher. Confirms are matched to
+    messages by delivery tag, so a channel doesn't have to be held per
+    message until its confirm arrives; only the window bounds how many are
+    outstanding. Spreading them keeps one slow or failed channel from
+    serializing every publish behind it.
+    """
+
+    def __init__(
+        self,
+        exchange_name: str = "microservice.events",
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        confirm_timeout: float = DEFAULT_CONFIRM_TIMEOUT,
+        pool: Optional[ChannelPool] = None,
+        codec: Optional[Codec] = None,
+        compressor: Optional[Compressor] = None,
+        publish_channels: int = DEFAULT_PUBLISH_CHANNELS,
+    ):
         self.exchange_name = exchange_name
-        self.connection: Optional[AbstractRobustConnection] = None
-        self.channel: Optional[AbstractRobustChannel] = None
-        self.exchange = None
-        # self.exchange: Optional[AbstractExchange] = None
+        self.codec = codec or get_codec()
+        self.compressor = compressor or Compressor()
+        self.max_in_flight = max_in_flight
+        self.confirm_timeout = confirm_timeout
+        self.publish_channels = max(1, publish_channels)
+        self._pool = pool
+
+        # Bounded window of unconfirmed publishes
+        self._window = asyncio.Semaphore(max_in_flight)
+        self._pending: set[asyncio.Future] = set()
 
-        # Event handlers: {EventType: [handler_functions]}
-        # self.handlers: Dict[EventType, list[Callable]] = {}
+        # Channels shared by publishes that don't bring their own
+        self._shared: list[PooledChannel] = []
+        self._next_shared = 0
+        self._shared_lock = asyncio.Lock()
+
+        # Moving average of publish-to-confirm time, in seconds
+        self.confirm_latency = 0.0
+
+    @property
+    def in_flight(self) -> int:
+        """Messages published but not yet confirmed."""
+        return len(self._pending)
+
+    @property
+    def pool(self) -> ChannelPool:
+        """Channel pool used for publishing."""
+        return self._pool or get_channel_pool()
 
     async def connect(self):
-        """Establish connection to RabbitMQ."""
+        """Establish connection to RabbitMQ and declare the exchange."""
         try:
-            # Create robust (auto-reconnecting) connection
-            self.connection = await get_rabbitmq_connection()
-            self.channel = await self.connection.channel()
-
-            # Set QoS to process messages one at a time
-            # Increase prefetch_count for higher throughput
-            # await self.channel.set_qos(prefetch_count=10)
-
-            # Declare topic exchange for events
-            self.exchange = await self.channel.declare_exchange(
-                self.exchange_name,
-                ExchangeType.TOPIC,
-                durable=True,  # Survive broker restart
-            )
+            async with self.pool.acquire() as pooled:
+                await pooled.get_exchange(self.exchange_name)
 
             logger.info("✓ Connected to RabbitMQ")
 
@@ -45,46 +98,206 @@ class EventPublisher:
             logger.error(f"Failed to connect to RabbitMQ: {e}")
             raise
 
-    async def publish_event(self, event: BaseEvent, routing_key: Optional[str] = None):
+    def _build_message(self, event: BaseEvent) -> Message:
+        """Serialize event into a persistent AMQP message."""
+        # Serialize event with the configured codec (JSON by default),
+        # compressing large bodies
+        body, content_encoding = self.compressor.compress(self.codec.encode(event))
+        event_type = getattr(event.event_type, "value", event.event_type)
+
+        return Message(
+            body=body,
+            delivery_mode=DeliveryMode.PERSISTENT,  # Survive broker restart
+            content_type=self.codec.content_type,
+            content_encoding=content_encoding,
+            correlation_id=event.correlation_id,
+            message_id=event.event_id,
+            timestamp=event.timestamp,
+            # Consumers route on this without decoding the body
+            headers={EVENT_TYPE_HEADER: event_type},
+        )
+
+    async def _shared_channel(self) -> PooledChannel:
+        """
+        Next channel for a single publish, round-robin over the shared ones.
+
+        Closed channels are dropped. Another one is opened while there are
+        fewer than ``publish_channels`` and the pool has a channel to spare
+        besides the one publish_many needs.
         """
-        Publish event to exchange.
+        async with self._shared_lock:
+            for pooled in [p for p in self._shared if not p.is_healthy]:
+                await self._release_shared(pooled, discard=True)
+
+            spare = self.pool.in_use + 1 < self.pool.max_size
+            if not self._shared or (
+                len(self._shared) < self.publish_channels and spare
+            ):
+                self._shared.append(await self.pool.checkout())
+                self._next_shared = len(self._shared) - 1
+            else:
+                self._next_shared = (self._next_shared + 1) % len(self._shared)
+            return self._shared[self._next_shared]
+
+    async def _release_shared(self, pooled: PooledChannel, discard: bool = False):
+        """Return a shared channel to the pool (once, if it is still shared)."""
+        if pooled in self._shared:
+            self._shared.remove(pooled)
+            await self.pool.checkin(pooled, discard=discard)
+
+    async def _publish_confirmed(
+        self, message: Message, routing_key: str, pooled: PooledChannel
+    ):
+        """Publish a single message and wait for the broker confirm."""
+        event_type = message.headers.get(EVENT_TYPE_HEADER) or routing_key
+        started = time.perf_counter()
+        try:
+            exchange = await pooled.get_exchange(self.exchange_name)
+            with publish_span(message, self.exchange_name, routing_key):
+                confirmation = await exchange.publish(
+                    message, routing_key=routing_key, timeout=self.confirm_timeout
+                )
+            elapsed = time.perf_counter() - started
+            self.confirm_latency += 0.1 * (elapsed - self.confirm_latency)
+            PUBLISH_SECONDS.labels(event_type=event_type).observe(elapsed)
+        except BaseException as e:
+            if isinstance(e, CHANNEL_ERRORS):
+                await self._release_shared(pooled, discard=True)
+            MESSAGES_PUBLISHED.labels(event_type=event_type, result="failed").inc()
+            raise
+
+        if isinstance(confirmation, (Basic.Nack, Basic.Reject)):
+            MESSAGES_PUBLISHED.labels(event_type=event_type, result="nacked").inc()
+            raise PublishNackedError(
+                f"Broker rejected message {message.message_id} "
+                f"(routing_key: {routing_key})"
+            )
+        MESSAGES_PUBLISHED.labels(event_type=event_type, result="confirmed").inc()
+
+    def _on_settled(self, future: asyncio.Future):
+        """Free a window slot once a publish is confirmed or failed."""
+        self._pending.discard(future)
+        self._window.release()
+
+        if not future.cancelled() and future.exception():
+            logger.error(f"Publish failed: {future.exception()}")
+
+    async def submit(
+        self,
+        event: BaseEvent,
+        routing_key: Optional[str] = None,
+        channel: Optional[PooledChannel] = None,
+        trace_context: Optional[str] = None,
+    ) -> asyncio.Future:
+        """
+        Start publishing an event without waiting for its confirm.
+
+        Waits only while the in-flight window is full.
 
         Args:
             event: Event to publish
             routing_key: Routing key (defaults to event_type)
-        """
-        if not self.exchange:
-            await self.connect()
-            # raise RuntimeError("Not connected to RabbitMQ")
+            channel: Pooled channel to publish on (defaults to the next shared
+                one)
+            trace_context: Stored trace context to publish under (see
+                shared.tracing.current_carrier), instead of the current one
 
+        Returns:
+            Future resolved when the broker confirms the message
+        """
         routing_key = routing_key or event.event_type
+        message = self._build_message(event)
 
-        # Serialize event to JSON
-        body = event.model_dump_json().encode()
+        # Always take the channel before the window slot (as publish_many
+        # does) so the two never wait on each other in opposite order
+        if channel is None:
+            channel = await self._shared_channel()
+        await self._window.acquire()
 
-        # Create persistent message
-        message = Message(
-            body=body,
-            content_type="application/json",
-            correlation_id=event.correlation_id,
-            message_id=event.event_id,
-            # timestamp=event.timestamp,
-            # headers={
-            #     "event_type": event.event_type.value,
-            #     "causation_id": event.causation_id or "",
-            # },
+        # The publish task inherits the trace context it is created in
+        with use_carrier(trace_context):
+            future = asyncio.ensure_future(
+                self._publish_confirmed(message, routing_key, channel)
+            )
+        self._pending.add(future)
+        future.add_done_callback(self._on_settled)
+
+        logger.debug(
+            f"Submitted: {event.event_type} "
+            f"(ID: {event.event_id[:8]}..., routing_key: {routing_key})"
         )
+        return future
 
-        # Publish to exchange
-        await self.exchange.publish(message, routing_key=routing_key)
+    async def publish_event(self, event: BaseEvent, routing_key: Optional[str] = None):
+        """
+        Publish event to exchange and wait for the broker confirm.
+
+        Args:
+            event: Event to publish
+            routing_key: Routing key (defaults to event_type)
+        """
+        await (await self.submit(event, routing_key))
 
         logger.info(
             f"Published: {event.event_type} "
-            f"(ID: {event.event_id[:8]}..., routing_key: {routing_key})"
+            f"(ID: {event.event_id[:8]}..., routing_key: {routing_key or event.event_type})"
         )
 
+    async def publish_many(
+        self,
+        events: Sequence[BaseEvent],
+        routing_key: Optional[str] = None,
+        routing_keys: Optional[Sequence[str]] = None,
+        trace_contexts: Optional[Sequence[Optional[str]]] = None,
+    ) -> list[Optional[BaseException]]:
+        """
+        Publish events pipelined over a single channel.
+
+        Messages are written back-to-back, in order, without waiting for
+        confirms in between; the in-flight window applies backpressure.
+
+        Args:
+            events: Events to publish, in order
+            routing_key: Routing key (defaults to each event's event_type)
+            routing_keys: Per-event routing keys, overriding routing_key
+            trace_contexts: Per-event stored trace contexts
+
+        Returns:
+            One entry per event: None if confirmed, otherwise the error
+        """
+        if routing_keys is None:
+            routing_keys = [routing_key] * len(events)
+        if trace_contexts is None:
+            trace_contexts = [None] * len(events)
+
+        async with self.pool.acquire() as pooled:
+            futures = [
+                await self.submit(event, key, channel=pooled, trace_context=context)
+                for event, key, context in zip(events, routing_keys, trace_contexts)
+            ]
+            results = await asyncio.gather(*futures, return_exceptions=True)
+
+        failed = sum(1 for result in results if isinstance(result, BaseException))
+        logger.info(f"Published batch: {len(results) - failed} ok, {failed} failed")
+
+        return [
+            result if isinstance(result, BaseException) else None
+            for result in results
+        ]
+
+    async def flush(self):
+        """Wait until every submitted message is confirmed or failed."""
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    async def close(self):
+        """Flush pending publishes; channels stay with the pool."""
+        await self.flush()
+        for pooled in list(self._shared):
+            await self._release_shared(pooled)
+
     async def disconnect(self):
-        """Close RabbitMQ connection."""
-        if self.connection:
-            await self.connection.close()
-            logger.info("Disconnected from RabbitMQ")
+        """Flush pending publishes and close the channel pool."""
+        await self.close()
+        await self.pool.close()
+        logger.info("Disconnected from RabbitMQ")
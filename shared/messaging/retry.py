@@ -0,0 +1,176 @@
+"""
+Delayed retries through TTL queues.
+
+A message whose handler fails is acked and republished to the first retry
+queue of its queue, ``<queue>.retry.<delay>s``. Retry queues have no
+consumers: once the message's TTL runs out the broker dead-letters it back
+to ``<queue>`` through the default exchange. Each attempt moves it one tier
+further; after the last tier it is parked in ``<queue>.dlq``.
+
+The main queue keeps flowing while a message waits, so transient failures
+(lock contention, a database failover) recover on their own without
+blocking the queue or needing manual replays.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Optional, Sequence, Tuple, Type
+
+from aio_pika import DeliveryMode, Message
+from aio_pika.abc import AbstractChannel, AbstractIncomingMessage
+from pydantic import ValidationError
+
+from .metrics import MESSAGES_DEAD_LETTERED, MESSAGES_RETRIED
+
+logger = logging.getLogger(__name__)
+
+RETRY_COUNT_HEADER = "x-retry-count"
+LAST_ERROR_HEADER = "x-last-error"
+
+
+def _parse_delays(value: str) -> Tuple[float, ...]:
+    return tuple(float(delay) for delay in value.split(",") if delay.strip())
+
+
+# Seconds each retry tier holds a message ("" disables retries)
+DEFAULT_RETRY_DELAYS = _parse_delays(os.getenv("RABBITMQ_RETRY_DELAYS", "1,10,60"))
+
+
+class PermanentError(Exception):
+    """Raised by handlers for failures that retrying cannot fix."""
+
+
+class RetryPolicy:
+    """Retry tiers and dead letter queue of one queue."""
+
+    def __init__(
+        self,
+        queue_name: str,
+        delays: Sequence[float] = DEFAULT_RETRY_DELAYS,
+        non_retryable: Tuple[Type[BaseException], ...] = (
+            PermanentError,
+            ValidationError,
+        ),
+    ):
+        """
+        Args:
+            queue_name: Queue whose failed messages are retried
+            delays: Delay in seconds of each tier, in order
+            non_retryable: Errors that send a message straight to the DLQ
+        """
+        self.queue_name = queue_name
+        self.delays = tuple(delays)
+        self.non_retryable = non_retryable
+
+    @property
+    def dlq_name(self) -> str:
+        return f"{self.queue_name}.dlq"
+
+    def tier_name(self, delay: float) -> str:
+        return f"{self.queue_name}.retry.{delay:g}s"
+
+    async def declare(self, channel: AbstractChannel):
+        """Declare the retry queues and the dead letter queue."""
+        await asyncio.gather(
+            *(
+                channel.declare_queue(
+                    self.tier_name(delay),
+                    durable=True,
+                    arguments={
+                        "x-message-ttl": int(delay * 1000),
+                        # Back to the main queue once the delay has passed
+                        "x-dead-letter-exchange": "",
+                        "x-dead-letter-routing-key": self.queue_name,
+                    },
+                )
+                for delay in self.delays
+            ),
+            channel.declare_queue(self.dlq_name, durable=True),
+        )
+
+    async def check(self, channel: AbstractChannel):
+        """
+        Passively declare the retry queues and the dead letter queue.
+
+        Raises:
+            AMQPChannelError: If one of them is missing (the broker closes
+                the channel)
+        """
+        await asyncio.gather(
+            *(
+                channel.declare_queue(name, passive=True)
+                for name in [*map(self.tier_name, self.delays), self.dlq_name]
+            )
+        )
+
+    def attempts(self, message: AbstractIncomingMessage) -> int:
+        """Retries the message has already been through."""
+        return int((message.headers or {}).get(RETRY_COUNT_HEADER, 0))
+
+    async def schedule(
+        self,
+        channel: AbstractChannel,
+        message: AbstractIncomingMessage,
+        error: BaseException,
+    ) -> str:
+        """
+        Republish a failed message to its next retry tier, or to the DLQ.
+
+        The caller acks the original once this returns.
+
+        Returns:
+            Name of the queue the message was sent to
+        """
+        attempts = self.attempts(message)
+
+        if isinstance(error, self.non_retryable) or attempts >= len(self.delays):
+            destination, retries = self.dlq_name, attempts
+            MESSAGES_DEAD_LETTERED.labels(queue=self.queue_name).inc()
+            logger.error(
+                f"Dead-lettering {message.message_id} from {self.queue_name} "
+                f"after {attempts} retries: {error}"
+            )
+        else:
+            delay = self.delays[attempts]
+            destination, retries = self.tier_name(delay), attempts + 1
+            MESSAGES_RETRIED.labels(queue=self.queue_name, delay=f"{delay:g}s").inc()
+            logger.warning(
+                f"Retrying {message.message_id} from {self.queue_name} "
+                f"in {delay:g}s (attempt {attempts + 1}): {error}"
+            )
+
+        await channel.default_exchange.publish(
+            self._copy(message, retries, error), routing_key=destination
+        )
+        return destination
+
+    @staticmethod
+    def _copy(
+        message: AbstractIncomingMessage, retries: int, error: BaseException
+    ) -> Message:
+        headers = dict(message.headers or {})
+        headers[RETRY_COUNT_HEADER] = retries
+        headers[LAST_ERROR_HEADER] = f"{type(error).__name__}: {error}"[:500]
+
+        return Message(
+            body=message.body,
+            headers=headers,
+            content_type=message.content_type,
+            content_encoding=message.content_encoding,
+            delivery_mode=DeliveryMode.PERSISTENT,
+            priority=message.priority,
+            correlation_id=message.correlation_id,
+            message_id=message.message_id,
+            timestamp=message.timestamp,
+            type=message.type,
+            app_id=message.app_id,
+        )
+
+
+def retry_policy_for(
+    queue_name: str, delays: Optional[Sequence[float]] = None
+) -> Optional[RetryPolicy]:
+    """A RetryPolicy for a queue, or None when retries are disabled."""
+    delays = DEFAULT_RETRY_DELAYS if delays is None else delays
+    return RetryPolicy(queue_name, delays) if delays else None
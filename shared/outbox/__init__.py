@@ -0,0 +1,6 @@
+"""Transactional outbox for reliable event publishing."""
+
+from .models import OutboxMixin
+from .relay import OutboxRelay, requeue_parked
+
+__all__ = ["OutboxMixin", "OutboxRelay", "requeue_parked"]
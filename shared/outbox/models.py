@@ -0,0 +1,67 @@
+import json
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import Column, String, Text, Integer, DateTime
+
+from ..events.base import BaseEvent
+from ..events.registry import deserialize_event
+from ..tracing import current_carrier
+
+
+class OutboxMixin:
+    """
+    Columns for a transactional outbox table.
+
+    Each service declares its own table against its own Base:
+
+        class OutboxEvent(OutboxMixin, Base):
+            __tablename__ = "outbox_events"
+
+    Rows are added in the same transaction as the domain change and removed
+    by the OutboxRelay once the broker has confirmed the event. Rows that
+    keep failing are parked (``parked_at``) for someone to look at.
+    """
+
+    id = Column(String, primary_key=True)  # event_id
+    event_type = Column(String, nullable=False)
+    routing_key = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    correlation_id = Column(String, nullable=True)
+
+    # W3C trace context of the transaction that wrote the row, as JSON
+    trace_context = Column(Text, nullable=True)
+
+    # Delivery bookkeeping
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    # Set once the relay gives up on the row; parked rows are never claimed
+    parked_at = Column(DateTime(timezone=True), nullable=True)
+
+    created_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+        index=True,
+    )
+
+    @classmethod
+    def from_event(cls, event: BaseEvent, routing_key: Optional[str] = None):
+        """Build an outbox row for an event."""
+        event_type = getattr(event.event_type, "value", event.event_type)
+
+        return cls(
+            id=event.event_id,
+            event_type=event_type,
+            routing_key=routing_key or event_type,
+            payload=event.model_dump_json(),
+            correlation_id=event.correlation_id,
+            trace_context=current_carrier(),
+            attempts=0,
+        )
+
+    def to_event(self) -> BaseEvent:
+        """Rebuild the typed event stored in this row."""
+        return deserialize_event(self.event_type, json.loads(self.payload))
+
+    def __repr__(self):
+        return f"<OutboxEvent(id={self.id}, event_type={self.event_type})>"
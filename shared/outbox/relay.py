@@ -0,0 +1,309 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Optional, Sequence, Type
+
+from prometheus_client import Counter
+from sqlalchemy import select, delete, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from ..messaging.publisher import EventPublisher, PublishNackedError
+from .models import OutboxMixin
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_EVENTS_PARKED = Counter(
+    "outbox_events_parked_total",
+    "Outbox rows the relay gave up publishing after too many failed attempts",
+    ["table"],
+)
+
+
+class OutboxRelay:
+    """
+    Background task draining an outbox table to RabbitMQ.
+
+    Rows are claimed with FOR UPDATE SKIP LOCKED, so several replicas can
+    relay the same table without publishing an event twice. The batch size
+    adapts to the backlog: it doubles while batches come back full and
+    halves when they come back mostly empty.
+
+    A row the broker rejects (nacks), or that can't be decoded, ``max_attempts``
+    times is parked (``parked_at``) and no longer claimed, so one bad event
+    can't hold up the rest or be retried forever; ``requeue_parked`` puts it
+    back. Other failures (confirm timeouts, channel errors, an unreachable
+    broker) don't count against a row: the relay backs off exponentially, up
+    to ``max_backoff``, and retries until the broker is back.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        model: Type[OutboxMixin],
+        publisher: EventPublisher,
+        min_batch_size: int = int(os.getenv("OUTBOX_MIN_BATCH_SIZE", "10")),
+        max_batch_size: int = int(os.getenv("OUTBOX_MAX_BATCH_SIZE", "500")),
+        poll_interval: float = float(os.getenv("OUTBOX_POLL_INTERVAL", "1.0")),
+        max_attempts: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10")),
+        max_backoff: float = float(os.getenv("OUTBOX_MAX_BACKOFF", "30")),
+    ):
+        self.session_factory = session_factory
+        self.model = model
+        self.publisher = publisher
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+
+        self.batch_size = min_batch_size
+        # Seconds to wait before the next batch after transient failures
+        self.backoff = 0.0
+        # Whether the last batch hit failures that will be retried as they are
+        self._failed_transiently = False
+
+        # Seconds the oldest row published in the last batch had waited (or,
+        # if none got out, the oldest row still being retried, also while
+        # the broker is unreachable)
+        self.lag = 0.0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def notify(self, pending: int = 0):
+        """
+        Wake the relay after committing new outbox rows.
+
+        Args:
+            pending: Rows just committed together; the next batch is sized
+                to publish them in one pipelined burst (up to the maximum)
+        """
+        if pending > self.batch_size:
+            self.batch_size = min(self.max_batch_size, pending)
+        self._wakeup.set()
+
+    def start(self):
+        """Start relaying in the background."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"✓ Outbox relay started for {self.model.__tablename__}")
+
+    async def stop(self):
+        """Stop the background task and publish whatever is left."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        try:
+            while (
+                await self.drain_once() >= self.batch_size
+                and not self._failed_transiently
+            ):
+                pass
+        except Exception as e:
+            logger.error(f"Outbox drain on shutdown failed: {e}")
+
+    async def drain_once(self) -> int:
+        """
+        Publish one batch of pending outbox rows.
+
+        Returns:
+            Number of rows claimed
+        """
+        model = self.model
+        self._failed_transiently = False
+
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(model)
+                .where(model.parked_at.is_(None))
+                .order_by(model.created_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            rows = list(result.scalars().all())
+            if not rows:
+                self.lag = 0.0
+                return 0
+
+            # Set before publishing, so it keeps growing while publishing
+            # fails outright
+            claimed_at = datetime.now(timezone.utc)
+            self.lag = self._age(rows[0], claimed_at)
+
+            # Pipeline the whole batch over one channel, keeping order
+            decoded = []
+            for row in rows:
+                try:
+                    decoded.append((row, row.to_event()))
+                except Exception as e:
+                    self._record_failure(row, e, permanent=True)
+
+            outcomes = await self.publisher.publish_many(
+                [event for _, event in decoded],
+                routing_keys=[row.routing_key for row, _ in decoded],
+                # Continue the trace of the request that wrote each row
+                trace_contexts=[row.trace_context for row, _ in decoded],
+            )
+
+            published = []
+            for (row, _), error in zip(decoded, outcomes):
+                if error is not None:
+                    self._record_failure(
+                        row, error, permanent=isinstance(error, PublishNackedError)
+                    )
+                else:
+                    published.append(row.id)
+
+            # A row that keeps failing doesn't count once others get through
+            # (and not at all once parked), so it can't hold the lag up
+            published_ids = set(published)
+            lagging = [row for row in rows if row.id in published_ids] or [
+                row for row in rows if row.parked_at is None
+            ]
+            self.lag = self._age(lagging[0], claimed_at) if lagging else 0.0
+
+            if published:
+                await session.execute(
+                    delete(model)
+                    .where(model.id.in_(published))
+                    .execution_options(synchronize_session=False)
+                )
+            await session.commit()
+
+        if len(published) < len(rows):
+            logger.warning(
+                f"Outbox: {len(rows) - len(published)} of {len(rows)} events failed"
+            )
+
+        return len(rows)
+
+    @staticmethod
+    def _age(row: OutboxMixin, now: datetime) -> float:
+        """Seconds since a row was written."""
+        created_at = row.created_at
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        return (now - created_at).total_seconds()
+
+    def _record_failure(
+        self, row: OutboxMixin, error: BaseException, permanent: bool
+    ):
+        """
+        Keep a failed row for the next batch, or park it after max_attempts.
+
+        Args:
+            row: Row that failed
+            error: Why it failed
+            permanent: The row itself is at fault (undecodable or nacked);
+                other failures don't count towards parking it
+        """
+        row.last_error = str(error)[:1000] or type(error).__name__
+        if not permanent:
+            self._failed_transiently = True
+            return
+
+        row.attempts += 1
+
+        if row.attempts >= self.max_attempts:
+            row.parked_at = datetime.now(timezone.utc)
+            OUTBOX_EVENTS_PARKED.labels(table=self.model.__tablename__).inc()
+            logger.error(
+                f"Outbox: parked {row.event_type} {row.id} after "
+                f"{row.attempts} attempts: {row.last_error}"
+            )
+
+    async def requeue_parked(self, event_ids: Optional[Sequence[str]] = None) -> int:
+        """
+        Give parked rows back to the relay, with their attempts reset.
+
+        Args:
+            event_ids: Only these rows (all parked rows by default)
+
+        Returns:
+            Number of rows requeued
+        """
+        requeued = await requeue_parked(self.session_factory, self.model, event_ids)
+        if requeued:
+            self.notify(pending=requeued)
+        return requeued
+
+    def _adapt_batch_size(self, claimed: int):
+        """Grow the batch while the backlog fills it, shrink when it doesn't."""
+        if claimed >= self.batch_size:
+            self.batch_size = min(self.max_batch_size, self.batch_size * 2)
+        elif claimed < self.batch_size // 2:
+            self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+
+    async def _run(self):
+        """Relay loop."""
+        while True:
+            self._wakeup.clear()
+
+            try:
+                claimed = await self.drain_once()
+                failed = self._failed_transiently
+            except Exception as e:
+                logger.error(f"Outbox relay error: {e}", exc_info=True)
+                claimed, failed = 0, True
+
+            if failed:
+                # Don't hammer a broker (or database) that is having trouble,
+                # however many new rows wake the relay meanwhile
+                self.backoff = min(
+                    self.max_backoff, max(self.poll_interval, self.backoff * 2)
+                )
+                logger.warning(f"Outbox: retrying in {self.backoff:g}s")
+                await asyncio.sleep(self.backoff)
+                continue
+            self.backoff = 0.0
+
+            full = claimed >= self.batch_size
+            self._adapt_batch_size(claimed)
+
+            # More rows are likely waiting; go straight to the next batch
+            if full:
+                continue
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def requeue_parked(
+    session_factory: async_sessionmaker,
+    model,
+    event_ids: Optional[Sequence[str]] = None,
+) -> int:
+    """
+    Clear ``parked_at`` and ``attempts`` of parked outbox rows.
+
+    Args:
+        session_factory: Async session factory of the outbox's database
+        model: Outbox model, or any table with the OutboxMixin columns
+        event_ids: Only these rows (all parked rows by default)
+
+    Returns:
+        Number of rows requeued
+    """
+    table = getattr(model, "__table__", model)
+    query = (
+        update(table)
+        .where(table.c.parked_at.is_not(None))
+        .values(parked_at=None, attempts=0)
+    )
+    if event_ids is not None:
+        query = query.where(table.c.id.in_(event_ids))
+
+    async with session_factory() as session:
+        result = await session.execute(query)
+        await session.commit()
+
+    if result.rowcount:
+        logger.info(f"Outbox: requeued {result.rowcount} parked events")
+    return result.rowcount
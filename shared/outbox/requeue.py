@@ -0,0 +1,59 @@
+"""
+Requeue parked outbox events.
+
+Clears ``parked_at`` (and resets ``attempts``) of rows the relay gave up
+on, typically once the cause has been fixed; the running relays pick them
+up on their next poll.
+
+Usage:
+    python -m shared.outbox.requeue --database-url URL [--table outbox_events]
+        [EVENT_ID ...]
+"""
+
+import argparse
+import asyncio
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from .relay import requeue_parked
+
+
+def outbox_table(name: str) -> Table:
+    """The columns of an outbox table that requeueing touches."""
+    return Table(
+        name,
+        MetaData(),
+        Column("id", String, primary_key=True),
+        Column("attempts", Integer),
+        Column("parked_at", DateTime(timezone=True)),
+    )
+
+
+async def requeue(database_url: str, table: str, event_ids: list[str]) -> int:
+    engine = create_async_engine(database_url)
+    try:
+        return await requeue_parked(
+            async_sessionmaker(engine), outbox_table(table), event_ids or None
+        )
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--database-url", required=True, help="SQLAlchemy async URL of the database"
+    )
+    parser.add_argument("--table", default="outbox_events", help="Outbox table")
+    parser.add_argument(
+        "event_ids", nargs="*", help="Events to requeue (default: all parked)"
+    )
+    args = parser.parse_args()
+
+    requeued = asyncio.run(requeue(args.database_url, args.table, args.event_ids))
+    print(f"Requeued {requeued} parked events")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,11 @@ RabbitMQ client wrapper for event-driven communication.
 Provides pub/sub functionality with automatic reconnection and error handling.
 """
 
-import json
 import logging
+import os
+import time
+from contextlib import nullcontext
+from functools import partial
 from typing import Optional, Callable, Dict
 
 import aio_pika
@@ -15,8 +18,26 @@ from aio_pika.abc import (
     AbstractChannel,
     AbstractExchange,
 )
-
-from shared.events import BaseEvent, EventType, deserialize_event
+from pamqp.commands import Basic
+
+from shared.events import BaseEvent, EventType, get_event_model
+from shared.messaging.codecs import codec_for
+from shared.messaging.compression import decompress
+from shared.messaging.memory import connect_memory, is_memory_url
+from shared.messaging.metrics import (
+    DECODE_SECONDS,
+    HANDLER_SECONDS,
+    MESSAGES_ACKED,
+    MESSAGES_NACKED,
+    MESSAGES_PUBLISHED,
+    MESSAGES_REDELIVERED,
+    PUBLISH_SECONDS,
+)
+from shared.messaging.monitor import QueueMonitor
+from shared.messaging.pool import ChannelPool
+from shared.messaging.prefetch import ADAPTIVE_PREFETCH, PrefetchController
+from shared.messaging.retry import RetryPolicy, retry_policy_for
+from shared.tracing import consume_span, publish_span
 
 
 logger = logging.getLogger(__name__)
@@ -29,7 +50,7 @@ class RabbitMQClient:
     Features:
     - Automatic reconnection
     - Topic-based routing
-    - Dead letter queue support
+    - Delayed retries with a dead letter queue after the last attempt
     - Message persistence
     - Event handler registration
     """
@@ -50,23 +71,46 @@ class RabbitMQClient:
         # Event handlers: {EventType: [handler_functions]}
         self.handlers: Dict[EventType, list[Callable]] = {}
 
+        # Prefetch shared by all subscriptions on the channel
+        self.prefetch: Optional[PrefetchController] = None
+        if ADAPTIVE_PREFETCH:
+            self.prefetch = PrefetchController("rabbitmq_client", initial=10)
+
+        # Depth of subscribed queues, sampled on this client's connection
+        self.monitor = QueueMonitor(
+            pool=ChannelPool(
+                max_size=1, connection_factory=self._get_connection, name="rabbitmq_client"
+            )
+        )
+
+    async def _get_connection(self) -> AbstractRobustConnection:
+        return self.connection
+
     async def connect(self):
         """Establish connection to RabbitMQ."""
         try:
-            # Create robust (auto-reconnecting) connection
-            self.connection = await aio_pika.connect_robust(
-                host=self.host,
-                port=self.port,
-                login=self.user,
-                password=self.password,
-                virtualhost=self.vhost,
-            )
+            if is_memory_url(os.getenv("RABBITMQ_URL")):
+                # In-process broker for tests and benchmarks
+                self.connection = await connect_memory()
+            else:
+                # Create robust (auto-reconnecting) connection
+                self.connection = await aio_pika.connect_robust(
+                    host=self.host,
+                    port=self.port,
+                    login=self.user,
+                    password=self.password,
+                    virtualhost=self.vhost,
+                )
 
             self.channel = await self.connection.channel()
 
-            # Set QoS to process messages one at a time
-            # Increase prefetch_count for higher throughput
-            await self.channel.set_qos(prefetch_count=10)
+            # Limit unacknowledged deliveries; adaptive prefetch starts at 10
+            # and follows handler latency from there
+            if self.prefetch:
+                await self.prefetch.apply(self.channel)
+                self.prefetch.start(self.channel)
+            else:
+                await self.channel.set_qos(prefetch_count=10)
 
             # Declare topic exchange for events
             self.exchange = await self.channel.declare_exchange(
@@ -83,6 +127,11 @@ class RabbitMQClient:
 
     async def disconnect(self):
         """Close RabbitMQ connection."""
+        if self.prefetch:
+            await self.prefetch.stop()
+        await self.monitor.stop()
+        await self.monitor.pool.close()
+
         if self.connection:
             await self.connection.close()
             logger.info("✓ Disconnected from RabbitMQ")
@@ -118,7 +167,25 @@ class RabbitMQClient:
         )
 
         # Publish to exchange
-        await self.exchange.publish(message, routing_key=routing_key)
+        event_type = event.event_type.value
+        started = time.perf_counter()
+        try:
+            with publish_span(message, self.exchange.name, routing_key):
+                confirmation = await self.exchange.publish(
+                    message, routing_key=routing_key
+                )
+        except Exception:
+            MESSAGES_PUBLISHED.labels(event_type=event_type, result="failed").inc()
+            raise
+        PUBLISH_SECONDS.labels(event_type=event_type).observe(
+            time.perf_counter() - started
+        )
+
+        if isinstance(confirmation, (Basic.Nack, Basic.Reject)):
+            MESSAGES_PUBLISHED.labels(event_type=event_type, result="nacked").inc()
+            logger.warning(f"Broker rejected {event_type} {event.event_id}")
+        else:
+            MESSAGES_PUBLISHED.labels(event_type=event_type, result="confirmed").inc()
 
         logger.info(
             f"📤 Published: {event.event_type.value} "
@@ -131,6 +198,9 @@ class RabbitMQClient:
         """
         Subscribe to events with specific routing keys.
 
+        Failed messages go through the retry tiers of the queue (see
+        RetryPolicy) before they end up in ``<queue_name>.dlq``.
+
         Args:
             queue_name: Queue name
             routing_keys: List of routing keys to bind (e.g., ["order.*", "inventory.reserved"])
@@ -167,8 +237,16 @@ class RabbitMQClient:
             await queue.bind(self.exchange, routing_key=routing_key)
             logger.info(f"✓ Bound {queue_name} to {routing_key}")
 
+        # Delayed retry queues, ending in the DLQ
+        retry = retry_policy_for(queue_name)
+        if retry:
+            await retry.declare(self.channel)
+
         # Start consuming messages
-        await queue.consume(self._handle_message)
+        await queue.consume(
+            partial(self._handle_message, queue_name=queue_name, retry=retry)
+        )
+        self.monitor.watch(queue_name, f"{queue_name}.dlq")
 
         logger.info(f"✓ Subscribed to queue: {queue_name}")
 
@@ -186,14 +264,49 @@ class RabbitMQClient:
         self.handlers[event_type].append(handler)
         logger.info(f"✓ Registered handler for: {event_type.value}")
 
-    async def _handle_message(self, message: aio_pika.IncomingMessage):
+    async def _handle_message(
+        self,
+        message: aio_pika.IncomingMessage,
+        queue_name: str = "",
+        retry: Optional[RetryPolicy] = None,
+    ):
         """
         Internal message handler.
 
         Args:
             message: Incoming RabbitMQ message
+            queue_name: Queue the message came from
+            retry: Retry tiers of the queue the message came from
         """
-        async with message.process(requeue=False):
+        if self.prefetch:
+            self.prefetch.delivered()
+        if message.redelivered:
+            MESSAGES_REDELIVERED.labels(queue=queue_name).inc()
+
+        requeue = retry is not None
+        try:
+            await self._process_message(message, queue_name, retry)
+            MESSAGES_ACKED.labels(queue=queue_name).inc()
+        except Exception:
+            MESSAGES_NACKED.labels(queue=queue_name, requeued=str(requeue).lower()).inc()
+            raise
+        finally:
+            if self.prefetch:
+                self.prefetch.settled()
+
+    def _track(self):
+        """Time a handler call for the prefetch controller."""
+        return self.prefetch.track() if self.prefetch else nullcontext()
+
+    async def _process_message(
+        self,
+        message: aio_pika.IncomingMessage,
+        queue_name: str,
+        retry: Optional[RetryPolicy],
+    ):
+        """Decode a message and run its handlers, retrying it on failure."""
+        # Requeue if a retry can't be scheduled; reject to the DLX without retries
+        async with message.process(requeue=retry is not None):
             try:
                 # Extract event type from headers
                 event_type_str = message.headers.get("event_type")
@@ -201,9 +314,11 @@ class RabbitMQClient:
                     logger.error("Missing event_type header, rejecting message")
                     return
 
-                # Parse event
-                event_data = json.loads(message.body.decode())
-                event = deserialize_event(event_type_str, event_data)
+                # Decode the body once, straight into the event model
+                with DECODE_SECONDS.labels(event_type=event_type_str).time():
+                    codec = codec_for(message.content_type)
+                    body = decompress(message.body, message.content_encoding)
+                    event = codec.decode(body, get_event_model(event_type_str))
 
                 logger.info(
                     f"📥 Received: {event.event_type.value} "
@@ -221,19 +336,26 @@ class RabbitMQClient:
                 # Call all registered handlers
                 for handler in handlers:
                     try:
-                        await handler(event)
+                        with HANDLER_SECONDS.labels(
+                            queue=queue_name, event_type=event_type_str
+                        ).time(), self._track(), consume_span(message, queue_name):
+                            await handler(event)
                     except Exception as handler_error:
                         logger.error(
                             f"Handler error for {event_type.value}: {handler_error}",
                             exc_info=True,
                         )
-                        raise  # Re-raise to send to DLQ
+                        raise  # Re-raise to retry
 
                 logger.info(f"✓ Processed: {event.event_type.value}")
 
             except Exception as e:
                 logger.error(f"Error processing message: {e}", exc_info=True)
-                raise  # Message will be sent to DLQ if configured
+                if retry is None:
+                    raise  # Message will be sent to DLQ if configured
+
+                # Acked once the copy is waiting in its retry queue
+                await retry.schedule(self.channel, message, e)
 
 
 # Global client instance
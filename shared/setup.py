@@ -7,6 +7,8 @@ setup(
     install_requires=[
         "pydantic>=2.5.0",
         "aio-pika>=9.3.1",
+        "sqlalchemy[asyncio]>=2.0.23",
+        "prometheus-client>=0.19.0",
         "opentelemetry-api>=1.21.0",
         "opentelemetry-sdk>=1.21.0",
         "opentelemetry-exporter-otlp-proto-http>=1.21.0",
@@ -14,5 +16,9 @@ setup(
         "opentelemetry-instrumentation-sqlalchemy>=0.42b0",
         "opentelemetry-instrumentation-aio-pika>=0.42b0",
     ],
+    extras_require={
+        "codecs": ["orjson>=3.9.10", "msgpack>=1.0.7"],
+        "compression": ["zstandard>=0.22.0"],
+    },
     python_requires=">=3.11",
 )
@@ -0,0 +1,438 @@
+"""
+Fast service startup.
+
+A cold pod used to spend most of its startup in round trips:
+``create_all`` checks every table, and each consumer declares its
+exchange, queue, bindings and retry queues one at a time before the first
+message can flow. Startup now:
+
+- remembers fingerprints of the schema and of each consumer's topology in
+  the service database (``startup_fingerprints``), so an unchanged schema
+  costs one query and an unchanged topology costs none
+- declares what does need declaring concurrently
+- opens database connections and channels before traffic arrives
+- supervises the consumers and reports readiness (``/ready``) only once
+  they are attached
+
+Set ``STARTUP_FINGERPRINT_CACHE=false`` to always run ``create_all`` and
+declare the full topology.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    MetaData,
+    String,
+    Table,
+    delete,
+    insert,
+    inspect,
+    select,
+    text,
+)
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from shared.messaging.consumer import EventConsumer
+from shared.messaging.pool import ChannelPool, get_channel_pool
+
+logger = logging.getLogger(__name__)
+
+# Whether schema and topology fingerprints are used to skip redundant work
+FINGERPRINT_CACHE = os.getenv("STARTUP_FINGERPRINT_CACHE", "true").lower() == "true"
+
+# Channels opened (and given the events exchange) before traffic arrives
+DEFAULT_WARM_CHANNELS = int(os.getenv("RABBITMQ_WARM_CHANNELS", "4"))
+
+SCHEMA_FINGERPRINT = "schema"
+
+_metadata = MetaData()
+
+startup_fingerprints = Table(
+    "startup_fingerprints",
+    _metadata,
+    Column("name", String, primary_key=True),
+    Column("fingerprint", String(64), nullable=False),
+    Column("updated_at", DateTime(timezone=True), nullable=False),
+)
+
+
+def fingerprint(*parts: str) -> str:
+    """SHA-256 of the given parts, in order."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def schema_fingerprint(metadata: MetaData, dialect) -> str:
+    """Fingerprint of the DDL a metadata would create on a dialect."""
+    ddl = []
+    for table in metadata.sorted_tables:
+        ddl.append(str(CreateTable(table).compile(dialect=dialect)))
+        for index in sorted(table.indexes, key=lambda index: index.name or ""):
+            ddl.append(str(CreateIndex(index).compile(dialect=dialect)))
+    return fingerprint(*ddl)
+
+
+class FingerprintStore:
+    """
+    Fingerprints of schema and topology already applied, per name.
+
+    Loaded once at startup with a single query; a fingerprint is saved
+    after what it describes has been created successfully.
+    """
+
+    def __init__(self, engine: AsyncEngine, enabled: bool = FINGERPRINT_CACHE):
+        """
+        Args:
+            engine: Engine of the service database the fingerprints live in
+            enabled: When False nothing matches and nothing is saved
+        """
+        self.engine = engine
+        self.enabled = enabled
+
+        self._fingerprints: Dict[str, str] = {}
+        self._table_ready = False
+
+    async def load(self) -> Dict[str, str]:
+        """Read all saved fingerprints."""
+        if not self.enabled:
+            return {}
+
+        try:
+            async with self.engine.connect() as conn:
+                result = await conn.execute(
+                    select(startup_fingerprints.c.name, startup_fingerprints.c.fingerprint)
+                )
+                self._fingerprints = dict(result.all())
+            self._table_ready = True
+        except SQLAlchemyError:
+            # First start against this database: nothing cached yet
+            self._fingerprints = {}
+
+        return dict(self._fingerprints)
+
+    def matches(self, name: str, value: str) -> bool:
+        """Whether ``value`` is the fingerprint saved under ``name``."""
+        return self.enabled and self._fingerprints.get(name) == value
+
+    async def save(self, name: str, value: str):
+        """Record a fingerprint; failing to do so only costs a slower next start."""
+        if not self.enabled or self.matches(name, value):
+            return
+
+        try:
+            async with self.engine.begin() as conn:
+                if not self._table_ready:
+                    await conn.run_sync(_metadata.create_all)
+                    self._table_ready = True
+
+                await conn.execute(
+                    delete(startup_fingerprints).where(startup_fingerprints.c.name == name)
+                )
+                await conn.execute(
+                    insert(startup_fingerprints).values(
+                        name=name,
+                        fingerprint=value,
+                        updated_at=datetime.now(timezone.utc),
+                    )
+                )
+        except IntegrityError:
+            # Saved concurrently by another instance
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to save startup fingerprint {name}: {e}")
+            return
+
+        self._fingerprints[name] = value
+
+
+def _create_missing_columns(conn, metadata: MetaData) -> int:
+    """
+    Add nullable columns added to tables that already existed (create_all skips them).
+
+    Columns that can't be added to existing rows (NOT NULL) are only logged.
+    """
+    inspector = inspect(conn)
+    ddl = conn.dialect.ddl_compiler(conn.dialect, None)
+    preparer = conn.dialect.identifier_preparer
+    added = 0
+    for table in metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable:
+                logger.warning(f"Can't add NOT NULL column {table.name}.{column.name}")
+                continue
+            conn.execute(
+                text(
+                    f"ALTER TABLE {preparer.format_table(table)} "
+                    f"ADD COLUMN {ddl.get_column_specification(column)}"
+                )
+            )
+            added += 1
+    return added
+
+
+def _create_missing_indexes(conn, metadata: MetaData) -> int:
+    """Create indexes added to tables that already existed (create_all skips them)."""
+    inspector = inspect(conn)
+    created = 0
+    for table in metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(conn)
+                created += 1
+    return created
+
+
+async def ensure_schema(
+    engine: AsyncEngine,
+    metadata: MetaData,
+    fingerprints: Optional[FingerprintStore] = None,
+) -> bool:
+    """
+    Create missing tables, columns and indexes, unless this exact schema was
+    created before.
+
+    Args:
+        engine: Engine of the service database
+        metadata: Metadata of the service's models
+        fingerprints: Store of applied fingerprints (None always creates)
+
+    Returns:
+        True if ``create_all`` ran
+    """
+    current = schema_fingerprint(metadata, engine.dialect)
+    if fingerprints is not None and fingerprints.matches(SCHEMA_FINGERPRINT, current):
+        return False
+
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.create_all)
+        await conn.run_sync(_metadata.create_all)
+        added = await conn.run_sync(_create_missing_columns, metadata)
+        created = await conn.run_sync(_create_missing_indexes, metadata)
+
+    if added:
+        logger.info(f"✓ Added {added} missing columns")
+    if created:
+        logger.info(f"✓ Created {created} missing indexes")
+
+    if fingerprints is not None:
+        fingerprints._table_ready = True
+        await fingerprints.save(SCHEMA_FINGERPRINT, current)
+    return True
+
+
+async def warm_db_pool(engine: AsyncEngine, connections: Optional[int] = None) -> int:
+    """
+    Open database connections ahead of the first requests.
+
+    The connections are held until all are open, so each one is new, and
+    then returned to the pool.
+
+    Args:
+        engine: Engine whose pool to fill
+        connections: Connections to open (defaults to the pool size)
+
+    Returns:
+        Number of connections opened
+    """
+    if connections is None:
+        size = getattr(engine.pool, "size", None)
+        connections = size() if callable(size) else 1
+
+    async with AsyncExitStack() as stack:
+        await asyncio.gather(
+            *(stack.enter_async_context(engine.connect()) for _ in range(connections))
+        )
+    return connections
+
+
+async def warm_channels(
+    pool: Optional[ChannelPool] = None,
+    channels: int = DEFAULT_WARM_CHANNELS,
+    exchange_name: str = "microservice.events",
+) -> int:
+    """
+    Open pooled channels, with the events exchange declared, ahead of use.
+
+    Args:
+        pool: Channel pool to fill (defaults to the process-wide pool)
+        channels: Channels to open, at most the pool size
+        exchange_name: Exchange to declare on each channel
+
+    Returns:
+        Number of channels opened
+    """
+    pool = pool or get_channel_pool()
+    channels = min(channels, pool.max_size)
+
+    async def warm():
+        pooled = await pool.checkout()
+        try:
+            await pooled.get_exchange(exchange_name)
+        except BaseException:
+            await pool.checkin(pooled, discard=True)
+            raise
+        return pooled
+
+    warmed = await asyncio.gather(
+        *(warm() for _ in range(channels)), return_exceptions=True
+    )
+    opened = [pooled for pooled in warmed if not isinstance(pooled, BaseException)]
+    for pooled in opened:
+        await pool.checkin(pooled)
+
+    if len(opened) < channels:
+        logger.warning(f"Warmed {len(opened)} of {channels} channels")
+    return len(opened)
+
+
+async def attach_consumers(
+    attachments: Sequence[Tuple[EventConsumer, Awaitable]],
+) -> list[EventConsumer]:
+    """
+    Start consumers concurrently.
+
+    If any of them fails, all of them are closed again, so starting over
+    doesn't attach a consumer twice.
+
+    Args:
+        attachments: Each consumer with its ``consume``/``consume_batch`` call
+
+    Returns:
+        The attached consumers
+    """
+    consumers = [consumer for consumer, _ in attachments]
+    results = await asyncio.gather(
+        *(attach for _, attach in attachments), return_exceptions=True
+    )
+
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        await asyncio.gather(
+            *(consumer.close() for consumer in consumers), return_exceptions=True
+        )
+        raise errors[0]
+
+    return consumers
+
+
+class Readiness:
+    """Tracks the startup components a service needs before taking traffic."""
+
+    def __init__(self, *components: str):
+        """
+        Args:
+            components: Names of the components that must all be ready
+        """
+        self._status: Dict[str, str] = {name: "starting" for name in components}
+
+    @property
+    def is_ready(self) -> bool:
+        return all(status == "ready" for status in self._status.values())
+
+    def mark_ready(self, component: str):
+        self._status[component] = "ready"
+
+    def mark_not_ready(self, component: str, reason: str = "starting"):
+        self._status[component] = reason
+
+    def status(self) -> dict:
+        """Body of the ``/ready`` endpoint."""
+        return {
+            "status": "ready" if self.is_ready else "starting",
+            "components": dict(self._status),
+        }
+
+
+class ConsumerSupervisor:
+    """
+    Starts a service's consumers in the background and keeps trying.
+
+    Replaces a bare ``asyncio.create_task(start_consumers())``, whose
+    failure went unnoticed: a start that fails (broker unreachable, a
+    declare refused) is logged, reported through readiness, and retried
+    with exponential backoff until the consumers are attached.
+    """
+
+    def __init__(
+        self,
+        start: Callable[[], Awaitable[Sequence[EventConsumer]]],
+        readiness: Readiness,
+        component: str = "consumers",
+        retry_delay: float = 1.0,
+        max_retry_delay: float = 30.0,
+    ):
+        """
+        Args:
+            start: Attaches the consumers and returns them (see attach_consumers)
+            readiness: Readiness tracker to report to
+            component: Readiness component name
+            retry_delay: First delay in seconds before starting over
+            max_retry_delay: Longest delay between attempts
+        """
+        self.start_consumers = start
+        self.readiness = readiness
+        self.component = component
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        self.consumers: Sequence[EventConsumer] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start attaching the consumers in the background."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        delay = self.retry_delay
+        attempt = 1
+
+        while True:
+            try:
+                self.consumers = await self.start_consumers()
+            except Exception as e:
+                logger.error(
+                    f"Failed to start {self.component} (attempt {attempt}), "
+                    f"retrying in {delay:g}s: {e}"
+                )
+                self.readiness.mark_not_ready(self.component, f"failed: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+                attempt += 1
+                continue
+
+            self.readiness.mark_ready(self.component)
+            return
+
+    async def stop(self):
+        """Stop retrying and close the attached consumers."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        self.readiness.mark_not_ready(self.component, "stopped")
+        consumers, self.consumers = self.consumers, []
+        await asyncio.gather(
+            *(consumer.close() for consumer in consumers), return_exceptions=True
+        )
@@ -0,0 +1,31 @@
+"""Distributed tracing with OpenTelemetry (optional dependency)."""
+
+from .propagation import (
+    consume_span,
+    current_carrier,
+    extract,
+    inject,
+    publish_span,
+    use_carrier,
+)
+from .provider import (
+    init_tracing,
+    instrument_app,
+    instrument_engine,
+    setup_tracing,
+    shutdown_tracing,
+)
+
+__all__ = [
+    "consume_span",
+    "current_carrier",
+    "extract",
+    "inject",
+    "publish_span",
+    "use_carrier",
+    "init_tracing",
+    "instrument_app",
+    "instrument_engine",
+    "setup_tracing",
+    "shutdown_tracing",
+]
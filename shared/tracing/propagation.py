@@ -0,0 +1,160 @@
+"""
+W3C trace context propagation across AMQP hops.
+
+Publishers put ``traceparent``/``tracestate`` into message headers and
+consumers continue the trace from them, so an order's HTTP request, its
+database calls, every publish and every downstream handler form a single
+trace. Events published through the outbox carry the context captured when
+the outbox row was written, since the relay publishes them later from its
+own task.
+
+Without OpenTelemetry installed, every helper here is a no-op.
+"""
+
+import json
+from contextlib import contextmanager, nullcontext
+from typing import Any, Iterator, Mapping, MutableMapping, Optional
+
+try:
+    from opentelemetry import context as otel_context
+    from opentelemetry import propagate, trace
+    from opentelemetry.propagators.textmap import Getter
+    from opentelemetry.trace import SpanKind
+except ImportError:  # optional dependency
+    trace = None
+
+TRACER_NAME = "shared.messaging"
+
+MESSAGING_SYSTEM = "rabbitmq"
+
+
+def _tracer():
+    return trace.get_tracer(TRACER_NAME)
+
+
+def _event_type(headers: Optional[Mapping[str, Any]], routing_key: Optional[str]) -> str:
+    event_type = (headers or {}).get("event_type")
+    if isinstance(event_type, bytes):
+        event_type = event_type.decode()
+    return event_type or routing_key or "unknown"
+
+
+if trace is not None:
+
+    class _HeaderGetter(Getter):
+        """Reads AMQP header values, which may arrive as bytes."""
+
+        def get(self, carrier: Mapping[str, Any], key: str) -> Optional[list[str]]:
+            value = carrier.get(key)
+            if value is None:
+                return None
+            if isinstance(value, bytes):
+                value = value.decode()
+            return [str(value)]
+
+        def keys(self, carrier: Mapping[str, Any]) -> list[str]:
+            return list(carrier)
+
+    _getter = _HeaderGetter()
+
+
+def inject(headers: MutableMapping[str, Any]) -> MutableMapping[str, Any]:
+    """Add the current trace context to a headers dict."""
+    if trace is not None:
+        propagate.inject(headers)
+    return headers
+
+
+def extract(headers: Optional[Mapping[str, Any]]):
+    """Trace context carried by message headers (None without OpenTelemetry)."""
+    if trace is None:
+        return None
+    return propagate.extract(headers or {}, getter=_getter)
+
+
+def current_carrier() -> Optional[str]:
+    """
+    The current trace context, serialized for storage.
+
+    Returns:
+        JSON of the W3C headers, or None when no trace is active
+    """
+    if trace is None:
+        return None
+    carrier = inject({})
+    return json.dumps(carrier) if carrier else None
+
+
+@contextmanager
+def use_carrier(carrier: Optional[str]) -> Iterator[None]:
+    """Make a stored trace context (see current_carrier) current in the block."""
+    if trace is None or not carrier:
+        yield
+        return
+
+    token = otel_context.attach(propagate.extract(json.loads(carrier)))
+    try:
+        yield
+    finally:
+        otel_context.detach(token)
+
+
+@contextmanager
+def publish_span(message, exchange: str, routing_key: str) -> Iterator[None]:
+    """
+    Span around publishing a message; injects its context into the headers.
+
+    Args:
+        message: aio_pika Message about to be published
+        exchange: Exchange name
+        routing_key: Routing key
+    """
+    if trace is None:
+        yield
+        return
+
+    event_type = _event_type(message.headers, routing_key)
+    with _tracer().start_as_current_span(
+        f"{event_type} publish",
+        kind=SpanKind.PRODUCER,
+        attributes={
+            "messaging.system": MESSAGING_SYSTEM,
+            "messaging.operation": "publish",
+            "messaging.destination.name": exchange,
+            "messaging.rabbitmq.destination.routing_key": routing_key,
+            "messaging.message.id": message.message_id or "",
+            "messaging.message.conversation_id": message.correlation_id or "",
+        },
+    ):
+        if message.headers is None:
+            message.headers = {}
+        inject(message.headers)
+        yield
+
+
+def consume_span(message, queue: str):
+    """
+    Span around handling a delivered message, continuing the publisher's trace.
+
+    Args:
+        message: Incoming message
+        queue: Queue the message was consumed from
+    """
+    if trace is None:
+        return nullcontext()
+
+    event_type = _event_type(message.headers, message.routing_key)
+    return _tracer().start_as_current_span(
+        f"{event_type} process",
+        context=extract(message.headers),
+        kind=SpanKind.CONSUMER,
+        attributes={
+            "messaging.system": MESSAGING_SYSTEM,
+            "messaging.operation": "process",
+            "messaging.source.name": queue,
+            "messaging.rabbitmq.destination.routing_key": message.routing_key or "",
+            "messaging.message.id": message.message_id or "",
+            "messaging.message.conversation_id": message.correlation_id or "",
+            "messaging.message.redelivered": bool(message.redelivered),
+        },
+    )
@@ -0,0 +1,160 @@
+"""
+OpenTelemetry setup: OTLP export with sampling, FastAPI and SQLAlchemy spans.
+
+Sampling is decided once per trace, at its root (the HTTP request): with
+``ParentBased(TraceIdRatioBased(rate))`` downstream services follow the
+sampling flag carried in ``traceparent``, so a sampled order is traced
+end to end and an unsampled one costs next to nothing anywhere.
+"""
+
+import logging
+import os
+from typing import Optional
+
+try:
+    from opentelemetry import metrics, trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+except ImportError:  # optional dependency
+    trace = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENDPOINT = "http://jaeger:4318/v1/traces"
+
+# Endpoints not worth a span
+EXCLUDED_URLS = "health,ready,metrics"
+
+_provider: Optional["TracerProvider"] = None
+
+
+def init_tracing(
+    service_name: str,
+    endpoint: Optional[str] = None,
+    sample_rate: Optional[float] = None,
+    exporter: Optional["SpanExporter"] = None,
+    enabled: Optional[bool] = None,
+) -> Optional["TracerProvider"]:
+    """
+    Install the process-wide tracer provider.
+
+    Settings not passed are read from the environment when called
+    (``TRACING_ENABLED``, ``JAEGER_ENDPOINT``, ``TRACING_SAMPLE_RATE``).
+    Only the first call in a process installs a provider.
+
+    Args:
+        service_name: ``service.name`` of the exported spans
+        endpoint: OTLP/HTTP traces endpoint
+        sample_rate: Share of traces to record, from 0 to 1
+        exporter: Span exporter to use instead of OTLP
+        enabled: Whether to trace at all
+
+    Returns:
+        The installed provider, or None if tracing is off
+    """
+    global _provider
+
+    if _provider is not None:
+        return _provider
+
+    if enabled is None:
+        enabled = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+    if not enabled:
+        return None
+    if trace is None:
+        logger.warning("Tracing enabled but OpenTelemetry is not installed")
+        return None
+
+    endpoint = endpoint or os.getenv("JAEGER_ENDPOINT", DEFAULT_ENDPOINT)
+    if sample_rate is None:
+        sample_rate = float(os.getenv("TRACING_SAMPLE_RATE", "0.1"))
+
+    if exporter is None:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        exporter = OTLPSpanExporter(endpoint=endpoint)
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name}),
+        sampler=ParentBased(TraceIdRatioBased(sample_rate)),
+    )
+    # Spans are exported off the request path, in batches
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+    _provider = provider
+    logger.info(f"✓ Tracing {service_name} ({sample_rate:.0%} of traces)")
+    return provider
+
+
+def instrument_app(app) -> bool:
+    """Trace a FastAPI app's requests (health, ready and metrics excluded)."""
+    if trace is None:
+        return False
+    try:
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+    except ImportError:
+        logger.warning("opentelemetry-instrumentation-fastapi is not installed")
+        return False
+
+    FastAPIInstrumentor.instrument_app(app, excluded_urls=EXCLUDED_URLS)
+    return True
+
+
+def instrument_engine(engine) -> bool:
+    """Trace the statements of a (sync or async) SQLAlchemy engine."""
+    if trace is None:
+        return False
+    try:
+        from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
+        from opentelemetry.instrumentation.sqlalchemy.engine import EngineTracer
+    except ImportError:
+        logger.warning("opentelemetry-instrumentation-sqlalchemy is not installed")
+        return False
+
+    engine = getattr(engine, "sync_engine", engine)
+    instrumentor = SQLAlchemyInstrumentor()
+    if not instrumentor.is_instrumented_by_opentelemetry:
+        instrumentor.instrument(engine=engine)
+    else:
+        # The instrumentor is a singleton that only takes its first engine;
+        # later ones (several services in one process) get their own tracer
+        EngineTracer(
+            trace.get_tracer(EngineTracer.__module__),
+            engine,
+            metrics.get_meter(EngineTracer.__module__).create_up_down_counter(
+                "db.client.connections.usage", unit="connections"
+            ),
+        )
+    return True
+
+
+def setup_tracing(app, engine, service_name: str, **kwargs) -> bool:
+    """
+    Initialize tracing for a service and instrument its app and engine.
+
+    Keyword arguments are passed to init_tracing(). Must run before the
+    app starts serving.
+
+    Returns:
+        Whether tracing is active
+    """
+    if init_tracing(service_name, **kwargs) is None:
+        return False
+
+    instrument_app(app)
+    instrument_engine(engine)
+    return True
+
+
+def shutdown_tracing():
+    """Export buffered spans and stop the provider."""
+    global _provider
+
+    if _provider is not None:
+        _provider.shutdown()
+        _provider = None
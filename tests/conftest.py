@@ -0,0 +1,79 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# Shared library and benchmarks are imported from the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ.setdefault("RABBITMQ_URL", "memory://")
+os.environ.setdefault("TRACING_ENABLED", "false")
+# No background queue sampling or prefetch tuning in tests
+os.environ.setdefault("RABBITMQ_QUEUE_MONITOR_INTERVAL", "0")
+os.environ.setdefault("RABBITMQ_ADAPTIVE_PREFETCH", "false")
+
+from sqlalchemy import MetaData, event  # noqa: E402
+from sqlalchemy.ext.asyncio import (  # noqa: E402
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from shared.messaging import ChannelPool  # noqa: E402
+from shared.messaging.memory import (  # noqa: E402
+    connect_memory,
+    get_memory_broker,
+    reset_memory_broker,
+)
+
+
+@pytest.fixture
+def broker():
+    """A fresh in-memory broker."""
+    reset_memory_broker()
+    yield get_memory_broker()
+    reset_memory_broker()
+
+
+@pytest.fixture
+def channel_pool(broker):
+    """Channel pool on the in-memory broker."""
+    return ChannelPool(max_size=4, connection_factory=connect_memory, name="test")
+
+
+@pytest.fixture
+def sqlite_sessions(tmp_path):
+    """
+    Session factories over fresh SQLite files.
+
+    Call with the metadata of the tables to create; each call gets its own
+    database, disposed of after the test. Transactions are begun explicitly,
+    so savepoints roll back as they would on PostgreSQL (pysqlite otherwise
+    commits a savepoint opened before any write on its release).
+    """
+    engines = []
+
+    def create(metadata: MetaData) -> async_sessionmaker:
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path / f'test{len(engines)}.db'}"
+        )
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def disable_implicit_begin(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(engine.sync_engine, "begin")
+        def begin(connection):
+            connection.exec_driver_sql("BEGIN")
+
+        async def create_tables():
+            async with engine.begin() as conn:
+                await conn.run_sync(metadata.create_all)
+
+        asyncio.run(create_tables())
+        engines.append(engine)
+        return async_sessionmaker(engine, expire_on_commit=False)
+
+    yield create
+    for engine in engines:
+        asyncio.run(engine.dispose())
@@ -0,0 +1,54 @@
+import pytest
+
+from shared.events.order_events import OrderConfirmedEvent
+from shared.messaging.codecs import (
+    JSON_CONTENT_TYPE,
+    MSGPACK_CONTENT_TYPE,
+    JsonCodec,
+    codec_for,
+    get_codec,
+)
+
+EVENT = OrderConfirmedEvent(
+    order_id="order-1", user_id="user-1", correlation_id="saga-1"
+)
+
+
+@pytest.mark.parametrize("name", ["json", "orjson", "msgpack"])
+def test_events_round_trip_through_the_content_type_decoder(name):
+    pytest.importorskip(name)
+    codec = get_codec(name)
+
+    body = codec.encode(EVENT)
+    decoded = codec_for(codec.content_type).decode(body, OrderConfirmedEvent)
+
+    assert decoded == EVENT
+
+
+def test_orjson_is_wire_compatible_with_json():
+    pytest.importorskip("orjson")
+    body = get_codec("orjson").encode(EVENT)
+
+    assert get_codec("orjson").content_type == JSON_CONTENT_TYPE
+    assert JsonCodec().decode(body, OrderConfirmedEvent) == EVENT
+
+
+def test_messages_without_a_content_type_are_json():
+    assert codec_for(None).content_type == JSON_CONTENT_TYPE
+
+
+def test_msgpack_bodies_decode_into_dicts():
+    pytest.importorskip("msgpack")
+    body = get_codec("msgpack").encode(EVENT)
+
+    data = codec_for(MSGPACK_CONTENT_TYPE).loads(body)
+
+    assert data["event_type"] == "order.confirmed"
+    assert data["order_id"] == "order-1"
+
+
+def test_unknown_codec_and_content_type_are_rejected():
+    with pytest.raises(ValueError):
+        get_codec("xml")
+    with pytest.raises(ValueError):
+        codec_for("application/xml")
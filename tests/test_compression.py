@@ -0,0 +1,76 @@
+import asyncio
+import os
+
+import pytest
+
+from aio_pika import Message
+
+from shared.events.order_events import OrderCancelledEvent
+from shared.messaging import EventDispatcher, EventPublisher
+from shared.messaging.compression import GZIP, ZSTD, Compressor, decompress
+
+LARGE = b'{"items": "' + b"abc" * 2000 + b'"}'
+
+
+def test_small_bodies_are_sent_as_is():
+    assert Compressor(threshold=1024).compress(b"{}") == (b"{}", None)
+
+
+@pytest.mark.parametrize("algorithm", [GZIP, ZSTD])
+def test_large_bodies_are_compressed_and_restored(algorithm):
+    if algorithm == ZSTD:
+        pytest.importorskip("zstandard")
+    body, encoding = Compressor(threshold=1024, algorithm=algorithm).compress(LARGE)
+
+    assert encoding == algorithm
+    assert len(body) < len(LARGE)
+    assert decompress(body, encoding) == LARGE
+
+
+def test_incompressible_bodies_are_sent_as_is():
+    body = os.urandom(4096)
+
+    assert Compressor(threshold=1024, algorithm=GZIP).compress(body) == (body, None)
+
+
+def test_zero_threshold_disables_compression():
+    assert Compressor(threshold=0).compress(LARGE) == (LARGE, None)
+
+
+def test_unknown_encodings_are_rejected():
+    with pytest.raises(ValueError):
+        Compressor(algorithm="brotli")
+    with pytest.raises(ValueError):
+        decompress(b"", "brotli")
+
+
+def test_consumers_decode_compressed_events(broker, channel_pool):
+    event = OrderCancelledEvent(order_id="order-1", user_id="u", reason="x" * 4096)
+    received = []
+    dispatcher = EventDispatcher()
+
+    async def on_cancelled(event):
+        received.append(event)
+
+    dispatcher.register("order.cancelled", on_cancelled)
+
+    async def scenario():
+        async with channel_pool.acquire() as pooled:
+            exchange = await pooled.get_exchange("microservice.events")
+            queue = await pooled.channel.declare_queue("orders", durable=True)
+            await queue.bind(exchange, routing_key="#")
+
+        publisher = EventPublisher(
+            pool=channel_pool, compressor=Compressor(threshold=1024, algorithm=GZIP)
+        )
+        await publisher.publish_event(event)
+        await publisher.close()
+
+        (envelope,) = broker.queues["orders"].messages
+        message = Message(envelope.body, **envelope.properties)
+        assert message.content_encoding == GZIP
+        await dispatcher(message)
+
+    asyncio.run(scenario())
+
+    assert received == [event]
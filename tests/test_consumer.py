@@ -0,0 +1,188 @@
+import asyncio
+
+from aio_pika import Message
+
+from shared.messaging import DuplicateEvent, EventConsumer, PermanentError
+from shared.messaging.retry import LAST_ERROR_HEADER, RETRY_COUNT_HEADER
+
+QUEUE = "test-service.events"
+DELAYS = (0.01, 0.02)
+
+
+def consumer(channel_pool, **kwargs) -> EventConsumer:
+    return EventConsumer(QUEUE, pool=channel_pool, retry_delays=DELAYS, **kwargs)
+
+
+async def publish(consumer: EventConsumer, message_id: str, body: bytes = b"{}"):
+    async with consumer.pool.acquire() as pooled:
+        await pooled.channel.default_exchange.publish(
+            Message(body, message_id=message_id), routing_key=QUEUE
+        )
+
+
+async def settle(seconds: float = 0.2):
+    """Let deliveries, retries and TTL expiries run."""
+    await asyncio.sleep(seconds)
+
+
+def test_batch_failures_are_retried_per_message(broker, channel_pool):
+    batches = []
+
+    async def handler(messages):
+        batches.append([message.message_id for message in messages])
+        return [
+            ConnectionError("lock timeout")
+            if message.message_id == "bad" and len(batches) == 1
+            else None
+            for message in messages
+        ]
+
+    async def scenario():
+        events = consumer(channel_pool)
+        await events.consume_batch(handler, max_messages=10, max_wait_ms=20)
+        for message_id in ("good", "bad"):
+            await publish(events, message_id)
+        await settle()
+        await events.close()
+
+    asyncio.run(scenario())
+
+    assert batches == [["good", "bad"], ["bad"]]
+    assert not broker.queues[QUEUE].messages
+    assert not broker.queues[f"{QUEUE}.dlq"].messages
+
+
+def test_batch_is_flushed_once_full(broker, channel_pool):
+    batches = []
+
+    async def handler(messages):
+        batches.append(len(messages))
+        return [None] * len(messages)
+
+    async def scenario():
+        events = consumer(channel_pool)
+        await events.consume_batch(handler, max_messages=2, max_wait_ms=1000)
+        for index in range(4):
+            await publish(events, f"event-{index}")
+        await settle(0.1)
+        await events.close()
+
+    asyncio.run(scenario())
+
+    # Full batches go without waiting out max_wait_ms
+    assert batches == [2, 2]
+
+
+def test_repeated_event_is_acked_without_calling_the_handler(broker, channel_pool):
+    calls = []
+
+    async def handler(message):
+        calls.append(message.message_id)
+
+    async def scenario():
+        events = consumer(channel_pool)
+        await events.consume(handler)
+        await publish(events, "event-1")
+        await publish(events, "event-1")
+        await publish(events, "event-2")
+        await settle()
+        await events.close()
+
+    asyncio.run(scenario())
+
+    assert calls == ["event-1", "event-2"]
+    assert not broker.queues[QUEUE].messages
+
+
+def test_batch_duplicates_are_acked_without_a_retry(broker, channel_pool):
+    batches = []
+
+    async def handler(messages):
+        batches.append([message.message_id for message in messages])
+        # As a handler whose record_processed found the event recorded
+        return [
+            DuplicateEvent(message.message_id) if message.message_id == "dup" else None
+            for message in messages
+        ]
+
+    async def scenario():
+        events = consumer(channel_pool)
+        await events.consume_batch(handler, max_messages=10, max_wait_ms=20)
+        for message_id in ("dup", "new"):
+            await publish(events, message_id)
+        await settle()
+        await events.close()
+        return events
+
+    events = asyncio.run(scenario())
+
+    assert batches == [["dup", "new"]]
+    assert not broker.queues[QUEUE].messages
+    assert not broker.queues[f"{QUEUE}.dlq"].messages
+    assert len(events.idempotency) == 2
+
+
+def test_failed_message_moves_through_the_retry_tiers(broker, channel_pool):
+    calls = []
+
+    async def handler(message):
+        calls.append(message.headers.get(RETRY_COUNT_HEADER, 0))
+        if len(calls) <= len(DELAYS):
+            raise ConnectionError("database unavailable")
+
+    async def scenario():
+        events = consumer(channel_pool)
+        await events.consume(handler)
+        await publish(events, "event-1")
+        await settle()
+        await events.close()
+
+    asyncio.run(scenario())
+
+    assert calls == [0, 1, 2]
+    assert not broker.queues[QUEUE].messages
+    assert not broker.queues[f"{QUEUE}.dlq"].messages
+
+
+def test_message_is_dead_lettered_after_the_last_tier(broker, channel_pool):
+    calls = []
+
+    async def handler(message):
+        calls.append(message.message_id)
+        raise ConnectionError("database unavailable")
+
+    async def scenario():
+        events = consumer(channel_pool)
+        await events.consume(handler)
+        await publish(events, "event-1")
+        await settle()
+        await events.close()
+
+    asyncio.run(scenario())
+
+    assert len(calls) == len(DELAYS) + 1
+    (parked,) = broker.queues[f"{QUEUE}.dlq"].messages
+    headers = parked.properties["headers"]
+    assert headers[RETRY_COUNT_HEADER] == len(DELAYS)
+    assert headers[LAST_ERROR_HEADER] == "ConnectionError: database unavailable"
+
+
+def test_permanent_error_skips_the_retry_tiers(broker, channel_pool):
+    calls = []
+
+    async def handler(message):
+        calls.append(message.message_id)
+        raise PermanentError("unknown product")
+
+    async def scenario():
+        events = consumer(channel_pool)
+        await events.consume(handler)
+        await publish(events, "event-1")
+        await settle()
+        await events.close()
+
+    asyncio.run(scenario())
+
+    assert calls == ["event-1"]
+    (parked,) = broker.queues[f"{QUEUE}.dlq"].messages
+    assert parked.properties["headers"][RETRY_COUNT_HEADER] == 0
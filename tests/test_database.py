@@ -0,0 +1,122 @@
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from shared.database import InstrumentedQueuePool, PoolAutosizer
+
+
+@pytest.fixture
+def create_engine(tmp_path):
+    """Engines on a SQLite file with an instrumented queue pool."""
+    engines = []
+
+    def create(pool_size=2, max_overflow=0, pool_timeout=30, connect_delay=0.0):
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+            poolclass=InstrumentedQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+        )
+        if connect_delay:
+            connect = engine.sync_engine.pool._creator
+
+            def slow_connect(*args):
+                time.sleep(connect_delay)
+                return connect(*args)
+
+            engine.sync_engine.pool._creator = slow_connect
+        engines.append(engine)
+        return engine
+
+    yield create
+    for engine in engines:
+        asyncio.run(engine.dispose())
+
+
+def autosizer(engine, **kwargs) -> PoolAutosizer:
+    kwargs.setdefault("min_overflow", 0)
+    kwargs.setdefault("max_overflow", 4)
+    kwargs.setdefault("target_wait", 0.01)
+    return PoolAutosizer(engine, enabled=True, step=2, **kwargs)
+
+
+def test_grows_while_checkouts_queue(create_engine):
+    engine = create_engine()
+    resizer = autosizer(engine)
+
+    engine.pool.waits.extend([0.001] * 90 + [0.05] * 10)
+    assert resizer.resize() == 2
+    assert engine.pool.max_overflow == 2
+
+    engine.pool.waits.extend([0.05] * 100)
+    engine.pool.peak_checked_out = 4
+    assert resizer.resize() == 2
+    # Capped at the autosizer's maximum
+    engine.pool.waits.extend([0.05] * 100)
+    assert resizer.resize() == 0
+    assert engine.pool.max_overflow == 4
+
+
+def test_grows_after_timeouts(create_engine):
+    engine = create_engine(pool_size=1, pool_timeout=0.05)
+    resizer = autosizer(engine)
+
+    async def scenario():
+        async with engine.connect():
+            with pytest.raises(exc.TimeoutError):
+                async with engine.connect():
+                    pass
+
+    asyncio.run(scenario())
+
+    assert engine.pool.timeouts == 1
+    assert resizer.resize() == 2
+    assert engine.pool.timeouts == 0
+
+
+def test_connect_time_is_not_a_wait(create_engine):
+    engine = create_engine(connect_delay=0.1)
+    resizer = autosizer(engine)
+
+    async def scenario():
+        async with engine.connect():
+            pass
+
+    asyncio.run(scenario())
+
+    assert max(engine.pool.waits) < 0.05
+    assert resizer.resize() == 0
+
+
+def test_shrinks_unused_overflow(create_engine):
+    engine = create_engine(max_overflow=4)
+    resizer = autosizer(engine, min_overflow=1)
+
+    # The peak used all of the pool and some of the overflow
+    engine.pool.peak_checked_out = 5
+    assert resizer.resize() == 0
+
+    engine.pool.peak_checked_out = 3
+    assert resizer.resize() == -2
+    assert engine.pool.max_overflow == 2
+
+    # Not below the autosizer's minimum
+    assert resizer.resize() == -1
+    assert resizer.resize() == 0
+    assert engine.pool.max_overflow == 1
+
+
+def test_start_clamps_the_overflow(create_engine):
+    engine = create_engine(max_overflow=10)
+
+    async def scenario():
+        resizer = autosizer(engine, interval=60)
+        resizer.start()
+        assert engine.pool.max_overflow == 4
+        await resizer.stop()
+
+    asyncio.run(scenario())
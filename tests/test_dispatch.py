@@ -0,0 +1,73 @@
+import asyncio
+
+from aio_pika import Message
+
+from shared.events.order_events import OrderCancelledEvent, OrderConfirmedEvent
+from shared.messaging import EventDispatcher
+from shared.messaging.codecs import JSON_CONTENT_TYPE
+from shared.messaging.dispatch import EVENT_TYPE_HEADER
+
+EVENT = OrderConfirmedEvent(order_id="order-1", user_id="user-1")
+
+
+def message(body: bytes, event_type=None) -> Message:
+    headers = {} if event_type is None else {EVENT_TYPE_HEADER: event_type}
+    return Message(body, content_type=JSON_CONTENT_TYPE, headers=headers)
+
+
+def test_header_routes_to_the_typed_handler():
+    received = []
+    dispatcher = EventDispatcher()
+
+    @dispatcher.on("order.confirmed")
+    async def on_confirmed(event):
+        received.append(event)
+
+    body = EVENT.model_dump_json().encode()
+    asyncio.run(dispatcher(message(body, event_type="order.confirmed")))
+
+    assert received == [EVENT]
+    assert isinstance(received[0], OrderConfirmedEvent)
+    assert dispatcher.event_types == ["order.confirmed"]
+
+
+def test_events_without_a_handler_are_not_decoded():
+    dispatcher = EventDispatcher()
+    dispatcher.register("order.confirmed", lambda event: None)
+
+    # Not valid JSON: decoding it would raise
+    handler, event = dispatcher.resolve(message(b"\x00", event_type="order.created"))
+
+    assert handler is None and event is None
+
+
+def test_body_event_type_is_used_without_the_header():
+    received = []
+    dispatcher = EventDispatcher()
+
+    async def on_cancelled(event):
+        received.append(event)
+
+    dispatcher.register("order.cancelled", on_cancelled)
+    cancelled = OrderCancelledEvent(order_id="order-1", user_id="u", reason="x")
+
+    asyncio.run(dispatcher(message(EVENT.model_dump_json().encode())))
+    asyncio.run(dispatcher(message(cancelled.model_dump_json().encode())))
+
+    assert received == [cancelled]
+
+
+def test_dispatch_passes_extra_arguments_before_the_event():
+    dispatcher = EventDispatcher()
+
+    async def on_confirmed(session, event):
+        return session, event.order_id
+
+    dispatcher.register("order.confirmed", on_confirmed)
+    body = EVENT.model_dump_json().encode()
+
+    result = asyncio.run(
+        dispatcher.dispatch(message(body, event_type=b"order.confirmed"), "session")
+    )
+
+    assert result == ("session", "order-1")
@@ -0,0 +1,213 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import Column, String, select, update
+from sqlalchemy.orm import declarative_base
+
+from shared.messaging import (
+    DuplicateEvent,
+    ProcessedEventCache,
+    ProcessedEventMixin,
+    SqlProcessedEventStore,
+    record_processed,
+)
+
+Base = declarative_base()
+
+
+class ProcessedEvent(ProcessedEventMixin, Base):
+    __tablename__ = "processed_events"
+
+
+class Reservation(Base):
+    __tablename__ = "reservations"
+
+    id = Column(String, primary_key=True)
+
+
+@pytest.fixture
+def session_factory(sqlite_sessions):
+    return sqlite_sessions(Base.metadata)
+
+
+def cache(session_factory, **kwargs) -> ProcessedEventCache:
+    store = SqlProcessedEventStore(session_factory, ProcessedEvent)
+    return ProcessedEventCache("inventory", store=store, **kwargs)
+
+
+async def reserve(session_factory, reservation_id: str):
+    """A handler committing its changes to the store's database."""
+    async with session_factory() as session:
+        session.add(Reservation(id=reservation_id))
+        await session.commit()
+
+
+async def reservations(session_factory) -> list:
+    async with session_factory() as session:
+        result = await session.execute(select(Reservation.id).order_by(Reservation.id))
+        return list(result.scalars())
+
+
+def test_seen_after_mark():
+    events = ProcessedEventCache("inventory")
+
+    async def scenario():
+        assert not await events.seen("event-1")
+        await events.mark("event-1")
+        assert await events.seen("event-1")
+        assert not await events.seen(None)
+
+    asyncio.run(scenario())
+
+
+def test_memory_is_bounded_and_expires():
+    events = ProcessedEventCache("inventory", max_size=2, ttl=60)
+
+    async def scenario():
+        await events.mark_many(["a", "b", "c"])
+        assert len(events) == 2
+        assert not await events.seen("a")
+        assert await events.seen("c")
+
+        expired = ProcessedEventCache("inventory", ttl=0)
+        await expired.mark("a")
+        assert not await expired.seen("a")
+
+    asyncio.run(scenario())
+
+
+def test_store_is_only_consulted_for_redeliveries(session_factory):
+    async def scenario():
+        await cache(session_factory).mark("event-1")
+
+        # A restarted consumer has nothing in memory
+        restarted = cache(session_factory)
+        assert not await restarted.seen("event-1")
+        assert await restarted.seen("event-1", redelivered=True)
+        # Remembered from the store
+        assert await restarted.seen("event-1")
+
+    asyncio.run(scenario())
+
+
+def test_event_is_recorded_in_the_handler_transaction(session_factory):
+    events = cache(session_factory)
+
+    async def scenario():
+        with events.handling("event-1") as recording:
+            await reserve(session_factory, "r1")
+        assert recording.recorded
+        await events.mark("event-1", recorded=recording.recorded)
+
+        assert await reservations(session_factory) == ["r1"]
+        assert await cache(session_factory).seen("event-1", redelivered=True)
+
+    asyncio.run(scenario())
+
+
+def test_duplicate_rolls_back_the_handler_changes(session_factory):
+    first, second = cache(session_factory), cache(session_factory)
+
+    async def scenario():
+        with first.handling("event-1"):
+            await reserve(session_factory, "r1")
+
+        # A concurrent delivery that got past the lookup before the record
+        with second.handling("event-1") as recording:
+            with pytest.raises(DuplicateEvent):
+                await reserve(session_factory, "r2")
+        assert not recording.recorded
+
+        assert await reservations(session_factory) == ["r1"]
+
+    asyncio.run(scenario())
+
+
+async def reserve_batch(session_factory, event_ids, failing=()):
+    """A batch handler: one savepoint per event, one commit for the batch."""
+    results = []
+    async with session_factory() as session:
+        for event_id in event_ids:
+            try:
+                async with session.begin_nested():
+                    await record_processed(session, event_id)
+                    session.add(Reservation(id=f"r-{event_id}"))
+                    if event_id in failing:
+                        raise ConnectionError("lock timeout")
+                results.append(None)
+            except (DuplicateEvent, ConnectionError) as e:
+                results.append(e)
+        await session.commit()
+    return results
+
+
+def test_batch_records_events_in_their_savepoints(session_factory):
+    events = cache(session_factory)
+
+    async def scenario():
+        with events.handling_batch() as batch:
+            results = await reserve_batch(session_factory, ["a", "b"], failing={"b"})
+        assert results[0] is None and isinstance(results[1], ConnectionError)
+        # The failed event's record was rolled back with its changes
+        assert batch.recorded == {"a"}
+
+        restarted = cache(session_factory)
+        assert await restarted.seen("a", redelivered=True)
+        assert not await restarted.seen("b", redelivered=True)
+        assert await reservations(session_factory) == ["r-a"]
+
+    asyncio.run(scenario())
+
+
+def test_batch_duplicates_skip_only_their_own_changes(session_factory):
+    events = cache(session_factory)
+
+    async def scenario():
+        with events.handling_batch():
+            await reserve_batch(session_factory, ["a"])
+        with events.handling_batch() as batch:
+            results = await reserve_batch(session_factory, ["a", "b"])
+
+        assert isinstance(results[0], DuplicateEvent) and results[1] is None
+        assert batch.recorded == {"b"}
+        assert await reservations(session_factory) == ["r-a", "r-b"]
+
+    asyncio.run(scenario())
+
+
+def test_batch_records_nothing_without_a_commit(session_factory):
+    events = cache(session_factory)
+
+    async def scenario():
+        with events.handling_batch() as batch:
+            async with session_factory() as session:
+                async with session.begin_nested():
+                    await record_processed(session, "a")
+                await session.rollback()
+        assert batch.recorded == set()
+        assert not await cache(session_factory).seen("a", redelivered=True)
+
+    asyncio.run(scenario())
+
+
+def test_purge_deletes_ids_older_than_the_retention(session_factory):
+    events = cache(session_factory, retention=60)
+
+    async def scenario():
+        await events.mark_many(["old", "new"])
+        async with session_factory() as session:
+            await session.execute(
+                update(ProcessedEvent)
+                .where(ProcessedEvent.event_id == "old")
+                .values(processed_at=datetime.now(timezone.utc) - timedelta(hours=1))
+            )
+            await session.commit()
+
+        assert await events.purge() == 1
+
+        restarted = cache(session_factory)
+        assert not await restarted.seen("old", redelivered=True)
+        assert await restarted.seen("new", redelivered=True)
+
+    asyncio.run(scenario())
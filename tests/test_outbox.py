@@ -0,0 +1,239 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from aio_pika.exceptions import ChannelInvalidStateError
+from sqlalchemy import select
+from sqlalchemy.orm import declarative_base
+
+from shared.events.order_events import OrderConfirmedEvent
+from shared.messaging import PublishNackedError
+from shared.outbox import OutboxMixin, OutboxRelay
+
+Base = declarative_base()
+
+
+class OutboxEvent(OutboxMixin, Base):
+    __tablename__ = "outbox_events"
+
+
+class FakePublisher:
+    """Publisher failing the events of the order ids in ``failing``."""
+
+    def __init__(self, failing=None):
+        # order id -> error its publishes fail with
+        self.failing = dict(failing or {})
+        self.published = []
+        self.calls = 0
+
+    async def publish_many(self, events, routing_keys, trace_contexts):
+        self.calls += 1
+        outcomes = []
+        for event in events:
+            error = self.failing.get(event.order_id)
+            if error is None:
+                self.published.append(event.order_id)
+            outcomes.append(error)
+        return outcomes
+
+
+class UnreachablePublisher(FakePublisher):
+    async def publish_many(self, events, routing_keys, trace_contexts):
+        self.calls += 1
+        raise ConnectionError("broker unreachable")
+
+
+@pytest.fixture
+def session_factory(sqlite_sessions):
+    return sqlite_sessions(Base.metadata)
+
+
+def confirmed(order_id: str, age: float = 0.0) -> OutboxEvent:
+    row = OutboxEvent.from_event(OrderConfirmedEvent(order_id=order_id, user_id="u"))
+    row.created_at = datetime.now(timezone.utc) - timedelta(seconds=age)
+    return row
+
+
+async def add(session_factory, *rows):
+    async with session_factory() as session:
+        session.add_all(rows)
+        await session.commit()
+
+
+async def remaining(session_factory):
+    async with session_factory() as session:
+        result = await session.execute(select(OutboxEvent).order_by(OutboxEvent.id))
+        return {row.to_event().order_id: row for row in result.scalars()}
+
+
+def test_publishes_and_deletes_claimed_rows(session_factory):
+    publisher = FakePublisher()
+
+    async def scenario():
+        await add(session_factory, confirmed("a", age=2), confirmed("b", age=1))
+        relay = OutboxRelay(session_factory, OutboxEvent, publisher, min_batch_size=10)
+
+        assert await relay.drain_once() == 2
+        assert publisher.published == ["a", "b"]
+        assert await remaining(session_factory) == {}
+        assert await relay.drain_once() == 0
+
+    asyncio.run(scenario())
+
+
+def test_nacked_rows_are_kept_for_the_next_batch(session_factory):
+    publisher = FakePublisher(failing={"b": PublishNackedError("nack")})
+
+    async def scenario():
+        await add(session_factory, confirmed("a"), confirmed("b"))
+        relay = OutboxRelay(session_factory, OutboxEvent, publisher, max_attempts=3)
+
+        assert await relay.drain_once() == 2
+        rows = await remaining(session_factory)
+        assert list(rows) == ["b"]
+        assert rows["b"].attempts == 1
+        assert rows["b"].last_error == "nack"
+        assert rows["b"].parked_at is None
+
+        publisher.failing.clear()
+        assert await relay.drain_once() == 1
+        assert publisher.published == ["a", "b"]
+        assert await remaining(session_factory) == {}
+
+    asyncio.run(scenario())
+
+
+def test_parks_nacked_rows_after_max_attempts(session_factory):
+    publisher = FakePublisher(failing={"stuck": PublishNackedError("nack")})
+
+    async def scenario():
+        await add(session_factory, confirmed("stuck"))
+        relay = OutboxRelay(session_factory, OutboxEvent, publisher, max_attempts=2)
+
+        assert await relay.drain_once() == 1
+        assert await relay.drain_once() == 1
+        rows = await remaining(session_factory)
+        assert rows["stuck"].attempts == 2
+        assert rows["stuck"].parked_at is not None
+
+        # Parked rows are no longer claimed
+        assert await relay.drain_once() == 0
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize(
+    "error", [asyncio.TimeoutError(), ChannelInvalidStateError("channel closed")]
+)
+def test_transient_failures_never_park_a_row(session_factory, error):
+    publisher = FakePublisher(failing={"a": error})
+
+    async def scenario():
+        await add(session_factory, confirmed("a"))
+        relay = OutboxRelay(session_factory, OutboxEvent, publisher, max_attempts=2)
+
+        for _ in range(5):
+            assert await relay.drain_once() == 1
+        rows = await remaining(session_factory)
+        assert rows["a"].attempts == 0
+        assert rows["a"].parked_at is None
+        assert rows["a"].last_error
+
+    asyncio.run(scenario())
+
+
+def test_relay_backs_off_while_the_broker_is_unreachable(session_factory):
+    publisher = UnreachablePublisher()
+
+    async def scenario():
+        await add(session_factory, confirmed("a"))
+        relay = OutboxRelay(
+            session_factory,
+            OutboxEvent,
+            publisher,
+            poll_interval=0.01,
+            max_backoff=0.04,
+        )
+        relay.start()
+        await asyncio.sleep(0.2)
+        # New rows don't cut the backoff short
+        for _ in range(10):
+            relay.notify()
+            await asyncio.sleep(0.01)
+        await relay.stop()
+        return relay
+
+    relay = asyncio.run(scenario())
+    assert relay.backoff == 0.04
+    # 0.01 + 0.02 + 0.04 + ... over 0.3s, not one call per poll or wakeup
+    assert publisher.calls < 12
+
+
+def test_requeues_parked_rows(session_factory):
+    publisher = FakePublisher(failing={"a": PublishNackedError("nack")})
+
+    async def scenario():
+        await add(session_factory, confirmed("a"), confirmed("b"))
+        relay = OutboxRelay(session_factory, OutboxEvent, publisher, max_attempts=1)
+        await relay.drain_once()
+        assert (await remaining(session_factory))["a"].parked_at is not None
+
+        publisher.failing.clear()
+        assert await relay.requeue_parked() == 1
+        assert await relay.requeue_parked() == 0
+        assert await relay.drain_once() == 1
+        assert await remaining(session_factory) == {}
+
+    asyncio.run(scenario())
+
+
+def test_batch_size_adapts_to_the_backlog(session_factory):
+    relay = OutboxRelay(
+        session_factory,
+        OutboxEvent,
+        FakePublisher(),
+        min_batch_size=10,
+        max_batch_size=40,
+    )
+
+    relay._adapt_batch_size(10)
+    assert relay.batch_size == 20
+    relay._adapt_batch_size(20)
+    relay._adapt_batch_size(40)
+    assert relay.batch_size == 40
+    relay._adapt_batch_size(3)
+    assert relay.batch_size == 20
+
+    relay.notify(pending=100)
+    assert relay.batch_size == 40
+
+
+def test_lag_tracks_the_oldest_row_while_publishing_fails(session_factory):
+    publisher = UnreachablePublisher()
+
+    async def scenario():
+        await add(session_factory, confirmed("old", age=30), confirmed("new", age=1))
+        relay = OutboxRelay(session_factory, OutboxEvent, publisher)
+
+        with pytest.raises(ConnectionError):
+            await relay.drain_once()
+        return relay
+
+    relay = asyncio.run(scenario())
+    assert 30 <= relay.lag < 40
+
+
+def test_lag_ignores_a_failing_row_once_others_get_through(session_factory):
+    publisher = FakePublisher(failing={"old": PublishNackedError("nack")})
+
+    async def scenario():
+        await add(session_factory, confirmed("old", age=30), confirmed("new", age=1))
+        relay = OutboxRelay(session_factory, OutboxEvent, publisher, max_attempts=5)
+
+        await relay.drain_once()
+        assert 1 <= relay.lag < 10
+        await relay.drain_once()
+        # Only the failing row is left
+        assert relay.lag >= 30
+
+    asyncio.run(scenario())
@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+import pytest
+
+from shared.messaging.prefetch import PrefetchController
+
+
+def controller(**kwargs) -> PrefetchController:
+    options = dict(initial=10, min_prefetch=2, max_prefetch=20, target_latency=1.0)
+    options.update(kwargs)
+    return PrefetchController("test", **options)
+
+
+def handle(prefetch: PrefetchController, calls: int, seconds: float = 0.0):
+    """Deliver and settle ``calls`` messages taking ``seconds`` each."""
+    for _ in range(calls):
+        prefetch.delivered()
+    for _ in range(calls):
+        with prefetch.track():
+            time.sleep(seconds)
+        prefetch.settled()
+
+
+def test_saturated_healthy_consumer_grows_its_prefetch():
+    prefetch = controller(increase_step=5)
+
+    handle(prefetch, 10)
+    assert prefetch.adjust() == 15
+    handle(prefetch, 15)
+    handle(prefetch, 15)
+    assert prefetch.adjust() == 20  # capped at max_prefetch
+
+
+def test_prefetch_is_kept_while_not_saturated():
+    prefetch = controller()
+
+    handle(prefetch, 3)
+    assert prefetch.adjust() == 10
+    # No handler calls: nothing to go on
+    assert prefetch.adjust() == 10
+
+
+def test_slow_handlers_cut_the_prefetch():
+    prefetch = controller(target_latency=0.001)
+
+    handle(prefetch, 10, seconds=0.002)
+    assert prefetch.adjust() == 5
+    handle(prefetch, 5, seconds=0.002)
+    handle(prefetch, 5, seconds=0.002)
+    assert prefetch.adjust() == 2  # floored at min_prefetch
+
+
+def test_failing_handlers_cut_the_prefetch():
+    prefetch = controller(max_error_rate=0.1)
+
+    handle(prefetch, 8)
+    for _ in range(2):
+        prefetch.delivered()
+        with pytest.raises(ConnectionError):
+            with prefetch.track():
+                raise ConnectionError("database unavailable")
+        prefetch.settled()
+
+    assert prefetch.adjust() == 5
+
+
+def test_adjustments_are_applied_to_the_channel(channel_pool):
+    prefetch = controller(increase_step=5, interval=0.01)
+
+    async def scenario():
+        async with channel_pool.acquire() as pooled:
+            await prefetch.apply(pooled.channel)
+            assert pooled.channel.prefetch_count == 10
+
+            prefetch.start(pooled.channel)
+            handle(prefetch, 10)
+            await asyncio.sleep(0.05)
+            await prefetch.stop()
+            return pooled.channel.prefetch_count
+
+    assert asyncio.run(scenario()) == 15
@@ -0,0 +1,199 @@
+import asyncio
+
+import pytest
+from aio_pika.exceptions import ChannelInvalidStateError
+from pamqp.commands import Basic
+
+from shared.events.order_events import OrderConfirmedEvent
+from shared.messaging import EventPublisher, PublishNackedError
+from shared.messaging.memory import MemoryExchange
+
+EXCHANGE = "microservice.events"
+
+
+def confirmed(order_id: str) -> OrderConfirmedEvent:
+    return OrderConfirmedEvent(order_id=order_id, user_id="user-1")
+
+
+async def bind_queue(channel_pool, name: str = "orders", routing_key: str = "#"):
+    """A queue receiving what is published to the events exchange."""
+    async with channel_pool.acquire() as pooled:
+        exchange = await pooled.get_exchange(EXCHANGE)
+        queue = await pooled.channel.declare_queue(name, durable=True)
+        await queue.bind(exchange, routing_key=routing_key)
+
+
+def order_ids(broker, queue: str = "orders") -> list:
+    return [
+        envelope.properties["message_id"] for envelope in broker.queues[queue].messages
+    ]
+
+
+@pytest.fixture
+def nack(monkeypatch):
+    """Make the broker nack messages published with the given routing keys."""
+    nacked = set()
+    publish = MemoryExchange.publish
+
+    async def publish_or_nack(self, message, routing_key, **kwargs):
+        if routing_key in nacked:
+            return Basic.Nack(delivery_tag=1)
+        return await publish(self, message, routing_key, **kwargs)
+
+    monkeypatch.setattr(MemoryExchange, "publish", publish_or_nack)
+    return nacked.add
+
+
+@pytest.fixture
+def held_confirms(monkeypatch):
+    """
+    Hold every publish until the returned event is set.
+
+    The event's ``channels`` lists the channel of each publish, in order.
+    """
+    release = asyncio.Event()
+    release.channels = []
+    publish = MemoryExchange.publish
+
+    async def held_publish(self, message, routing_key, **kwargs):
+        release.channels.append(self.channel)
+        await release.wait()
+        return await publish(self, message, routing_key, **kwargs)
+
+    monkeypatch.setattr(MemoryExchange, "publish", held_publish)
+    return release
+
+
+def test_publish_event_resolves_once_confirmed(broker, channel_pool):
+    event = confirmed("order-1")
+
+    async def scenario():
+        await bind_queue(channel_pool)
+        publisher = EventPublisher(pool=channel_pool)
+        await publisher.connect()
+        await publisher.publish_event(event)
+        assert publisher.in_flight == 0
+        await publisher.close()
+
+    asyncio.run(scenario())
+
+    assert order_ids(broker) == [event.event_id]
+
+
+def test_nacked_publish_raises(channel_pool, nack):
+    nack("order.confirmed")
+
+    async def scenario():
+        publisher = EventPublisher(pool=channel_pool)
+        with pytest.raises(PublishNackedError):
+            await publisher.publish_event(confirmed("order-1"))
+        await publisher.close()
+
+    asyncio.run(scenario())
+
+
+def test_publish_many_reports_each_event(broker, channel_pool, nack):
+    nack("rejected")
+    events = [confirmed(f"order-{index}") for index in range(3)]
+
+    async def scenario():
+        await bind_queue(channel_pool)
+        publisher = EventPublisher(pool=channel_pool)
+        return await publisher.publish_many(
+            events, routing_keys=["order.confirmed", "rejected", "order.confirmed"]
+        )
+
+    results = asyncio.run(scenario())
+
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], PublishNackedError)
+    # In order, without the nacked one
+    assert order_ids(broker) == [events[0].event_id, events[2].event_id]
+
+
+def test_window_bounds_unconfirmed_publishes(channel_pool, held_confirms):
+    async def scenario():
+        publisher = EventPublisher(pool=channel_pool, max_in_flight=2)
+        futures = [await publisher.submit(confirmed(f"order-{i}")) for i in range(2)]
+        assert publisher.in_flight == 2
+
+        # A third waits for a slot
+        third = asyncio.create_task(publisher.submit(confirmed("order-2")))
+        await asyncio.sleep(0.05)
+        assert not third.done()
+
+        held_confirms.set()
+        futures.append(await asyncio.wait_for(third, 1))
+        await asyncio.gather(*futures)
+        assert publisher.in_flight == 0
+        await publisher.close()
+
+    asyncio.run(scenario())
+
+
+def test_single_publishes_are_spread_over_channels(channel_pool, held_confirms):
+    async def scenario():
+        publisher = EventPublisher(pool=channel_pool, publish_channels=3)
+        futures = [await publisher.submit(confirmed(f"order-{i}")) for i in range(6)]
+        await asyncio.sleep(0)
+
+        channels = held_confirms.channels
+        assert len(set(channels)) == 3
+        # Round-robin
+        assert channels[:3] == channels[3:]
+
+        held_confirms.set()
+        await asyncio.gather(*futures)
+        await publisher.close()
+        assert channel_pool.in_use == 0
+
+    asyncio.run(scenario())
+
+
+def test_shared_channels_leave_one_for_batches(broker, channel_pool):
+    async def scenario():
+        await bind_queue(channel_pool)
+        publisher = EventPublisher(pool=channel_pool, publish_channels=8)
+        for index in range(8):
+            await publisher.publish_event(confirmed(f"order-{index}"))
+        assert channel_pool.in_use == channel_pool.max_size - 1
+
+        results = await asyncio.wait_for(
+            publisher.publish_many([confirmed("order-8")]), 1
+        )
+        assert results == [None]
+        await publisher.close()
+
+    asyncio.run(scenario())
+    assert len(order_ids(broker)) == 9
+
+
+def test_closed_channel_fails_only_its_own_publishes(
+    broker, channel_pool, held_confirms
+):
+    async def scenario():
+        await bind_queue(channel_pool)
+        publisher = EventPublisher(pool=channel_pool, publish_channels=2)
+        futures = [await publisher.submit(confirmed(f"order-{i}")) for i in range(4)]
+        await asyncio.sleep(0)
+
+        broken = held_confirms.channels[0]
+        await broken.close()
+        held_confirms.set()
+        results = await asyncio.gather(*futures, return_exceptions=True)
+
+        # The closed channel is replaced for the next publishes
+        await publisher.publish_event(confirmed("order-4"))
+        assert broken not in held_confirms.channels[4:]
+        await publisher.close()
+        return results
+
+    results = asyncio.run(scenario())
+
+    assert [isinstance(r, ChannelInvalidStateError) for r in results] == [
+        True,
+        False,
+        True,
+        False,
+    ]
+    assert len(order_ids(broker)) == 3